@@ -17,6 +17,10 @@ if current_dir not in sys.path:
 # Try importing backend
 try:
     from bb84_backend.logic.controller import encrypt_file_local, decrypt_file_local
+    from bb84_backend.core.randomness_tests import run_battery
+    from bb84_backend.core.key_utils import KEY_CHECK_ALPHA
+    from bb84_backend.common.artifacts import get_store, ArtifactExpired
+    from bb84_backend.common.memory import parse_size
     BACKEND_AVAILABLE = True
 except ImportError:
     BACKEND_AVAILABLE = False
@@ -80,17 +84,51 @@ def generate_pdf_report(metrics_path="bb84_metrics.json"):
         st.error(f"Error generating PDF: {e}")
         return None
 
+# Streamlit reads a download button's payload into memory and keeps it for the
+# session, so artifacts above this size are not offered in the browser
+DOWNLOAD_MAX_BYTES = parse_size(os.environ.get("QOFL_DOWNLOAD_MAX", "200MB")) if BACKEND_AVAILABLE else 0
+# Rows of the qubit log kept in the session for the history table (the CSV has all of them)
+QUBIT_PREVIEW_ROWS = 1000
+
+def artifact_download_button(label, handle, file_name, mime, **kwargs):
+    """
+    Download button for an artifact-store file. The payload is loaded into memory
+    by Streamlit while the button is shown, so files over DOWNLOAD_MAX_BYTES are
+    refused with a notice instead. Warns if the artifact expired.
+    """
+    if handle is None:
+        return
+    store = get_store()
+    try:
+        size = store.meta(handle)["size"]
+        if size > DOWNLOAD_MAX_BYTES:
+            st.warning(
+                f"'{file_name}' is {size} bytes, over the {DOWNLOAD_MAX_BYTES}-byte browser download "
+                f"limit (QOFL_DOWNLOAD_MAX). Use terminal.py or the daemon for files this large."
+            )
+            return
+        st.download_button(label=label, data=store.read(handle), file_name=file_name, mime=mime, **kwargs)
+    except ArtifactExpired:
+        st.warning(f"'{file_name}' expired from temporary storage. Please run the operation again.")
+
 def check_key_strength(key_b):
-    """Returns a status string and color based on key bit balance."""
-    ones = key_b.count('1')
-    zeros = key_b.count('0')
-    total = len(key_b)
-    if total == 0: return "Empty", "red"
-    balance = abs(ones - zeros)
-    is_strong = balance < (total * 0.4)
-    status = f"Strong (Balance: {balance})" if is_strong else f"Weak (Balance: {balance})"
-    color = "green" if is_strong else "red"
-    return f"1s: {ones} | 0s: {zeros} | Status: {status}", color
+    """Returns a status string and color from the NIST SP 800-22 test subset."""
+    bits = [int(c) for c in key_b if c in "01"]
+    ones = sum(bits)
+    zeros = len(bits) - ones
+    if not bits: return "Empty", "red"
+    if not BACKEND_AVAILABLE:
+        return f"1s: {ones} | 0s: {zeros}", "gray"
+    report = run_battery(bits, alpha=KEY_CHECK_ALPHA)
+    if "error" in report:
+        return f"1s: {ones} | 0s: {zeros} | Status: {report['error']}", "red"
+    p_values = [t["p_value"] for t in report["tests"].values() if t["p_value"] is not None]
+    status = "Strong" if report["passed"] else "Weak"
+    color = "green" if report["passed"] else "red"
+    return (
+        f"1s: {ones} | 0s: {zeros} | NIST tests: {report['tests_passed']}/{report['tests_run']} passed "
+        f"(min p = {min(p_values):.4f}) | Status: {status}"
+    ), color
 
 # ----------------------------------------------------------------------------
 # STREAMLIT UI SETUP & AESTHETIC THEME
@@ -169,7 +207,7 @@ with tab_work:
                     file_bytes = uploaded_file.getvalue()
                     filename = uploaded_file.name
                     
-                    # Call backend (expects 3 return values: enc_data, key, qubit_log)
+                    # Call backend (expects 3 return values: enc_data, key, qubit record)
                     result = encrypt_file_local(file_bytes, filename)
                     
                     if len(result) == 3:
@@ -178,11 +216,27 @@ with tab_work:
                         encrypted_data_b64, key_b = result
                         qubit_log = []
 
+                    # Large results go to the artifact store; the session keeps only handles
+                    store = get_store()
+                    for old in ('last_encrypted_handle', 'last_qubit_csv_handle'):
+                        if old in st.session_state:
+                            store.delete(st.session_state.pop(old))
                     st.session_state['last_key_b'] = key_b
-                    st.session_state['last_encrypted_data'] = encrypted_data_b64
+                    st.session_state['last_encrypted_handle'] = store.put_text(encrypted_data_b64, filename + ".qofl")
+                    del encrypted_data_b64
                     st.session_state['last_filename'] = filename + ".qofl" 
-                    # We don't really need qubit_log in state anymore if not visualizing, 
-                    # but keeping it doesn't hurt.
+                    # Only run counters and a preview stay in the session; the full record goes to the CSV artifact
+                    if hasattr(qubit_log, "stats"):
+                        st.session_state['last_qubit_stats'] = qubit_log.stats()
+                        st.session_state['last_qubit_preview'] = list(qubit_log.window(0, QUBIT_PREVIEW_ROWS))
+                    else:
+                        st.session_state.pop('last_qubit_stats', None)
+                        st.session_state.pop('last_qubit_preview', None)
+                    if hasattr(qubit_log, "to_csv"):
+                        st.session_state['last_qubit_csv_handle'] = store.put_file(
+                            "qubit_history.csv", qubit_log.to_csv, "text/csv"
+                        )
+                    del qubit_log
                     
                     st.success("File encrypted successfully!")
                     
@@ -195,16 +249,35 @@ with tab_work:
             
             # --- QUBIT STATS ONLY (Visualizer Removed) ---
             st.markdown("### ⚛️ Quantum Channel Stats")
-            c_q1, c_q2, c_q3 = st.columns(3)
+            # Counts come from the run record: the key-rate planner decides how many qubits are sent
+            run_stats = st.session_state.get('last_qubit_stats')
+            preview = st.session_state.get('last_qubit_preview') or []
+            c_q1, c_q2, c_q3, c_q4 = st.columns(4)
             with c_q1:
-                st.metric("Total Qubits Transmitted", "256") # Hardcoded from controller config
+                st.metric("Total Qubits Transmitted", run_stats["qubits"] if run_stats else "n/a")
             with c_q2:
-                st.metric("Sifted Key Length", f"{len(st.session_state['last_key_b'])} bits")
+                st.metric("Sifted Key Length", f"{run_stats['sifted']} bits" if run_stats else "n/a")
             with c_q3:
-                # Calculate match rate
-                match_rate = round((len(st.session_state['last_key_b']) / 256) * 100, 1)
+                st.metric("Final Key Length", f"{len(st.session_state['last_key_b'])} bits")
+            with c_q4:
+                match_rate = round(run_stats["match_rate"] * 100, 1) if run_stats else 0.0
                 st.metric("Basis Match Rate", f"{match_rate}%")
             
+            if preview:
+                with st.expander("Qubit History"):
+                    if run_stats and run_stats["qubits"] > len(preview):
+                        st.caption(f"Showing the first {len(preview)} of {run_stats['qubits']} qubits; the CSV has the full run.")
+                    start = st.number_input(
+                        "First qubit", min_value=0, max_value=len(preview) - 1, value=0, step=50
+                    )
+                    st.dataframe(preview[int(start):int(start) + 50], use_container_width=True)
+                    artifact_download_button(
+                        "Download Full Run (.csv)",
+                        st.session_state.get('last_qubit_csv_handle'),
+                        "qubit_history.csv",
+                        "text/csv"
+                    )
+
             st.markdown("---")
 
             # Key Display
@@ -223,11 +296,11 @@ with tab_work:
                     use_container_width=True
                 )
             with c2:
-                st.download_button(
-                    label="📦 Download Encrypted Package",
-                    data=st.session_state['last_encrypted_data'],
-                    file_name=st.session_state['last_filename'],
-                    mime="text/plain",
+                artifact_download_button(
+                    "📦 Download Encrypted Package",
+                    st.session_state.get('last_encrypted_handle'),
+                    st.session_state['last_filename'],
+                    "text/plain",
                     use_container_width=True
                 )
             
@@ -275,11 +348,16 @@ with tab_work:
                                 st.json(metadata, expanded=False)
                                 
                                 orig_name = metadata.get("original_filename", "decrypted_file")
-                                st.download_button(
-                                    label="💾 Download Decrypted File",
-                                    data=data,
-                                    file_name=orig_name,
-                                    mime="application/octet-stream",
+                                store = get_store()
+                                if 'last_decrypted_handle' in st.session_state:
+                                    store.delete(st.session_state.pop('last_decrypted_handle'))
+                                st.session_state['last_decrypted_handle'] = store.put_bytes(data, orig_name)
+                                del data
+                                artifact_download_button(
+                                    "💾 Download Decrypted File",
+                                    st.session_state['last_decrypted_handle'],
+                                    orig_name,
+                                    "application/octet-stream",
                                     use_container_width=True
                                 )
                     except Exception as e:
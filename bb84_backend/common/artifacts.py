@@ -0,0 +1,218 @@
+"""
+Disk-backed store for large per-session results (packages, decrypted files, CSVs).
+
+UI sessions keep only the short handle; the bytes live in a temp directory and
+are streamed from disk when downloaded. Artifacts are evicted when unused for
+longer than the TTL, and least-recently-used first whenever the total size goes
+over the budget, so server memory and disk use stay bounded however many
+sessions are open. Expired artifacts are also swept by a background thread, so
+they do not outlive the TTL on an idle server. Artifact files are created with
+mode 0600.
+
+    QOFL_ARTIFACT_DIR=path         store directory (default: a fresh temp dir)
+    QOFL_ARTIFACT_TTL=1800         seconds an unused artifact is kept
+    QOFL_ARTIFACT_BUDGET=1GB       total size of all artifacts (KB/MB/GB suffixes)
+"""
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, Optional
+
+from bb84_backend.common.memory import parse_size
+
+__all__ = ["ArtifactStore", "ArtifactExpired", "get_store"]
+
+DEFAULT_TTL = 30 * 60
+DEFAULT_BUDGET = "1GB"
+COPY_CHUNK = 1024 * 1024
+# Longest pause between background sweeps (shorter TTLs sweep more often)
+SWEEP_INTERVAL = 60.0
+
+
+class ArtifactExpired(KeyError):
+    """The handle's artifact was evicted (TTL or size budget) or never existed."""
+
+
+class ArtifactStore:
+    """
+    Thread-safe map of handle -> file. The index lives in memory; each artifact
+    is one file named after its handle.
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl: float = DEFAULT_TTL, budget: int = parse_size(DEFAULT_BUDGET)):
+        self.root = root or tempfile.mkdtemp(prefix="qofl-artifacts-")
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        self.ttl = ttl
+        self.budget = budget
+        self._index: Dict[str, Dict] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def _path(self, handle: str) -> str:
+        return os.path.join(self.root, handle + ".bin")
+
+    def put_file(self, name: str, fill: Callable[[str], None], mime: str = "application/octet-stream") -> str:
+        """
+        Creates an artifact by letting fill(path) write it, so large results can
+        go straight to disk (e.g. QubitRecord.to_csv). Returns the handle.
+        """
+        handle = secrets.token_hex(16)
+        path = self._path(handle)
+        try:
+            # Created owner-only up front; fill() reopens and truncates it, keeping the mode
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            fill(path)
+            size = os.path.getsize(path)
+        except BaseException:
+            _remove(path)
+            raise
+        now = time.time()
+        with self._lock:
+            self._index[handle] = {"name": name, "mime": mime, "size": size, "created": now, "last_access": now}
+            self._total += size
+        self.evict(keep=handle)
+        return handle
+
+    def put_bytes(self, data: bytes, name: str, mime: str = "application/octet-stream") -> str:
+        def fill(path: str) -> None:
+            with open(path, "wb") as f:
+                f.write(data)
+        return self.put_file(name, fill, mime)
+
+    def put_text(self, text: str, name: str, mime: str = "text/plain") -> str:
+        # Written in slices so the encoded copy never exists in full
+        def fill(path: str) -> None:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                for i in range(0, len(text), COPY_CHUNK):
+                    f.write(text[i:i + COPY_CHUNK])
+        return self.put_file(name, fill, mime)
+
+    def meta(self, handle: str) -> Dict:
+        with self._lock:
+            entry = self._index.get(handle)
+            if entry is None:
+                raise ArtifactExpired(handle)
+            return dict(entry)
+
+    def open(self, handle: str) -> BinaryIO:
+        """
+        Opens the artifact for streaming and refreshes its TTL. Raises
+        ArtifactExpired if it was evicted.
+        """
+        self.evict()
+        with self._lock:
+            entry = self._index.get(handle)
+            if entry is None:
+                raise ArtifactExpired(handle)
+            entry["last_access"] = time.time()
+            # Opened under the lock so eviction cannot remove the file in between;
+            # an open file stays readable on POSIX even if it is deleted later
+            return open(self._path(handle), "rb")
+
+    def read(self, handle: str) -> bytes:
+        with self.open(handle) as f:
+            return f.read()
+
+    def __contains__(self, handle: object) -> bool:
+        with self._lock:
+            return handle in self._index
+
+    def delete(self, handle: str) -> None:
+        with self._lock:
+            entry = self._index.pop(handle, None)
+            if entry is not None:
+                self._total -= entry["size"]
+        if entry is not None:
+            _remove(self._path(handle))
+
+    def evict(self, now: Optional[float] = None, keep: Optional[str] = None) -> int:
+        """
+        Drops artifacts idle for longer than the TTL, then the least recently used
+        ones until the total fits the budget. `keep` (the artifact just written) is
+        never evicted for size. Returns how many were removed.
+        """
+        now = time.time() if now is None else now
+        victims = []
+        with self._lock:
+            for handle, entry in list(self._index.items()):
+                if now - entry["last_access"] > self.ttl:
+                    victims.append(handle)
+                    self._total -= self._index.pop(handle)["size"]
+            if self._total > self.budget:
+                for handle, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+                    if self._total <= self.budget:
+                        break
+                    if handle == keep:
+                        continue
+                    victims.append(handle)
+                    self._total -= self._index.pop(handle)["size"]
+        for handle in victims:
+            _remove(self._path(handle))
+        return len(victims)
+
+    def start_sweeper(self, interval: Optional[float] = None) -> None:
+        """
+        Runs evict() every `interval` seconds on a daemon thread (default: the TTL,
+        capped at SWEEP_INTERVAL), so expired artifacts go away without new traffic.
+        """
+        if self._sweeper is not None:
+            return
+        interval = interval or min(self.ttl, SWEEP_INTERVAL)
+        self._stop.clear()
+
+        def sweep() -> None:
+            while not self._stop.wait(interval):
+                self.evict()
+
+        self._sweeper = threading.Thread(target=sweep, name="artifact-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._stop.set()
+            self._sweeper.join()
+            self._sweeper = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"artifacts": len(self._index), "bytes": self._total, "budget": self.budget, "ttl": self.ttl}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index.clear()
+            self._total = 0
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_STORE: Optional[ArtifactStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> ArtifactStore:
+    """
+    Process-wide store configured from the environment, created on first use
+    with its background sweeper running.
+    """
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ArtifactStore(
+                root=os.environ.get("QOFL_ARTIFACT_DIR") or None,
+                ttl=float(os.environ.get("QOFL_ARTIFACT_TTL", DEFAULT_TTL)),
+                budget=parse_size(os.environ.get("QOFL_ARTIFACT_BUDGET", DEFAULT_BUDGET)),
+            )
+            _STORE.start_sweeper()
+        return _STORE
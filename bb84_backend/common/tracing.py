@@ -0,0 +1,227 @@
+"""
+Lightweight tracing for the encryption pipeline.
+
+Spans are free when tracing is off (span() returns a shared no-op object).
+Environment switches, read at import time:
+
+    QOFL_TRACE=1                   record spans in memory (see summary())
+    QOFL_TRACE=chrome:trace.json   also write a Chrome/Perfetto trace at exit
+    QOFL_PROFILE=prefix            cProfile each profile_run() -> prefix-<label>-<n>.prof
+    QOFL_TRACEMALLOC=prefix        tracemalloc snapshot per run -> prefix-<label>-<n>.snapshot
+"""
+import atexit
+import cProfile
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+__all__ = ["span", "traced", "profile_run", "enable", "disable", "is_enabled",
+           "events", "summary", "reset", "write_chrome_trace"]
+
+# Hard cap so a forgotten QOFL_TRACE on a daemon cannot grow without bound
+MAX_EVENTS = 1_000_000
+
+_enabled = False
+_chrome_path: Optional[str] = None
+_profile_prefix = os.environ.get("QOFL_PROFILE") or None
+_tracemalloc_prefix = os.environ.get("QOFL_TRACEMALLOC") or None
+
+_events: List[Dict] = []
+_events_lock = threading.Lock()
+_run_counter = itertools.count(1)
+# cProfile allows one active profiler per process (enforced on 3.12+), so
+# concurrent daemon runs take turns; a run that finds it busy goes unprofiled
+_profile_lock = threading.Lock()
+_PID = os.getpid()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """
+    Timed region; nesting follows from the timestamps (Chrome 'X' events).
+    """
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: Dict):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": self.start / 1000,
+            "dur": (end - self.start) / 1000,
+            "pid": _PID,
+            "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        with _events_lock:
+            if len(_events) < MAX_EVENTS:
+                _events.append(event)
+        return False
+
+    def set(self, **args):
+        # Attach values known only inside the span (sizes, counts)
+        self.args.update(args)
+
+
+def span(name: str, **args):
+    """
+    Context manager timing one pipeline stage.
+    """
+    if not _enabled:
+        return _NOOP
+    return Span(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator form of span(); costs one flag check per call when disabled.
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(chrome_path: Optional[str] = None) -> None:
+    global _enabled, _chrome_path
+    _enabled = True
+    if chrome_path:
+        _chrome_path = chrome_path
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def events() -> List[Dict]:
+    with _events_lock:
+        return list(_events)
+
+
+def reset() -> None:
+    with _events_lock:
+        _events.clear()
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """
+    Aggregates recorded spans by name: call count, total and max milliseconds.
+    """
+    totals: Dict[str, Dict[str, float]] = {}
+    for event in events():
+        entry = totals.setdefault(event["name"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = event["dur"] / 1000
+        entry["calls"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+    for entry in totals.values():
+        entry["total_ms"] = round(entry["total_ms"], 3)
+        entry["max_ms"] = round(entry["max_ms"], 3)
+    return totals
+
+
+def write_chrome_trace(path: Optional[str] = None) -> Optional[str]:
+    """
+    Writes recorded spans in Chrome trace format (chrome://tracing, Perfetto).
+    """
+    path = path or _chrome_path
+    if not path:
+        return None
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)
+    return path
+
+
+@contextmanager
+def profile_run(label: str):
+    """
+    Wraps one top-level operation. Opens a span and, when requested through the
+    environment, dumps a cProfile and/or tracemalloc snapshot for this run only.
+    Only one run is profiled at a time; overlapping runs skip the cProfile dump.
+    """
+    if not (_enabled or _profile_prefix or _tracemalloc_prefix):
+        yield
+        return
+
+    run_id = next(_run_counter)
+    started_tracemalloc = False
+    if _tracemalloc_prefix and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracemalloc = True
+    profiler = None
+    if _profile_prefix and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+
+    try:
+        if profiler:
+            profiler.enable()
+        with span(label, run=run_id):
+            yield
+    finally:
+        if profiler:
+            try:
+                profiler.disable()
+                profiler.dump_stats(f"{_profile_prefix}-{label}-{run_id}.prof")
+            finally:
+                _profile_lock.release()
+        if _tracemalloc_prefix:
+            tracemalloc.take_snapshot().dump(f"{_tracemalloc_prefix}-{label}-{run_id}.snapshot")
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+
+def _configure_from_env() -> None:
+    value = os.environ.get("QOFL_TRACE", "").strip()
+    if not value or value == "0":
+        return
+    if value.startswith("chrome:"):
+        enable(value[len("chrome:"):])
+        atexit.register(write_chrome_trace)
+    else:
+        enable()
+
+
+_configure_from_env()
@@ -1,9 +1,34 @@
+import hmac
 import os
+import threading
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives import padding
 
-__all__ = ["aes_encrypt", "aes_decrypt"]
+from bb84_backend.common.tracing import traced
 
+__all__ = ["aes_encrypt", "aes_decrypt", "aes_encrypt_into", "aes_decrypt_into",
+           "encrypted_size", "CBCStreamEncryptor", "CBCStreamDecryptor", "cbc_block_decryptor"]
+
+_BLOCK = 16
+
+# Per-thread scratch for the padded last block: update_into needs block_size - 1
+# bytes of slack in its output, which the caller's exact-size buffer may not have
+_scratch = threading.local()
+
+# PKCS7 pad runs by pad length, built once
+_PADS = tuple(bytes((pad,)) * pad for pad in range(_BLOCK + 1))
+
+def _byte_view(buffer) -> memoryview:
+    view = memoryview(buffer)
+    return view if view.format == "B" else view.cast("B")
+
+def _scratch_blocks():
+    blocks = getattr(_scratch, "blocks", None)
+    if blocks is None:
+        blocks = _scratch.blocks = (bytearray(_BLOCK), bytearray(2 * _BLOCK - 1))
+    return blocks
+
+@traced("aes.encrypt")
 def aes_encrypt(data: bytes, key_with_salt: bytes) -> bytes:
     """
     Refactored AES-256 CBC encryption.
@@ -21,6 +46,7 @@ def aes_encrypt(data: bytes, key_with_salt: bytes) -> bytes:
     # Return using a single join/concatenation to save memory overhead
     return iv + encryptor.update(padded_data) + encryptor.finalize()
 
+@traced("aes.decrypt")
 def aes_decrypt(encrypted: bytes, key_with_salt: bytes) -> bytes:
     """
     Refactored AES-256 CBC decryption.
@@ -34,4 +60,139 @@ def aes_decrypt(encrypted: bytes, key_with_salt: bytes) -> bytes:
 
     # Efficient unpadding
     unpadder = padding.PKCS7(128).unpadder()
-    return unpadder.update(padded_data) + unpadder.finalize()
\ No newline at end of file
+    return unpadder.update(padded_data) + unpadder.finalize()
+
+def encrypted_size(plaintext_len: int) -> int:
+    """
+    Output size of aes_encrypt / aes_encrypt_into: IV + PKCS7-padded ciphertext.
+    """
+    return _BLOCK + (plaintext_len // _BLOCK + 1) * _BLOCK
+
+@traced("aes.encrypt")
+def aes_encrypt_into(data, key_with_salt: bytes, out) -> int:
+    """
+    aes_encrypt writing into a caller-provided bytearray/memoryview of at least
+    encrypted_size(len(data)) bytes. Full blocks are encrypted straight from the
+    input view; only the padded last block goes through per-thread scratch.
+    Returns the number of bytes written.
+    """
+    data = _byte_view(data)
+    out = _byte_view(out)
+    n = len(data)
+    total = encrypted_size(n)
+    if len(out) < total:
+        raise ValueError(f"Output buffer too small: {len(out)} < {total} bytes.")
+
+    out[:_BLOCK] = os.urandom(_BLOCK)
+    encryptor = Cipher(algorithms.AES(key_with_salt[:32]), modes.CBC(out[:_BLOCK])).encryptor()
+    full = n - n % _BLOCK
+    if full:
+        encryptor.update_into(data[:full], out[_BLOCK:])
+
+    # PKCS7: pad the remainder in scratch, encrypt it and copy the block out
+    last_in, last_out = _scratch_blocks()
+    tail = n - full
+    last_in[:tail] = data[full:]
+    pad = _BLOCK - tail
+    last_in[tail:] = _PADS[pad]
+    encryptor.update_into(last_in, last_out)
+    encryptor.finalize()
+    out[total - _BLOCK:total] = memoryview(last_out)[:_BLOCK]
+    return total
+
+@traced("aes.decrypt")
+def aes_decrypt_into(encrypted, key_with_salt: bytes, out) -> int:
+    """
+    aes_decrypt writing into a caller-provided bytearray/memoryview of at least
+    len(encrypted) - 16 bytes. The IV and ciphertext are read through memoryviews
+    (no slicing copies) and the padding is checked on per-thread scratch.
+    Returns the plaintext length.
+    """
+    encrypted = _byte_view(encrypted)
+    out = _byte_view(out)
+    ct_len = len(encrypted) - _BLOCK
+    if ct_len < _BLOCK or ct_len % _BLOCK:
+        raise ValueError("Ciphertext length must be a positive multiple of the block size.")
+    if len(out) < ct_len:
+        raise ValueError(f"Output buffer too small: {len(out)} < {ct_len} bytes.")
+
+    decryptor = Cipher(algorithms.AES(key_with_salt[:32]), modes.CBC(encrypted[:_BLOCK])).decryptor()
+    body = ct_len - _BLOCK
+    if body:
+        decryptor.update_into(encrypted[_BLOCK:_BLOCK + body], out)
+    _, last_out = _scratch_blocks()
+    decryptor.update_into(encrypted[_BLOCK + body:], last_out)
+    decryptor.finalize()
+
+    pad = last_out[_BLOCK - 1]
+    # Compare the whole pad run at once rather than byte by byte
+    valid = 1 <= pad <= _BLOCK and hmac.compare_digest(
+        memoryview(last_out)[_BLOCK - pad:_BLOCK], _PADS[pad]
+    )
+    if not valid:
+        raise ValueError("Invalid padding bytes.")
+    keep = _BLOCK - pad
+    out[body:body + keep] = memoryview(last_out)[:keep]
+    return body + keep
+
+class CBCStreamEncryptor:
+    """
+    Incremental AES-256 CBC encryption with PKCS7 padding for chunked input.
+    The first update() output is prefixed with the random IV, matching aes_encrypt.
+    """
+
+    def __init__(self, key_with_salt: bytes):
+        self.iv = os.urandom(16)
+        self._padder = padding.PKCS7(128).padder()
+        self._encryptor = Cipher(algorithms.AES(key_with_salt[:32]), modes.CBC(self.iv)).encryptor()
+        self._iv_pending = True
+
+    def update(self, data: bytes) -> bytes:
+        out = self._encryptor.update(self._padder.update(data))
+        if self._iv_pending:
+            self._iv_pending = False
+            return self.iv + out
+        return out
+
+    def finalize(self) -> bytes:
+        out = self._encryptor.update(self._padder.finalize()) + self._encryptor.finalize()
+        if self._iv_pending:
+            self._iv_pending = False
+            return self.iv + out
+        return out
+
+
+class CBCStreamDecryptor:
+    """
+    Incremental counterpart of CBCStreamEncryptor.
+    Expects the IV as the first 16 bytes of the stream.
+    """
+
+    def __init__(self, key_with_salt: bytes):
+        self._key = key_with_salt[:32]
+        self._head = b""
+        self._decryptor = None
+        self._unpadder = padding.PKCS7(128).unpadder()
+
+    def update(self, data: bytes) -> bytes:
+        if self._decryptor is None:
+            self._head += data
+            if len(self._head) < 16:
+                return b""
+            iv, data = self._head[:16], self._head[16:]
+            self._head = b""
+            self._decryptor = Cipher(algorithms.AES(self._key), modes.CBC(iv)).decryptor()
+        return self._unpadder.update(self._decryptor.update(data))
+
+    def finalize(self) -> bytes:
+        if self._decryptor is None:
+            raise ValueError("Ciphertext is shorter than the IV.")
+        return self._unpadder.update(self._decryptor.finalize()) + self._unpadder.finalize()
+
+
+def cbc_block_decryptor(key_with_salt: bytes, iv: bytes):
+    """
+    Unpadded CBC decryptor for random access: to start at ciphertext block k,
+    pass block k - 1 as the IV (the stream IV for block 0).
+    """
+    return Cipher(algorithms.AES(key_with_salt[:32]), modes.CBC(iv)).decryptor()
@@ -11,10 +11,16 @@ except ImportError:
     PQCRYPTO_AVAILABLE = False
 
 import secrets
-from typing import List, Tuple, Dict
-from qiskit import QuantumCircuit
+from functools import lru_cache
+from typing import List, Tuple, Dict, Optional
+import numpy as np
+from qiskit import QuantumCircuit, transpile
 from qiskit_aer import AerSimulator
 
+from bb84_backend.common.tracing import span
+from bb84_backend.core.randomness import RandomnessProvider, resolve_provider
+from bb84_backend.core.qubit_record import QubitRecord
+
 # Optional: Post-quantum authentication
 try:
     from dilithium import Dilithium, parameter_sets
@@ -22,68 +28,145 @@ try:
 except ImportError:
     PQCRYPTO_AVAILABLE = False
 
-def bb84_protocol(length: int = 128, authenticate: bool = False) -> Tuple[List[int], List[int], List[Dict]]:
+# Built once per process; AerSimulator construction dominates short runs
+_SIMULATOR = None
+
+def get_simulator() -> AerSimulator:
     """
-    Optimized BB84 protocol simulation returning keys and a visual log.
+    Returns the process-wide AerSimulator, creating it on first use.
     """
-    # 1. Generate all random bits and bases at once (Space: O(N))
-    alice_bits = [secrets.randbits(1) for _ in range(length)]
-    alice_bases = [secrets.choice(['Z', 'X']) for _ in range(length)]
-    bob_bases = [secrets.choice(['Z', 'X']) for _ in range(length)]
-
-    # 2. Vectorized Simulation: One circuit for all qubits (Time: O(1) overhead)
-    qc = QuantumCircuit(length, length)
-    for i in range(length):
+    global _SIMULATOR
+    if _SIMULATOR is None:
+        _SIMULATOR = AerSimulator()
+    return _SIMULATOR
+
+# Circuit templates: every (bit, Alice basis, Bob basis) variant appears once per
+# block of 8 qubits, so one cached, transpiled circuit serves any protocol length.
+# Qubit i of a run reads the outcome of its own variant from shot i // copies.
+VARIANTS_PER_BLOCK = 8
+TEMPLATE_COPIES = 8
+
+@lru_cache(maxsize=16)
+def _variant_template(num_qubits: int) -> QuantumCircuit:
+    qc = QuantumCircuit(num_qubits, num_qubits)
+    for q in range(num_qubits):
+        variant = q % VARIANTS_PER_BLOCK
         # Alice prepares state
-        if alice_bits[i] == 1:
-            qc.x(i)
-        if alice_bases[i] == 'X':
-            qc.h(i)
-        
+        if variant & 4:
+            qc.x(q)
+        if variant & 2:
+            qc.h(q)
         # Bob measures in his basis
-        if bob_bases[i] == 'X':
-            qc.h(i)
-        qc.measure(i, i)
-
-    # Execute simulation once
-    simulator = AerSimulator()
-    job = simulator.run(qc, shots=1, memory=True)
-    result = job.result()
-    
-    # Get the raw bitstring (Little Endian -> reverse to match list index)
-    raw_measurements = result.get_memory()[0][::-1]
-    bob_results = [int(bit) for bit in raw_measurements]
-
-    # 3. Key Sifting
-    # We identify which indices matched bases to extract the final key
-    matching_indices = [i for i, (a, b) in enumerate(zip(alice_bases, bob_bases)) if a == b]
-    key_alice = [alice_bits[i] for i in matching_indices]
-    key_bob = [bob_results[i] for i in matching_indices]
-
-    # 4. Generate Qubit History Log (For UI Visualization)
-    # We only log the first 50 qubits to keep the return payload light for the UI
-    qubit_log = []
-    for i in range(min(length, 50)):
-        # Determine status based on basis matching
-        status = "MATCH" if alice_bases[i] == bob_bases[i] else "DISCARD"
-        
-        qubit_log.append({
-            "index": i,
-            "alice_bit": alice_bits[i],
-            "alice_basis": alice_bases[i],
-            "bob_basis": bob_bases[i],
-            "bob_result": bob_results[i],
-            "status": status
-        })
+        if variant & 1:
+            qc.h(q)
+        qc.measure(q, q)
+    # Transpiled once per qubit count; later calls only pay for simulation
+    return transpile(qc, basis_gates=["x", "h", "measure"], optimization_level=1)
 
-    # 5. Post-quantum authentication (Optional)
-    if authenticate and PQCRYPTO_AVAILABLE:
-        public_data = "".join(alice_bases).encode("utf-8")
+def template_cache_info() -> Dict[str, int]:
+    """
+    Hit/miss counters of the circuit template cache.
+    """
+    info = _variant_template.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "templates": info.currsize}
+
+def clear_template_cache() -> None:
+    _variant_template.cache_clear()
+
+def authenticate_public_data(public_data: bytes) -> None:
+    """
+    Signs and verifies the public protocol data with Dilithium5 (no-op without pqcrypto).
+    """
+    if not PQCRYPTO_AVAILABLE:
+        return
+    with span("bb84.authenticate"):
         dil = Dilithium(parameter_set=parameter_sets["Dilithium5"])
         pk, sk = dil.generate_keypair()
         signature = dil.sign(public_data, sk)
         if not dil.verify(public_data, signature, pk):
             raise ValueError("Post-quantum signature verification failed.")
 
-    # Returns: Alice's Key, Bob's Key, and the History Log
+def simulate_exchange(
+    length: int,
+    rng: RandomnessProvider
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs one engine shard: returns (alice_bits, alice_bases, bob_bases, bob_results)
+    as uint8 arrays, bases encoded 0 = Z, 1 = X.
+    """
+    # 1. Generate all random bits and bases at once in bulk
+    with span("bb84.random"):
+        alice_bits = rng.bits(length)
+        alice_bases = rng.bases(length)
+        bob_bases = rng.bases(length)
+
+    bob_results = measure_states(alice_bits, alice_bases, bob_bases, rng)
+    return alice_bits, alice_bases, bob_bases, bob_results
+
+def measure_states(
+    alice_bits: np.ndarray,
+    alice_bases: np.ndarray,
+    bob_bases: np.ndarray,
+    rng: RandomnessProvider
+) -> np.ndarray:
+    """
+    Bob's measurement of Alice's prepared states in his bases (uint8 results).
+    Split from simulate_exchange so each party can draw its own bits and bases.
+    """
+    length = len(alice_bits)
+    # 2. Simulation on the cached template: one run, one shot per TEMPLATE_COPIES qubits
+    copies = TEMPLATE_COPIES
+    with span("bb84.template"):
+        template = _variant_template(VARIANTS_PER_BLOCK * copies)
+    shots = max(1, -(-length // copies))
+    with span("bb84.simulate", shots=shots):
+        result = get_simulator().run(
+            template, shots=shots, memory=True, seed_simulator=rng.simulator_seed()
+        ).result()
+
+    with span("bb84.measure"):
+        # Memory strings are little endian -> reverse so column q is qubit q
+        memory = np.frombuffer("".join(result.get_memory()).encode("ascii"), dtype=np.uint8)
+        memory = (memory.reshape(shots, -1)[:, ::-1] - ord("0"))
+
+        # Pick each qubit's own variant column out of its shot
+        index = np.arange(length)
+        variant = (
+            (alice_bits.astype(np.int64) << 2)
+            | (alice_bases.astype(np.int64) << 1)
+            | bob_bases.astype(np.int64)
+        )
+        columns = (index % copies) * VARIANTS_PER_BLOCK + variant
+        return memory[index // copies, columns]
+
+def bb84_protocol(
+    length: int = 128,
+    authenticate: bool = False,
+    rng: Optional[RandomnessProvider] = None
+) -> Tuple[List[int], List[int], QubitRecord]:
+    """
+    Optimized BB84 protocol simulation returning keys and the full qubit record.
+    rng defaults to the buffered os.urandom provider; pass SeededRandomness
+    only in tests and benchmarks that need reproducible runs.
+    """
+    rng = resolve_provider(rng)
+    with span("bb84.exchange", length=length) as run:
+        alice_bits, alice_bases, bob_bases, bob_results = simulate_exchange(length, rng)
+
+        # 3. Key Sifting
+        # We identify which indices matched bases to extract the final key
+        with span("bb84.sift"):
+            matching = alice_bases == bob_bases
+            key_alice = alice_bits[matching].tolist()
+            key_bob = bob_results[matching].tolist()
+        run.set(sifted=len(key_alice))
+
+    # 4. Qubit history: the whole run as packed columns; the UI materialises windows lazily
+    qubit_log = QubitRecord.from_arrays(alice_bits, alice_bases, bob_bases, bob_results)
+
+    # 5. Post-quantum authentication (Optional)
+    if authenticate:
+        authenticate_public_data(np.where(alice_bases == 1, ord("X"), ord("Z")).astype(np.uint8).tobytes())
+
+    # Returns: Alice's Key, Bob's Key, and the History Record
     return key_alice, key_bob, qubit_log
\ No newline at end of file
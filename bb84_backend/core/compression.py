@@ -0,0 +1,174 @@
+import lzma
+import zlib
+from typing import Optional
+
+# Optional: Zstandard codec (faster than zlib at a better ratio)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+__all__ = [
+    "CODECS",
+    "available_codecs",
+    "estimate_compression_ratio",
+    "choose_codec",
+    "compress",
+    "decompress",
+    "StreamCompressor",
+    "StreamDecompressor",
+]
+
+CODEC_NONE = "none"
+CODECS = ("none", "zlib", "lzma", "zstd")
+
+# Sampling parameters for the compressibility estimate
+SAMPLE_BLOCKS = 4
+SAMPLE_BLOCK_SIZE = 16 * 1024
+# Below this size the codec header costs more than it saves
+MIN_COMPRESS_SIZE = 512
+# Skip compression unless the sample shrinks to at most this fraction
+MAX_USEFUL_RATIO = 0.9
+
+
+def available_codecs() -> tuple:
+    """
+    Returns the codecs usable in this environment.
+    """
+    return CODECS if ZSTD_AVAILABLE else tuple(c for c in CODECS if c != "zstd")
+
+
+def _check_codec(codec: str) -> None:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    if codec == "zstd" and not ZSTD_AVAILABLE:
+        raise RuntimeError("zstandard module not available — cannot use the zstd codec.")
+
+
+def estimate_compression_ratio(data: bytes) -> float:
+    """
+    Estimates the compressed/original size ratio from a few evenly spaced blocks.
+    Uses fast zlib level 1, so the cost stays bounded regardless of input size.
+    """
+    n = len(data)
+    if n == 0:
+        return 1.0
+
+    view = memoryview(data)
+    if n <= SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE:
+        samples = [view]
+    else:
+        # Spread the blocks over the whole input (head, middle, tail)
+        stride = (n - SAMPLE_BLOCK_SIZE) // (SAMPLE_BLOCKS - 1)
+        samples = [view[i * stride:i * stride + SAMPLE_BLOCK_SIZE] for i in range(SAMPLE_BLOCKS)]
+
+    sampled = sum(len(s) for s in samples)
+    compressed = sum(len(zlib.compress(s, 1)) for s in samples)
+    return compressed / sampled
+
+
+def choose_codec(data: bytes, preferred: str = "auto") -> str:
+    """
+    Resolves 'auto' to a concrete codec, skipping already-compressed media.
+    Explicit codec names are returned unchanged.
+    """
+    if preferred != "auto":
+        _check_codec(preferred)
+        return preferred
+
+    if len(data) < MIN_COMPRESS_SIZE:
+        return CODEC_NONE
+    if estimate_compression_ratio(data) > MAX_USEFUL_RATIO:
+        return CODEC_NONE
+    return "zstd" if ZSTD_AVAILABLE else "zlib"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """
+    One-shot compression with the named codec.
+    """
+    _check_codec(codec)
+    if codec == CODEC_NONE:
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "lzma":
+        return lzma.compress(data, preset=6)
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def decompress(data: bytes, codec: Optional[str]) -> bytes:
+    """
+    One-shot decompression. A missing codec means the payload was stored raw.
+    """
+    codec = codec or CODEC_NONE
+    _check_codec(codec)
+    if codec == CODEC_NONE:
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class StreamCompressor:
+    """
+    Incremental compressor for chunked (streaming) callers.
+    Feed chunks through compress() and append flush() at the end.
+    """
+
+    def __init__(self, codec: str):
+        _check_codec(codec)
+        self.codec = codec
+        if codec == "zlib":
+            self._obj = zlib.compressobj(6)
+        elif codec == "lzma":
+            self._obj = lzma.LZMACompressor(preset=6)
+        elif codec == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self._obj = None
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self._obj is None:
+            return bytes(chunk)
+        return self._obj.compress(chunk)
+
+    def flush(self) -> bytes:
+        if self._obj is None:
+            return b""
+        return self._obj.flush()
+
+
+class StreamDecompressor:
+    """
+    Incremental counterpart of StreamCompressor.
+    """
+
+    def __init__(self, codec: Optional[str]):
+        codec = codec or CODEC_NONE
+        _check_codec(codec)
+        self.codec = codec
+        if codec == "zlib":
+            self._obj = zlib.decompressobj()
+        elif codec == "lzma":
+            self._obj = lzma.LZMADecompressor()
+        elif codec == "zstd":
+            self._obj = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self._obj = None
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._obj is None:
+            return bytes(chunk)
+        if not chunk:
+            # lzma refuses any call once it has seen the end of the stream
+            return b""
+        return self._obj.decompress(chunk)
+
+    def flush(self) -> bytes:
+        if self._obj is None or not hasattr(self._obj, "flush"):
+            return b""
+        return self._obj.flush()
@@ -0,0 +1,274 @@
+"""
+Key-rate planning: how many raw qubits a BB84 run needs for a final key of a given
+length, and an engine that runs batches until that length is actually reached.
+
+Finite-key bound (Tomamichel et al., "Tight finite-key analysis for quantum
+cryptography", 2012) for n key bits and k disclosed sample bits:
+
+    l = n * (1 - h(Q + mu)) - leak_EC - log2(2 / (eps_sec^2 * eps_cor))
+    mu = sqrt((n + k) / (n * k) * (k + 1) / k * ln(1 / eps_sec))
+    leak_EC = f_EC * n * h(Q)
+
+Raw qubits follow from the detection probability (channel loss, detector
+efficiency), the 1/2 basis-sifting ratio and a margin for sifting fluctuations.
+"""
+import hashlib
+from math import ceil, floor, log, log2, sqrt
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bb84_backend.common.tracing import span
+from bb84_backend.core.bb84_quantum import simulate_exchange, authenticate_public_data
+from bb84_backend.core.qubit_record import QubitRecord
+from bb84_backend.core.randomness import RandomnessProvider, resolve_provider
+
+__all__ = ["binary_entropy", "secure_key_length", "detection_probability", "plan_raw_qubits", "generate_final_key",
+           "DEFAULT_EC_EFFICIENCY", "DEFAULT_EPS_SEC", "DEFAULT_EPS_COR", "FINAL_KEY_BITS"]
+
+# Error-correction efficiency of a practical code (1.0 = Shannon limit)
+DEFAULT_EC_EFFICIENCY = 1.16
+DEFAULT_EPS_SEC = 1e-10
+DEFAULT_EPS_COR = 1e-15
+# Final key length used for encryption; the planner sizes the raw qubit count
+FINAL_KEY_BITS = 256
+# Probability that one planned batch sifts fewer bits than planned
+DEFAULT_SHORTFALL = 1e-3
+SIFT_RATIO = 0.5
+
+# Sample fractions tried when splitting sifted bits into key and estimation sample
+_SAMPLE_FRACTIONS = np.linspace(0.02, 0.5, 49)
+_MAX_SIFTED = 1 << 40
+
+
+def binary_entropy(p: float) -> float:
+    if p <= 0.0:
+        return 0.0
+    if p >= 0.5:
+        return 1.0
+    return -p * log2(p) - (1 - p) * log2(1 - p)
+
+
+def secure_key_length(
+    n: int,
+    k: int,
+    qber: float,
+    f_ec: float = DEFAULT_EC_EFFICIENCY,
+    eps_sec: float = DEFAULT_EPS_SEC,
+    eps_cor: float = DEFAULT_EPS_COR
+) -> Dict:
+    """
+    Finite-key length extractable from n key bits after estimating qber on k sample
+    bits. Returns the length plus its terms (QBER bound, EC leakage, PA overhead).
+    """
+    if n <= 0 or k <= 0:
+        return {"secure_bits": 0, "qber_bound": 0.5, "ec_leak": 0, "pa_overhead": 0}
+    mu = sqrt((n + k) / (n * k) * (k + 1) / k * log(1 / eps_sec))
+    qber_bound = min(0.5, qber + mu)
+    ec_leak = f_ec * n * binary_entropy(qber)
+    pa_overhead = log2(2 / (eps_sec ** 2 * eps_cor))
+    length = n * (1 - binary_entropy(qber_bound)) - ec_leak - pa_overhead
+    return {
+        "secure_bits": max(0, floor(length)),
+        "qber_bound": round(qber_bound, 6),
+        "ec_leak": ceil(ec_leak),
+        "pa_overhead": ceil(pa_overhead),
+    }
+
+
+def _best_split(sifted: int, qber: float, f_ec: float, eps_sec: float, eps_cor: float) -> Tuple[int, Dict]:
+    """
+    Sample size k that maximises the secure length for a sifted pool of this size.
+    """
+    best_k, best = 0, {"secure_bits": 0}
+    for fraction in _SAMPLE_FRACTIONS:
+        k = max(1, int(sifted * fraction))
+        bound = secure_key_length(sifted - k, k, qber, f_ec, eps_sec, eps_cor)
+        if bound["secure_bits"] > best["secure_bits"]:
+            best_k, best = k, bound
+    return best_k, best
+
+
+def _raw_for_sifted(sifted: int, p_sift: float, shortfall: float) -> int:
+    """
+    Smallest N with N * p - z * sqrt(N * p * (1 - p)) >= sifted, i.e. N raw qubits
+    sift at least `sifted` bits except with probability about `shortfall`.
+    """
+    if sifted <= 0:
+        return 0
+    z = sqrt(2 * log(1 / shortfall))
+    sigma = sqrt(p_sift * (1 - p_sift))
+    root = (z * sigma + sqrt((z * sigma) ** 2 + 4 * p_sift * sifted)) / (2 * p_sift)
+    return ceil(root * root)
+
+
+def detection_probability(loss_db: float = 0.0, detector_efficiency: float = 1.0) -> float:
+    if loss_db < 0 or not 0 < detector_efficiency <= 1:
+        raise ValueError("loss_db must be >= 0 and detector_efficiency in (0, 1].")
+    return 10 ** (-loss_db / 10) * detector_efficiency
+
+
+def plan_raw_qubits(
+    target_bits: int,
+    qber: float = 0.0,
+    loss_db: float = 0.0,
+    detector_efficiency: float = 1.0,
+    f_ec: float = DEFAULT_EC_EFFICIENCY,
+    eps_sec: float = DEFAULT_EPS_SEC,
+    eps_cor: float = DEFAULT_EPS_COR,
+    shortfall: float = DEFAULT_SHORTFALL
+) -> Dict:
+    """
+    Raw qubit count for a final key of target_bits at the expected QBER and loss.
+    Finds the smallest sifted pool (and its best sample split) whose finite-key
+    length reaches the target, then scales by the detection and sifting rates.
+    Raises ValueError when no key can be distilled at this QBER.
+    """
+    if target_bits <= 0:
+        raise ValueError("target_bits must be positive.")
+    if (1 + f_ec) * binary_entropy(qber) >= 1:
+        raise ValueError(f"No secure key is possible at QBER {qber:.4f}.")
+
+    def reaches(sifted: int) -> bool:
+        return _best_split(sifted, qber, f_ec, eps_sec, eps_cor)[1]["secure_bits"] >= target_bits
+
+    # Exponential search for an upper bound, then bisection on the sifted pool size
+    hi = max(64, target_bits)
+    while not reaches(hi):
+        hi *= 2
+        if hi > _MAX_SIFTED:
+            raise ValueError(f"No secure key is possible at QBER {qber:.4f}.")
+    lo = hi // 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if reaches(mid):
+            hi = mid
+        else:
+            lo = mid
+
+    k, bound = _best_split(hi, qber, f_ec, eps_sec, eps_cor)
+    p_detect = detection_probability(loss_db, detector_efficiency)
+    return {
+        "target_bits": target_bits,
+        "raw_qubits": _raw_for_sifted(hi, p_detect * SIFT_RATIO, shortfall),
+        "sifted_bits": hi,
+        "key_bits": hi - k,
+        "sample_bits": k,
+        "qber": qber,
+        "detection_probability": p_detect,
+        **bound,
+    }
+
+
+def _sample_mask(n: int, k: int, rng: RandomnessProvider) -> np.ndarray:
+    """
+    Marks k of n positions for public comparison, chosen from the key-grade provider
+    (a predictable sample would let an eavesdropper avoid it).
+    """
+    order = np.argsort(np.frombuffer(rng.random_bytes(8 * n), dtype=np.uint64), kind="stable")
+    mask = np.zeros(n, dtype=bool)
+    mask[order[:k]] = True
+    return mask
+
+
+def _privacy_amplification(key: np.ndarray, seed: bytes, length: int) -> np.ndarray:
+    # SHAKE-256 as the extractor: seed is public, output length is the secure target
+    digest = hashlib.shake_256(b"qofl-e-noori/pa" + seed + np.packbits(key).tobytes()).digest((length + 7) // 8)
+    return np.unpackbits(np.frombuffer(digest, dtype=np.uint8), count=length)
+
+
+def generate_final_key(
+    target_bits: int,
+    qber: float = 0.0,
+    loss_db: float = 0.0,
+    detector_efficiency: float = 1.0,
+    authenticate: bool = False,
+    rng: Optional[RandomnessProvider] = None,
+    max_batches: int = 8,
+    f_ec: float = DEFAULT_EC_EFFICIENCY,
+    eps_sec: float = DEFAULT_EPS_SEC,
+    eps_cor: float = DEFAULT_EPS_COR
+) -> Tuple[List[int], List[int], QubitRecord, Dict]:
+    """
+    Runs BB84 in planned batches until the sifted pool supports a finite-key length
+    of target_bits, then estimates the QBER on a random sample, reconciles and
+    compresses both keys to exactly target_bits.
+
+    The first batch is sized by plan_raw_qubits; later batches only cover the
+    shortfall, re-planned with the QBER observed so far. Error correction is
+    simulated (Bob adopts Alice's bits) and charged as f_EC * n * h(Q) leakage.
+    Returns (Alice's key, Bob's key, record of detected qubits, report).
+    """
+    rng = resolve_provider(rng)
+    plan = plan_raw_qubits(target_bits, qber, loss_db, detector_efficiency, f_ec, eps_sec, eps_cor)
+    p_detect = plan["detection_probability"]
+
+    runs: List[Tuple[np.ndarray, ...]] = []
+    pool_a = np.zeros(0, dtype=np.uint8)
+    pool_b = np.zeros(0, dtype=np.uint8)
+    raw_total = disclosed = 0
+    batch_qubits = plan["raw_qubits"]
+    needed = plan["sifted_bits"]
+    observed = qber
+
+    with span("keyrate.generate", target=target_bits) as run:
+        for batch in range(1, max_batches + 1):
+            with span("keyrate.batch", qubits=batch_qubits):
+                alice_bits, alice_bases, bob_bases, bob_results = simulate_exchange(batch_qubits, rng)
+                raw_total += batch_qubits
+                if p_detect < 1.0:
+                    detected = rng.generator().random(batch_qubits) < p_detect
+                    alice_bits, alice_bases = alice_bits[detected], alice_bases[detected]
+                    bob_bases, bob_results = bob_bases[detected], bob_results[detected]
+                runs.append((alice_bits, alice_bases, bob_bases, bob_results))
+                matching = alice_bases == bob_bases
+                pool_a = np.concatenate([pool_a, alice_bits[matching]])
+                pool_b = np.concatenate([pool_b, bob_results[matching]])
+
+            if len(pool_a) >= needed:
+                # Parameter estimation: disclosed sample bits leave the pool
+                k, _ = _best_split(len(pool_a), observed, f_ec, eps_sec, eps_cor)
+                sample = _sample_mask(len(pool_a), k, rng)
+                errors = int(np.count_nonzero(pool_a[sample] != pool_b[sample]))
+                observed = errors / k
+                disclosed += k
+                pool_a, pool_b = pool_a[~sample], pool_b[~sample]
+                bound = secure_key_length(len(pool_a), k, observed, f_ec, eps_sec, eps_cor)
+                if bound["secure_bits"] >= target_bits:
+                    break
+                if (1 + f_ec) * binary_entropy(observed) >= 1:
+                    raise ValueError(f"Observed QBER {observed:.4f} is too high for a secure key.")
+                replan = plan_raw_qubits(target_bits, observed, loss_db, detector_efficiency, f_ec, eps_sec, eps_cor)
+                needed = max(replan["sifted_bits"], len(pool_a) + replan["sifted_bits"] // 8)
+            batch_qubits = _raw_for_sifted(needed - len(pool_a), p_detect * SIFT_RATIO, DEFAULT_SHORTFALL)
+        else:
+            raise ValueError(f"Target key length of {target_bits} bits not reached in {max_batches} batches.")
+        run.set(batches=batch, raw=raw_total)
+
+    if authenticate:
+        public = hashlib.sha3_256()
+        for _, alice_bases, _, _ in runs:
+            public.update(np.packbits(alice_bases).tobytes())
+        authenticate_public_data(public.digest())
+
+    # Error correction (simulated) and privacy amplification with a shared public seed
+    with span("keyrate.distill"):
+        # Bob's errors are corrected to Alice's bits; the leakage is already in the bound
+        reconciled = pool_a.copy()
+        seed = rng.random_bytes(32)
+        key_alice = _privacy_amplification(pool_a, seed, target_bits)
+        key_bob = _privacy_amplification(reconciled, seed, target_bits)
+
+    qubit_log = QubitRecord.from_arrays(*(np.concatenate(column) for column in zip(*runs)))
+    report = {
+        "target_bits": target_bits,
+        "planned_qubits": plan["raw_qubits"],
+        "raw_qubits": raw_total,
+        "detected": len(qubit_log),
+        "sifted": len(pool_a) + disclosed,
+        "sample_bits": disclosed,
+        "qber": round(observed, 6),
+        "batches": batch,
+        **bound,
+    }
+    return key_alice.tolist(), key_bob.tolist(), qubit_log, report
@@ -1,17 +1,35 @@
-from typing import List
+from typing import List, Optional
 from hashlib import pbkdf2_hmac
 import hmac
 import os
 
-def check_key_entropy(bits: List[int]) -> bool:
+from bb84_backend.common.tracing import span
+from bb84_backend.core.randomness_tests import run_battery
+
+# Key derivation functions, recorded per package by identifier.
+# PBKDF2 stretches low-entropy passwords; sifted BB84 keys are already uniformly
+# random, so a single HKDF extract/expand is sufficient and orders of magnitude cheaper.
+KDF_PBKDF2 = "pbkdf2-sha256"
+KDF_HKDF_SHA256 = "hkdf-sha256"
+KDF_HKDF_SHA3 = "hkdf-sha3-256"
+KDFS = (KDF_PBKDF2, KDF_HKDF_SHA256, KDF_HKDF_SHA3)
+DEFAULT_KDF = KDF_HKDF_SHA256
+
+_HKDF_HASHES = {KDF_HKDF_SHA256: "sha256", KDF_HKDF_SHA3: "sha3_256"}
+_HKDF_INFO = b"qofl-e-noori/aes-256-cbc"
+
+# Per-key check level: with six tests at 0.01 roughly one good key in twenty would
+# be flagged, so generated keys are held to 0.001 instead
+KEY_CHECK_ALPHA = 0.001
+
+def check_key_entropy(bits: List[int], alpha: float = KEY_CHECK_ALPHA, bit_count: Optional[int] = None) -> bool:
     """
-    Optimized entropy check using native sum and length.
+    Runs the SP 800-22 subset from randomness_tests on the key bits.
+    Bit lists and bytes are accepted directly; a packed uint8 array from np.packbits
+    needs bit_count (e.g. len(packed) * 8), otherwise each byte is read as one bit.
     """
-    n = len(bits)
-    if n == 0: return False
-    # abs(ones - n/2) / n  =>  abs(2*ones - n) / (2*n)
-    balance_ratio = abs(2 * sum(bits) - n) / (2 * n)
-    return balance_ratio < 0.4
+    if len(bits) == 0: return False
+    return run_battery(bits, alpha=alpha, bit_count=bit_count)["passed"]
 
 def bits_to_bytes(bits: List[int]) -> bytes:
     """
@@ -41,17 +59,42 @@ def bytes_to_bits(data: bytes) -> List[int]:
             bits[i * 8 + j] = (byte >> (7 - j)) & 1
     return bits
 
-def derive_aes_key_from_bits(bits: List[int], salt: bytes = None, iterations: int = 100_000) -> bytes:
+def hkdf(ikm: bytes, salt: bytes, info: bytes, length: int = 32, hash_name: str = "sha256") -> bytes:
+    """
+    RFC 5869 HKDF (extract + expand) on top of the C-level hmac.digest.
+    """
+    prk = hmac.digest(salt, ikm, hash_name)
+    okm = b""
+    block = b""
+    counter = 1
+    while len(okm) < length:
+        block = hmac.digest(prk, block + info + bytes([counter]), hash_name)
+        okm += block
+        counter += 1
+    return okm[:length]
+
+def derive_key(raw_material: bytes, salt: bytes, kdf: str = KDF_PBKDF2, iterations: int = 100_000) -> bytes:
+    """
+    Derives a 32-byte AES key with the KDF named by its package identifier.
+    """
+    with span("kdf.derive", kdf=kdf):
+        if kdf == KDF_PBKDF2:
+            return pbkdf2_hmac('sha256', raw_material, salt, iterations, dklen=32)
+        if kdf in _HKDF_HASHES:
+            return hkdf(raw_material, salt, _HKDF_INFO, 32, _HKDF_HASHES[kdf])
+    raise ValueError(f"Unknown key derivation function: {kdf}")
+
+def derive_aes_key_from_bits(bits: List[int], salt: bytes = None, iterations: int = 100_000, kdf: str = KDF_PBKDF2) -> bytes:
     """
-    Derives 48-byte key + salt using PBKDF2.
+    Derives 48-byte key + salt (PBKDF2 by default, HKDF for QKD key material).
     """
     # bits_to_bytes refactored above makes this much faster
     raw_material = bits_to_bytes(bits)
     salt = salt or os.urandom(16)
-    key = pbkdf2_hmac('sha256', raw_material, salt, iterations, dklen=32)
+    key = derive_key(raw_material, salt, kdf, iterations)
     return key + salt
 
-def verify_key_integrity(key_with_salt: bytes, bits: List[int], iterations: int = 100_000) -> bool:
+def verify_key_integrity(key_with_salt: bytes, bits: List[int], iterations: int = 100_000, kdf: str = KDF_PBKDF2) -> bool:
     """
     Verifies key integrity using constant-time comparison.
     """
@@ -60,7 +103,24 @@ def verify_key_integrity(key_with_salt: bytes, bits: List[int], iterations: int
         
     salt = key_with_salt[32:48]
     # Recompute using the optimized bits_to_bytes
-    expected_key = pbkdf2_hmac('sha256', bits_to_bytes(bits), salt, iterations, dklen=32)
+    expected_key = derive_key(bits_to_bytes(bits), salt, kdf, iterations)
     
     # hmac.compare_digest prevents timing attacks
-    return hmac.compare_digest(key_with_salt[:32], expected_key)
\ No newline at end of file
+    return hmac.compare_digest(key_with_salt[:32], expected_key)
+
+
+def derive_session_subkey(session_bits: List[int], session_id: str, index: int, label: str = "file", length: int = 256) -> List[int]:
+    """
+    Derives the per-file subkey of a BB84 session (HKDF over the shared session key).
+    Both parties reach the same bits from (session key, session id, label, index).
+    """
+    info = f"qofl-e-noori/session/{label}/{index}".encode("utf-8")
+    okm = hkdf(bits_to_bytes(session_bits), session_id.encode("ascii"), info, length // 8)
+    return bytes_to_bits(okm)
+
+def key_id(bits: List[int]) -> str:
+    """
+    Short public identifier of a BB84 key (HKDF output, reveals nothing about the key).
+    Alice's and Bob's copies of the same key give the same id.
+    """
+    return hkdf(bits_to_bytes(bits), b"", b"qofl-e-noori/key-id", 8).hex()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bb84_backend.common.tracing import span
+from bb84_backend.core.bb84_quantum import simulate_exchange, authenticate_public_data
+from bb84_backend.core.randomness import RandomnessProvider, SeededRandomness, resolve_provider
+
+__all__ = ["bb84_protocol_parallel", "plan_shards", "DEFAULT_SHARD_QUBITS"]
+
+# Qubits per engine shard: large enough to amortise the simulator run, small enough
+# that one shard's measurement memory stays in the tens of MB
+DEFAULT_SHARD_QUBITS = 1 << 20
+
+
+def plan_shards(length: int, shard_qubits: int = DEFAULT_SHARD_QUBITS) -> List[Tuple[int, int]]:
+    """
+    (raw offset, qubit count) per shard. Offsets are fixed before any work starts:
+    shard i writes its sifted bits at its raw offset, which can never overlap the
+    next shard because a shard sifts at most as many bits as it sends.
+    """
+    return [(offset, min(shard_qubits, length - offset)) for offset in range(0, length, shard_qubits)]
+
+
+def _run_shard(shm_name: str, length: int, offset: int, count: int, seed: Optional[int]) -> Tuple[int, int, bytes]:
+    """
+    Worker body: simulates one shard and writes Alice's and Bob's sifted bits into
+    the shared buffer (Alice at [offset, ...), Bob at [length + offset, ...)).
+    Returns only (sifted count, error count, bases digest) to the parent.
+    """
+    rng = SeededRandomness(seed) if seed is not None else resolve_provider(None)
+    alice_bits, alice_bases, bob_bases, bob_results = simulate_exchange(count, rng)
+    matching = alice_bases == bob_bases
+    sifted_a = alice_bits[matching]
+    sifted_b = bob_results[matching]
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buffer = np.ndarray((2 * length,), dtype=np.uint8, buffer=shm.buf)
+        buffer[offset:offset + len(sifted_a)] = sifted_a
+        buffer[length + offset:length + offset + len(sifted_b)] = sifted_b
+        del buffer
+    finally:
+        shm.close()
+
+    errors = int(np.count_nonzero(sifted_a != sifted_b))
+    return len(sifted_a), errors, hashlib.sha3_256(np.packbits(alice_bases).tobytes()).digest()
+
+
+def bb84_protocol_parallel(
+    length: int,
+    authenticate: bool = False,
+    workers: Optional[int] = None,
+    shard_qubits: int = DEFAULT_SHARD_QUBITS,
+    rng: Optional[RandomnessProvider] = None
+) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    BB84 for very long keys: the raw qubit budget is split into shards that run on
+    a process pool. Workers write sifted bits straight into one shared-memory buffer
+    at precomputed offsets and the parent compacts the shards in order, so no key
+    material is pickled. Returns (Alice's key, Bob's key) as uint8 arrays plus stats.
+
+    A deterministic rng (tests/benchmarks only) gives each shard a seed drawn from it,
+    so parallel runs stay reproducible; otherwise every worker uses its own urandom.
+    """
+    if length <= 0:
+        raise ValueError("length must be a positive number of qubits.")
+    rng = resolve_provider(rng)
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(length, shard_qubits)
+    seeds = [int.from_bytes(rng.random_bytes(8), "big") if rng.deterministic else None for _ in shards]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 2 * length))
+    try:
+        with span("bb84.parallel", length=length, shards=len(shards), workers=workers):
+            if workers == 1 or len(shards) == 1:
+                results = [_run_shard(shm.name, length, off, n, seed) for (off, n), seed in zip(shards, seeds)]
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+                    futures = [pool.submit(_run_shard, shm.name, length, off, n, seed)
+                               for (off, n), seed in zip(shards, seeds)]
+                    results = [future.result() for future in futures]
+
+        with span("bb84.compact"):
+            buffer = np.ndarray((2 * length,), dtype=np.uint8, buffer=shm.buf)
+            key_alice = np.concatenate([buffer[off:off + sifted] for (off, _), (sifted, _, _) in zip(shards, results)])
+            key_bob = np.concatenate([buffer[length + off:length + off + sifted]
+                                      for (off, _), (sifted, _, _) in zip(shards, results)])
+            del buffer
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Post-quantum authentication over the per-shard basis digests, in shard order
+    if authenticate:
+        authenticate_public_data(hashlib.sha3_256(b"".join(digest for _, _, digest in results)).digest())
+
+    sifted = len(key_alice)
+    errors = sum(e for _, e, _ in results)
+    stats = {
+        "qubits": length,
+        "shards": len(shards),
+        "workers": min(workers, len(shards)),
+        "sifted": sifted,
+        "qber": round(errors / sifted, 6) if sifted else 0.0,
+    }
+    return key_alice, key_bob, stats
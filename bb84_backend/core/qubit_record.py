@@ -0,0 +1,176 @@
+import csv
+import io
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+import numpy as np
+
+__all__ = ["QubitRecord", "QubitLogView", "COLUMNS"]
+
+# Column order used by the packed storage, the .npz export and the CSV header
+COLUMNS = ("alice_bit", "alice_basis", "bob_basis", "bob_result", "match")
+
+_BASIS_NAMES = ("Z", "X")
+
+# Rows unpacked per step when exporting CSV
+_CSV_CHUNK = 65_536
+
+
+class QubitRecord(Sequence):
+    """
+    Full history of one BB84 run as bit-packed columns (one bit per qubit per
+    column, about 5 bits per qubit in total). Indexing and iteration yield the
+    per-qubit dicts the UI used to receive; they are only built on access.
+    """
+
+    def __init__(self, length: int, packed: Dict[str, np.ndarray]):
+        self.length = length
+        self._packed = packed
+
+    @classmethod
+    def from_arrays(
+        cls,
+        alice_bits: np.ndarray,
+        alice_bases: np.ndarray,
+        bob_bases: np.ndarray,
+        bob_results: np.ndarray
+    ) -> "QubitRecord":
+        """
+        Packs 0/1 arrays of equal length; bases are encoded 0 = Z, 1 = X.
+        """
+        columns = {
+            "alice_bit": alice_bits,
+            "alice_basis": alice_bases,
+            "bob_basis": bob_bases,
+            "bob_result": bob_results,
+            "match": alice_bases == bob_bases,
+        }
+        packed = {name: np.packbits(np.asarray(col, dtype=np.uint8)) for name, col in columns.items()}
+        return cls(len(alice_bits), packed)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                raise ValueError("QubitRecord slices must be contiguous.")
+            return self.window(start, stop)
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("qubit index out of range")
+        return next(iter(self.window(index, index + 1)))
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.window(0, self.length))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self._packed.values())
+
+    def column(self, name: str, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Unpacks one column for [start, stop) only, touching just the bytes it covers.
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        start = max(0, start)
+        if stop <= start:
+            return np.zeros(0, dtype=np.uint8)
+        first = start // 8
+        chunk = np.unpackbits(self._packed[name][first:(stop + 7) // 8])
+        return chunk[start - first * 8:stop - first * 8]
+
+    def window(self, start: int = 0, stop: Optional[int] = None) -> "QubitLogView":
+        stop = self.length if stop is None else stop
+        return QubitLogView(self, max(0, start), min(stop, self.length))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Whole-run counters computed on the packed columns.
+        """
+        matched = int(np.unpackbits(self._packed["match"], count=self.length).sum())
+        # Errors: matching bases but Bob's result differs from Alice's bit
+        diff = np.bitwise_and(
+            np.bitwise_xor(self._packed["alice_bit"], self._packed["bob_result"]),
+            self._packed["match"]
+        )
+        errors = int(np.unpackbits(diff, count=self.length).sum())
+        return {
+            "qubits": self.length,
+            "sifted": matched,
+            "match_rate": round(matched / self.length, 4) if self.length else 0.0,
+            "qber": round(errors / matched, 6) if matched else 0.0,
+        }
+
+    def save_npz(self, path) -> None:
+        np.savez_compressed(path, length=np.int64(self.length), **self._packed)
+
+    @classmethod
+    def load_npz(cls, path) -> "QubitRecord":
+        with np.load(path) as data:
+            return cls(int(data["length"]), {name: data[name] for name in COLUMNS})
+
+    def to_csv(self, target, start: int = 0, stop: Optional[int] = None) -> None:
+        """
+        Writes index plus the five columns as 0/1 (bases as Z/X) to a path or
+        text file object, unpacking a chunk of rows at a time.
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        if isinstance(target, (str, bytes)) or hasattr(target, "__fspath__"):
+            with open(target, "w", newline="") as f:
+                self.to_csv(f, start, stop)
+            return
+
+        writer = csv.writer(target)
+        writer.writerow(("index",) + COLUMNS)
+        basis = np.array(_BASIS_NAMES)
+        for lo in range(start, stop, _CSV_CHUNK):
+            hi = min(lo + _CSV_CHUNK, stop)
+            cols = [self.column(name, lo, hi) for name in COLUMNS]
+            writer.writerows(zip(
+                range(lo, hi),
+                cols[0].tolist(),
+                basis[cols[1]].tolist(),
+                basis[cols[2]].tolist(),
+                cols[3].tolist(),
+                cols[4].tolist(),
+            ))
+
+    def to_csv_string(self, start: int = 0, stop: Optional[int] = None) -> str:
+        buffer = io.StringIO()
+        self.to_csv(buffer, start, stop)
+        return buffer.getvalue()
+
+
+class QubitLogView(Sequence):
+    """
+    Window [start, stop) of a QubitRecord; dicts are built only when accessed.
+    """
+
+    def __init__(self, record: QubitRecord, start: int, stop: int):
+        self.record = record
+        self.start = start
+        self.stop = max(start, stop)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("qubit index out of range")
+        return self.record[self.start + index]
+
+    def __iter__(self) -> Iterator[Dict]:
+        cols = [self.record.column(name, self.start, self.stop) for name in COLUMNS]
+        for offset, (bit, a_basis, b_basis, result, match) in enumerate(zip(*cols)):
+            yield {
+                "index": self.start + offset,
+                "alice_bit": int(bit),
+                "alice_basis": _BASIS_NAMES[a_basis],
+                "bob_basis": _BASIS_NAMES[b_basis],
+                "bob_result": int(result),
+                "status": "MATCH" if match else "DISCARD",
+            }
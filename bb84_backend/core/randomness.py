@@ -0,0 +1,116 @@
+"""
+Randomness providers for the BB84 engines.
+
+SystemRandomness draws os.urandom in large buffers and expands them to bits and
+bases in bulk. SeededRandomness is deterministic and exists for tests and
+benchmarks only: keys produced with it are reproducible by anyone with the seed.
+"""
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+__all__ = ["RandomnessProvider", "SystemRandomness", "SeededRandomness",
+           "default_provider", "resolve_provider"]
+
+# One urandom call per 64 KiB covers 512k qubits worth of bits or bases
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class RandomnessProvider:
+    """
+    Interface shared by the providers. Bases are encoded 0 = Z, 1 = X.
+    """
+    deterministic = False
+
+    def random_bytes(self, n: int) -> bytes:
+        raise NotImplementedError
+
+    def bits(self, n: int) -> np.ndarray:
+        """
+        n uniformly random bits as a uint8 array of 0/1 values.
+        """
+        return np.unpackbits(np.frombuffer(self.random_bytes((n + 7) // 8), dtype=np.uint8), count=n)
+
+    def bases(self, n: int) -> np.ndarray:
+        return self.bits(n)
+
+    def generator(self) -> np.random.Generator:
+        """
+        NumPy Generator seeded from this provider, for distribution sampling
+        (e.g. Poisson photon numbers). Not a CSPRNG; never use it for key bits.
+        """
+        seed = int.from_bytes(self.random_bytes(32), "big")
+        return np.random.Generator(np.random.PCG64(seed))
+
+    def simulator_seed(self) -> Optional[int]:
+        """
+        Seed for the Aer simulator; None leaves it to the simulator's own entropy.
+        """
+        return None
+
+
+class SystemRandomness(RandomnessProvider):
+    """
+    os.urandom behind a refillable buffer; thread-safe and fork-aware.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._buffer = b""
+        self._pos = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def random_bytes(self, n: int) -> bytes:
+        if n >= self.buffer_size:
+            return os.urandom(n)
+        with self._lock:
+            # A forked child must not replay bytes the parent already buffered
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._buffer, self._pos = b"", 0
+            if self._pos + n > len(self._buffer):
+                self._buffer, self._pos = os.urandom(self.buffer_size), 0
+            out = self._buffer[self._pos:self._pos + n]
+            self._pos += n
+            return out
+
+
+class SeededRandomness(RandomnessProvider):
+    """
+    TEST AND BENCHMARK USE ONLY. Deterministic stream from a seed so runs,
+    including the simulator's measurement outcomes, can be reproduced exactly.
+    """
+    deterministic = True
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._rng = np.random.Generator(np.random.PCG64(seed))
+        self._lock = threading.Lock()
+
+    def random_bytes(self, n: int) -> bytes:
+        with self._lock:
+            return self._rng.bytes(n)
+
+    def simulator_seed(self) -> Optional[int]:
+        with self._lock:
+            return int(self._rng.integers(0, 2 ** 31 - 1))
+
+
+_DEFAULT: Optional[SystemRandomness] = None
+
+
+def default_provider() -> SystemRandomness:
+    """
+    Process-wide SystemRandomness used when no provider is passed in.
+    """
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = SystemRandomness()
+    return _DEFAULT
+
+
+def resolve_provider(rng: Optional[RandomnessProvider]) -> RandomnessProvider:
+    return default_provider() if rng is None else rng
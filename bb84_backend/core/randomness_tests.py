@@ -0,0 +1,194 @@
+import math
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+from scipy.special import gammaincc
+
+from bb84_backend.common.tracing import span
+
+__all__ = [
+    "as_bit_array",
+    "frequency_test",
+    "block_frequency_test",
+    "runs_test",
+    "longest_run_test",
+    "serial_test",
+    "approximate_entropy_test",
+    "run_battery",
+]
+
+# Significance level used by NIST SP 800-22
+DEFAULT_ALPHA = 0.01
+
+BitsLike = Union[Sequence[int], np.ndarray, bytes]
+
+# Longest-run-of-ones parameters (SP 800-22 section 2.4): min n, block size M,
+# class boundaries and class probabilities
+_LONGEST_RUN_TABLES = (
+    (750_000, 10_000, (10, 16), (0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727)),
+    (6_272, 128, (4, 9), (0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124)),
+    (128, 8, (1, 4), (0.2148, 0.3672, 0.2305, 0.1875)),
+)
+
+
+def as_bit_array(bits: BitsLike, bit_count: Optional[int] = None) -> np.ndarray:
+    """
+    Normalises keys to a uint8 array of 0/1 values.
+    Packed input (bytes or a uint8 array from np.packbits) needs bit_count or uses all bits.
+    """
+    if isinstance(bits, (bytes, bytearray, memoryview)):
+        packed = np.frombuffer(bits, dtype=np.uint8)
+        return np.unpackbits(packed, count=bit_count)
+    if isinstance(bits, np.ndarray):
+        if bit_count is not None:
+            return np.unpackbits(bits.astype(np.uint8, copy=False), count=bit_count)
+        return bits.astype(np.uint8, copy=False)
+    return np.fromiter(bits, dtype=np.uint8, count=len(bits))
+
+
+def _pattern_counts(bits: np.ndarray, m: int) -> np.ndarray:
+    """
+    Counts of all overlapping m-bit patterns with wraparound, as one bincount.
+    """
+    n = len(bits)
+    if m == 0:
+        return np.array([n])
+    extended = np.concatenate((bits, bits[:m - 1])).astype(np.int32)
+    values = np.zeros(n, dtype=np.int32)
+    for j in range(m):
+        values = (values << 1) | extended[j:j + n]
+    return np.bincount(values, minlength=1 << m)
+
+
+def _shorter_pattern_counts(counts: np.ndarray) -> np.ndarray:
+    # With wraparound, (k-1)-bit counts are k-bit counts summed over the last bit
+    return counts.reshape(-1, 2).sum(axis=1)
+
+
+def frequency_test(bits: np.ndarray) -> float:
+    n = len(bits)
+    s = 2 * int(np.count_nonzero(bits)) - n
+    return math.erfc(abs(s) / math.sqrt(2 * n))
+
+
+def block_frequency_test(bits: np.ndarray, block_size: Optional[int] = None) -> float:
+    n = len(bits)
+    # M >= 20, M > 0.01 n and at most 99 blocks
+    m = block_size or max(20, n // 99 + 1)
+    blocks = n // m
+    proportions = bits[:blocks * m].reshape(blocks, m).sum(axis=1, dtype=np.int64) / m
+    chi2 = 4.0 * m * float(np.sum((proportions - 0.5) ** 2))
+    return float(gammaincc(blocks / 2.0, chi2 / 2.0))
+
+
+def runs_test(bits: np.ndarray) -> float:
+    n = len(bits)
+    pi = np.count_nonzero(bits) / n
+    # Prerequisite frequency check from the specification
+    if abs(pi - 0.5) >= 2.0 / math.sqrt(n):
+        return 0.0
+    v_obs = 1 + int(np.count_nonzero(bits[1:] != bits[:-1]))
+    return math.erfc(abs(v_obs - 2 * n * pi * (1 - pi)) / (2 * math.sqrt(2 * n) * pi * (1 - pi)))
+
+
+def longest_run_test(bits: np.ndarray) -> Optional[float]:
+    n = len(bits)
+    for min_n, m, (low, high), probabilities in _LONGEST_RUN_TABLES:
+        if n >= min_n:
+            break
+    else:
+        return None
+
+    blocks = n // m
+    # Zero-pad each block on both sides; the longest run is the widest gap between zeros
+    padded = np.zeros((blocks, m + 2), dtype=np.uint8)
+    padded[:, 1:-1] = bits[:blocks * m].reshape(blocks, m)
+    zero_idx = np.flatnonzero(padded.ravel() == 0)
+    gaps = np.diff(zero_idx) - 1
+    row_starts = np.searchsorted(zero_idx, np.arange(blocks) * (m + 2))
+    longest = np.maximum.reduceat(gaps, row_starts)
+
+    counts = np.bincount(np.clip(longest, low, high) - low, minlength=high - low + 1)
+    expected = blocks * np.asarray(probabilities)
+    chi2 = float(np.sum((counts - expected) ** 2 / expected))
+    return float(gammaincc((high - low) / 2.0, chi2 / 2.0))
+
+
+def serial_test(bits: np.ndarray, m: Optional[int] = None) -> Optional[Dict[str, float]]:
+    n = len(bits)
+    # m < floor(log2 n) - 2
+    m = m or min(16, int(math.log2(n)) - 3)
+    if m < 2:
+        return None
+
+    def psi2(counts: np.ndarray, k: int) -> float:
+        if k <= 0:
+            return 0.0
+        counts = counts.astype(np.float64)
+        return (1 << k) / n * float(np.sum(counts ** 2)) - n
+
+    # One pass over the data; the shorter pattern counts are folded from it
+    counts_m = _pattern_counts(bits, m)
+    counts_m1 = _shorter_pattern_counts(counts_m)
+    counts_m2 = _shorter_pattern_counts(counts_m1)
+    psi_m, psi_m1, psi_m2 = psi2(counts_m, m), psi2(counts_m1, m - 1), psi2(counts_m2, m - 2)
+    delta1 = psi_m - psi_m1
+    delta2 = psi_m - 2 * psi_m1 + psi_m2
+    return {
+        "p_value_1": float(gammaincc(2 ** (m - 2), delta1 / 2.0)),
+        "p_value_2": float(gammaincc(2 ** (m - 3), delta2 / 2.0)),
+        "m": m,
+    }
+
+
+def approximate_entropy_test(bits: np.ndarray, m: Optional[int] = None) -> Optional[float]:
+    n = len(bits)
+    # m < floor(log2 n) - 5
+    m = m or min(10, int(math.log2(n)) - 6)
+    if m < 1:
+        return None
+
+    def phi(counts: np.ndarray) -> float:
+        c = counts[counts > 0] / n
+        return float(np.sum(c * np.log(c)))
+
+    counts_m1 = _pattern_counts(bits, m + 1)
+    ap_en = phi(_shorter_pattern_counts(counts_m1)) - phi(counts_m1)
+    chi2 = 2.0 * n * (math.log(2) - ap_en)
+    return float(gammaincc(2 ** (m - 1), chi2 / 2.0))
+
+
+def run_battery(bits: BitsLike, alpha: float = DEFAULT_ALPHA, bit_count: Optional[int] = None) -> Dict:
+    """
+    Runs the SP 800-22 subset (frequency, block frequency, runs, longest run,
+    serial, approximate entropy) and reports p-values per test.
+    Tests whose minimum length is not met are reported as skipped.
+    """
+    arr = as_bit_array(bits, bit_count)
+    n = len(arr)
+    report: Dict = {"bits": n, "alpha": alpha, "tests": {}, "passed": False}
+    if n < 100:
+        report["error"] = "At least 100 bits are required."
+        return report
+
+    with span("randomness.battery", bits=n):
+        serial = serial_test(arr)
+        p_values = {
+            "frequency": frequency_test(arr),
+            "block_frequency": block_frequency_test(arr),
+            "runs": runs_test(arr),
+            "longest_run": longest_run_test(arr),
+            "serial": None if serial is None else min(serial["p_value_1"], serial["p_value_2"]),
+            "approximate_entropy": approximate_entropy_test(arr),
+        }
+
+    for name, p in p_values.items():
+        if p is None:
+            report["tests"][name] = {"p_value": None, "passed": None, "skipped": True}
+        else:
+            report["tests"][name] = {"p_value": round(p, 6), "passed": p >= alpha}
+    ran = [t["passed"] for t in report["tests"].values() if t["passed"] is not None]
+    report["passed"] = all(ran)
+    report["tests_passed"] = sum(ran)
+    report["tests_run"] = len(ran)
+    return report
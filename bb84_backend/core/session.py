@@ -0,0 +1,52 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from bb84_backend.core.key_rate import generate_final_key, FINAL_KEY_BITS
+from bb84_backend.core.key_utils import derive_session_subkey
+from bb84_backend.core.randomness import RandomnessProvider, resolve_provider
+
+class BB84Session:
+    """
+    One BB84 exchange shared by many files.
+    Each file gets its own subkey derived from the session key with a context
+    label and a counter, so a batch needs a single quantum run and a single Key B.
+    The session key is the planned, privacy-amplified key of generate_final_key.
+    """
+
+    def __init__(
+        self,
+        key_bits: int = FINAL_KEY_BITS,
+        authenticate: bool = True,
+        min_key_bits: int = 256,
+        rng: Optional[RandomnessProvider] = None
+    ):
+        if key_bits < min_key_bits:
+            raise ValueError(f"Session key too short ({key_bits} bits); at least {min_key_bits} are required.")
+        rng = resolve_provider(rng)
+        self.session_id = rng.random_bytes(8).hex()
+        self.key_a_bits, self.key_b_bits, self.qubit_log, self.key_report = generate_final_key(
+            key_bits, authenticate=authenticate, rng=rng
+        )
+        self._next_index = 0
+        self._lock = threading.Lock()
+
+    def next_subkey(self, label: str = "file") -> Tuple[List[int], List[int], Dict]:
+        """
+        Returns (Alice subkey, Bob subkey, package fields) for the next file.
+        Indices are never reused within a session.
+        """
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+
+        key_a = derive_session_subkey(self.key_a_bits, self.session_id, index, label)
+        key_b = derive_session_subkey(self.key_b_bits, self.session_id, index, label)
+        fields = {"session_id": self.session_id, "subkey_index": index, "subkey_label": label}
+        return key_a, key_b, fields
+
+    @property
+    def files_encrypted(self) -> int:
+        return self._next_index
+
+    def key_b_string(self) -> str:
+        return "".join(map(str, self.key_b_bits))
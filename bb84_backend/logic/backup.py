@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import secrets
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bb84_backend.core.key_rate import FINAL_KEY_BITS
+from bb84_backend.core.session import BB84Session
+from bb84_backend.secure_io.key_store import KeyStore
+from bb84_backend.secure_io.secure_packager import (
+    save_encrypted_stream,
+    load_and_decrypt_stream,
+    STREAM_CHUNK_SIZE,
+)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+PACKAGE_DIR = "packages"
+
+def _scan(root: str, exclude: Optional[str] = None) -> Iterator[Tuple[str, int, int]]:
+    """
+    Yields (relative path, size, mtime_ns) for every regular file under root.
+    scandir keeps the walk to one stat per file.
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if exclude is None or os.path.abspath(entry.path) != exclude:
+                    stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                yield os.path.relpath(entry.path, root).replace(os.sep, "/"), st.st_size, st.st_mtime_ns
+
+def hash_file(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> str:
+    """
+    Streaming SHA-256 of a file, one chunk in memory at a time.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _hash_many(root: str, rel_paths: List[str], workers: int) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Hashes files on a thread pool with a bounded window of in-flight jobs.
+    hashlib releases the GIL on large updates, so threads scale without pickling cost.
+    """
+    def job(rel: str) -> Tuple[str, Optional[str]]:
+        try:
+            return rel, hash_file(os.path.join(root, rel))
+        except OSError:
+            return rel, None
+
+    if workers == 1:
+        for rel in rel_paths:
+            yield job(rel)
+        return
+
+    window = workers * 4
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for rel in rel_paths:
+            pending.append(pool.submit(job, rel))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def default_manifest_path(dest: str) -> str:
+    return os.path.join(dest, MANIFEST_NAME)
+
+def load_manifest(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "entries": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_manifest(path: str, manifest: Dict) -> None:
+    # Write-then-rename so an interrupted run never leaves a truncated manifest
+    tmp = path + ".tmp"
+    with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+def _package_path(dest: str, package_id: str) -> str:
+    # Two-level fan-out keeps directories small for million-file trees
+    return os.path.join(dest, PACKAGE_DIR, package_id[:2], package_id + ".qofl")
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _inside(path: str, root: str) -> bool:
+    path, root = os.path.abspath(path), os.path.abspath(root)
+    return os.path.commonpath([path, root]) == root
+
+def backup_directory(
+    source: str,
+    dest: str,
+    key_store: KeyStore,
+    workers: Optional[int] = None,
+    key_bits: int = FINAL_KEY_BITS,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    manifest_path: Optional[str] = None
+) -> Dict:
+    """
+    Incremental encrypted backup of a directory tree into dest.
+
+    The manifest maps each relative path to (size, mtime_ns, sha256) and its package id.
+    Files whose size and mtime match are skipped without being read; the rest are
+    hashed in parallel and only re-encrypted when the content hash changed.
+    Packages of changed or deleted files are pruned, as are session keys no longer used.
+    All files encrypted in one run share a BB84 session whose Key B goes to key_store,
+    which must live outside dest so the backup alone cannot be decrypted.
+
+    The manifest lists every plaintext path with its size, mtime and SHA-256. By
+    default it is written to dest/manifest.json; pass manifest_path to keep that
+    metadata out of the backup destination as well.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    source = os.path.abspath(source)
+    dest = os.path.abspath(dest)
+    if _inside(key_store.path, dest):
+        raise ValueError("The key store must not be inside the backup destination.")
+    manifest_path = manifest_path or default_manifest_path(dest)
+    os.makedirs(dest, exist_ok=True)
+
+    manifest = load_manifest(manifest_path)
+    old_entries: Dict[str, Dict] = manifest.get("entries", {})
+    entries: Dict[str, Dict] = {}
+    stats = {"scanned": 0, "unchanged": 0, "touched": 0, "encrypted": 0, "pruned": 0, "bytes_encrypted": 0}
+
+    # 1) Stat pass: unchanged size + mtime means unchanged file
+    candidates: Dict[str, Tuple[int, int]] = {}
+    for rel, size, mtime_ns in _scan(source, exclude=dest):
+        stats["scanned"] += 1
+        old = old_entries.get(rel)
+        if old and old["size"] == size and old["mtime_ns"] == mtime_ns:
+            entries[rel] = old
+            stats["unchanged"] += 1
+        else:
+            candidates[rel] = (size, mtime_ns)
+
+    # 2) Hash pass over candidates only; equal hashes are metadata-only changes
+    session: Optional[BB84Session] = None
+    obsolete: List[str] = []
+    try:
+        for rel, content_hash in _hash_many(source, list(candidates), workers):
+            if content_hash is None:
+                continue
+            size, mtime_ns = candidates[rel]
+            old = old_entries.get(rel)
+            if old and old["sha256"] == content_hash:
+                entries[rel] = dict(old, size=size, mtime_ns=mtime_ns)
+                stats["touched"] += 1
+                continue
+
+            # 3) Re-encrypt changed and new files under this run's session
+            if session is None:
+                session = BB84Session(key_bits=key_bits, authenticate=True)
+                key_store.put(session.key_b_bits, label="backup", session_id=session.session_id)
+            key_a_bits, key_b_bits, fields = session.next_subkey()
+            package_id = secrets.token_hex(16)
+            package_path = _package_path(dest, package_id)
+            os.makedirs(os.path.dirname(package_path), exist_ok=True)
+            with open(os.path.join(source, rel), "rb") as src, open(package_path, "wb") as dst:
+                save_encrypted_stream(src, dst, key_a_bits, key_b_bits, original_filename=rel,
+                                      chunk_size=chunk_size, session=fields)
+            entries[rel] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "sha256": content_hash,
+                "package": package_id,
+                "session_id": session.session_id,
+            }
+            stats["encrypted"] += 1
+            stats["bytes_encrypted"] += size
+            if old:
+                obsolete.append(old["package"])
+    finally:
+        # Files that could not be read keep their previous backup
+        for rel, old in old_entries.items():
+            if rel in candidates and rel not in entries:
+                entries[rel] = old
+        manifest = {"version": MANIFEST_VERSION, "entries": entries}
+        save_manifest(manifest_path, manifest)
+
+    # 4) Prune packages of replaced and deleted files, then unused session keys
+    obsolete.extend(old["package"] for rel, old in old_entries.items() if rel not in entries)
+    for package_id in obsolete:
+        _remove(_package_path(dest, package_id))
+        stats["pruned"] += 1
+    live_sessions = {entry["session_id"] for entry in entries.values()}
+    for session_id in {old["session_id"] for old in old_entries.values()} - live_sessions:
+        key_store.delete_session(session_id)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "Files Scanned": stats["scanned"],
+        "Unchanged": stats["unchanged"],
+        "Metadata Only": stats["touched"],
+        "Encrypted": stats["encrypted"],
+        "Pruned": stats["pruned"],
+        "Bytes Encrypted": stats["bytes_encrypted"],
+        "Session ID": session.session_id if session else None,
+        "Elapsed (s)": round(elapsed, 4),
+    }
+
+def restore_file(
+    dest: str,
+    rel_path: str,
+    out_path: str,
+    key_store: KeyStore,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    manifest_path: Optional[str] = None
+) -> bool:
+    """
+    Decrypts one file of a backup using the manifest and the session key from key_store.
+    """
+    entry = load_manifest(manifest_path or default_manifest_path(dest))["entries"].get(rel_path)
+    if entry is None:
+        raise KeyError(f"{rel_path} is not in the backup manifest.")
+    key_b_bits = key_store.get_session(entry["session_id"])
+    if key_b_bits is None:
+        raise KeyError(f"Session key {entry['session_id']} is not in the key store.")
+    with open(_package_path(dest, entry["package"]), "rb") as src, open(out_path, "wb") as dst:
+        _, ok = load_and_decrypt_stream(src, dst, key_b_bits, chunk_size)
+    if not ok:
+        _remove(out_path)
+    return ok
@@ -14,15 +14,45 @@ import base64
 import hashlib
 import time
 import json
+import io
+import tempfile
 from datetime import datetime
 from math import log2
-from typing import Tuple, Optional, List, Dict
+from typing import Tuple, Optional, List, Dict, Callable, BinaryIO
 
-# Add core modules path for relative imports
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from bb84_backend.core.key_rate import generate_final_key, FINAL_KEY_BITS
+from bb84_backend.core.session import BB84Session
+from bb84_backend.core.qubit_record import QubitRecord
+from bb84_backend.core.key_utils import KEY_CHECK_ALPHA
+from bb84_backend.core.randomness_tests import run_battery
+from bb84_backend.secure_io.secure_packager import (
+    save_encrypted_file,
+    load_and_decrypt_bytes,
+    save_encrypted_stream,
+    save_encrypted_file_for_recipients,
+    save_encrypted_stream_for_recipients,
+    load_and_decrypt_stream,
+    read_stream_layout,
+    STREAM_MAGIC,
+)
+from bb84_backend.secure_io.archive import save_encrypted_archive, iter_archive_entries, ArchiveReader, ARCHIVE_TYPE
+from bb84_backend.secure_io.key_store import KeyStore
+from bb84_backend.logic.audit import iter_package_paths
+from bb84_backend.common.tracing import profile_run, span
+from bb84_backend.common.memory import (
+    plan_operation,
+    track_peak_memory,
+    get_memory_budget,
+    ENCRYPT_EXPANSION,
+    DECRYPT_EXPANSION,
+    STREAM_ENCRYPT_EXPANSION,
+    STREAM_DECRYPT_EXPANSION,
+    MODE_INLINE,
+)
 
-from core.bb84_quantum import bb84_protocol
-from secure_io.secure_packager import save_encrypted_file, load_and_decrypt_bytes
+# Spill-to-disk chunk sizes (multiples of 3 raw / 4 base64 bytes keep base64 aligned)
+_SPILL_RAW_CHUNK = 3 * 256 * 1024
+_SPILL_B64_CHUNK = 4 * 256 * 1024
 
 class BB84MetricsCollector:
     def __init__(self):
@@ -81,58 +111,338 @@ class BB84MetricsCollector:
     def add_quantum_signature_status(self, enabled: bool):
         self.metrics["Post-Quantum Signature"] = "Enabled" if enabled else "Disabled"
 
+    def add_randomness_metrics(self, key_bits: List[int], label: str = "Key B"):
+        report = run_battery(key_bits, alpha=KEY_CHECK_ALPHA)
+        if "error" in report:
+            self.metrics[f"{label} - NIST Tests"] = report["error"]
+            return
+        self.metrics[f"{label} - NIST Tests Passed"] = f"{report['tests_passed']}/{report['tests_run']}"
+        self.metrics[f"{label} - NIST p-values"] = {
+            name: t["p_value"] for name, t in report["tests"].items() if t["p_value"] is not None
+        }
+
+    def add_key_rate_metrics(self, report: Dict):
+        self.metrics.update({
+            "Raw Qubits": report["raw_qubits"],
+            "Planned Qubits": report["planned_qubits"],
+            "Sifted Bits": report["sifted"],
+            "Estimated QBER": report["qber"],
+            "QBER Upper Bound": report["qber_bound"],
+            "Secure Key Bound (bits)": report["secure_bits"],
+            "Key Rate Batches": report["batches"],
+        })
+
+    def add_memory_metrics(self, peak_bytes: Optional[int], mode: str):
+        self.metrics["Processing Mode"] = mode
+        if peak_bytes is not None:
+            self.metrics["Peak Memory (bytes)"] = peak_bytes
+        budget = get_memory_budget()
+        if budget:
+            self.metrics["Memory Budget (bytes)"] = budget
+
+    def add_pipeline_metrics(self, stats: Optional[Dict]):
+        # Per-stage busy/starved/blocked times and queue occupancy of the stream writer
+        if stats:
+            self.metrics["Pipeline"] = stats
+
     def export_to_json(self, output_path="bb84_metrics.json"):
         with open(output_path, "w") as f:
             json.dump(self.metrics, f, indent=2)
 
-def encrypt_file_local(data: bytes, filename: str) -> Tuple[str, str, List[Dict]]:
+@profile_run("encrypt")
+def encrypt_file_local(data: bytes, filename: str, key_store: Optional[KeyStore] = None) -> Tuple[str, str, QubitRecord]:
     """
     Encrypts a file using BB84 keys and returns the payload + UI visualization data.
+    Inputs too large for the memory budget go through the spill-to-disk stream path
+    or are rejected with MemoryBudgetExceeded before any work is done.
+    With a key_store, Key B is also recorded there under the package's key id.
     """
+    mode = plan_operation(len(data), ENCRYPT_EXPANSION, STREAM_ENCRYPT_EXPANSION)
+
     metrics = BB84MetricsCollector()
     metrics.start_timer()
     metrics.add_timestamp()
     metrics.add_file_size_metric("Original File Size (bytes)", data)
 
-    # 1. BB84 Logic
-    # UPDATED: Now captures 'qubit_log' from the protocol return values
-    key_a_bits, key_b_bits, qubit_log = bb84_protocol(length=256, authenticate=True)
+    pipeline_stats: Dict = {}
+    with track_peak_memory() as memory:
+        # 1. BB84 Logic: batches sized by the key-rate planner until the final key length is met
+        # 'qubit_log' is the packed record of all batches (a lazy sequence of dicts)
+        key_a_bits, key_b_bits, qubit_log, key_report = generate_final_key(FINAL_KEY_BITS, authenticate=True)
+        if key_store is not None:
+            key_store.put(key_b_bits, label=filename)
 
-    # 2. Secure Packaging
-    package_bytes = save_encrypted_file(
-        plaintext=data,
-        key_a_bits=key_a_bits,
-        key_b_bits=key_b_bits,
-        original_filename=filename
-    )
+        # 2. Secure Packaging
+        if mode == MODE_INLINE:
+            package_bytes = save_encrypted_file(
+                plaintext=data,
+                key_a_bits=key_a_bits,
+                key_b_bits=key_b_bits,
+                original_filename=filename
+            )
+            package_size = len(package_bytes)
+            package_sha256 = hashlib.sha256(package_bytes).hexdigest()
+            with span("controller.encode_b64"):
+                encrypted_b64 = base64.b64encode(package_bytes).decode("ascii")
+            del package_bytes
+        else:
+            encrypted_b64, package_size, package_sha256 = _encrypt_via_disk(
+                data,
+                lambda src, dst: save_encrypted_stream(src, dst, key_a_bits, key_b_bits, original_filename=filename,
+                                                       stats=pipeline_stats)
+            )
 
     # 3. Metrics Recording
     metrics.stop_timer("Encryption Time (s)")
-    metrics.add_key_metrics(key_a_bits, key_b_bits)
-    metrics.add_file_size_metric("Encrypted File Size (bytes)", package_bytes)
-    metrics.add_sha256_hash("SHA-256 Hash of Encrypted File", package_bytes)
-    metrics.add_quantum_signature_status(True)
-    metrics.export_to_json()
+    with span("controller.metrics"):
+        metrics.add_key_metrics(key_a_bits, key_b_bits)
+        metrics.add_randomness_metrics(key_b_bits)
+        metrics.add_key_rate_metrics(key_report)
+        metrics.metrics["Encrypted File Size (bytes)"] = package_size
+        metrics.metrics["SHA-256 Hash of Encrypted File"] = package_sha256
+        metrics.add_quantum_signature_status(True)
+        metrics.add_memory_metrics(memory["peak_bytes"], mode)
+        metrics.add_pipeline_metrics(pipeline_stats)
+        metrics.export_to_json()
 
-    # Returns: Encrypted Package (B64), Bob's Key (Str), and the Qubit Log (List[Dict])
+    # Returns: Encrypted Package (B64), Bob's Key (Str), and the Qubit Record
     return (
-        base64.b64encode(package_bytes).decode("ascii"), 
+        encrypted_b64,
         "".join(map(str, key_b_bits)), 
         qubit_log
     )
 
+def _encrypt_via_disk(data: bytes, write_stream: Callable[[BinaryIO, BinaryIO], int]) -> Tuple[str, int, str]:
+    """
+    Stream-container encryption spilled to a temp file; only the returned base64
+    string and one chunk at a time are held in memory.
+    write_stream(src, dst) is one of the packager's save_*_stream calls.
+    """
+    sha = hashlib.sha256()
+    parts = []
+    size = 0
+    with tempfile.TemporaryFile() as spill:
+        write_stream(io.BytesIO(data), spill)
+        spill.seek(0)
+        with span("controller.encode_b64"):
+            for chunk in iter(lambda: spill.read(_SPILL_RAW_CHUNK), b""):
+                sha.update(chunk)
+                size += len(chunk)
+                parts.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(parts), size, sha.hexdigest()
+
+def _decrypt_via_disk(data_base64: str, key_b_bits: List[int]) -> Tuple[bytes, Dict, bool, str]:
+    """
+    Decodes a base64 stream container to a temp file chunk by chunk and decrypts it
+    from there, so only the plaintext is materialised in memory.
+    """
+    sha = hashlib.sha256()
+    with tempfile.TemporaryFile() as spill, tempfile.TemporaryFile() as out:
+        with span("controller.decode_b64"):
+            for i in range(0, len(data_base64), _SPILL_B64_CHUNK):
+                chunk = base64.b64decode(data_base64[i:i + _SPILL_B64_CHUNK])
+                sha.update(chunk)
+                spill.write(chunk)
+        metadata, ok = load_and_decrypt_stream(spill, out, key_b_bits)
+        if not ok:
+            return b"", {}, False, sha.hexdigest()
+        out.seek(0)
+        return out.read(), metadata, True, sha.hexdigest()
+
+def _is_stream_package_b64(data_base64: str) -> bool:
+    try:
+        return base64.b64decode(data_base64[:8])[:len(STREAM_MAGIC)] == STREAM_MAGIC
+    except ValueError:
+        return False
+
+def _batch_output_names(paths: List[str]) -> List[str]:
+    """
+    Output names relative to the inputs' common directory, so a/x.txt and b/x.txt
+    stay distinct. The same input twice is rejected rather than overwritten.
+    """
+    if not paths:
+        raise ValueError("No files to encrypt.")
+    absolute = [os.path.abspath(p) for p in paths]
+    if len(set(absolute)) != len(absolute):
+        raise ValueError("The same file was given more than once.")
+    base = os.path.commonpath([os.path.dirname(p) for p in absolute])
+    return [os.path.relpath(p, base).replace(os.sep, "/") for p in absolute]
+
+@profile_run("encrypt_batch")
+def encrypt_batch_local(
+    paths: List[str],
+    out_dir: str,
+    key_bits: int = FINAL_KEY_BITS,
+    key_store: Optional[KeyStore] = None
+) -> Tuple[List[str], str, str]:
+    """
+    Encrypts many files under one BB84 session: one quantum exchange and one Key B
+    for the whole batch, with a per-file subkey recorded by session id and index.
+    Each file is streamed from disk into a stream package under out_dir (keeping
+    its path relative to the inputs' common directory), one chunk in memory at a time.
+    """
+    names = _batch_output_names(paths)
+    metrics = BB84MetricsCollector()
+    metrics.start_timer()
+    metrics.add_timestamp()
+
+    session = BB84Session(key_bits=key_bits, authenticate=True)
+    if key_store is not None:
+        key_store.put(session.key_b_bits, label="session", session_id=session.session_id)
+    outputs = []
+    total_in = total_out = 0
+    slowest: Dict = {}
+    for path, name in zip(paths, names):
+        key_a_bits, key_b_bits, fields = session.next_subkey()
+        out_path = os.path.join(out_dir, *name.split("/")) + ".qofl"
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        stats: Dict = {}
+        with open(path, "rb") as src, open(out_path, "wb") as dst:
+            total_out += save_encrypted_stream(src, dst, key_a_bits, key_b_bits,
+                                               original_filename=name, session=fields, stats=stats)
+            total_in += src.tell()
+        if stats.get("elapsed_s", 0) > slowest.get("elapsed_s", 0):
+            slowest = dict(stats, file=name)
+        outputs.append(out_path)
+
+    metrics.stop_timer("Encryption Time (s)")
+    metrics.add_key_metrics(session.key_a_bits, session.key_b_bits)
+    metrics.add_randomness_metrics(session.key_b_bits)
+    metrics.add_key_rate_metrics(session.key_report)
+    metrics.metrics.update({
+        "Session ID": session.session_id,
+        "Files Encrypted": session.files_encrypted,
+        "Original File Size (bytes)": total_in,
+        "Encrypted File Size (bytes)": total_out,
+    })
+    metrics.add_quantum_signature_status(True)
+    # Stage stats of the slowest file, where a bottleneck matters most
+    metrics.add_pipeline_metrics(slowest)
+    metrics.export_to_json()
+
+    # Returns: Package paths, the session Key B (Str), and the session id
+    return outputs, session.key_b_string(), session.session_id
+
+@profile_run("encrypt_multi")
+def encrypt_for_recipients_local(data: bytes, filename: str, recipients: int, key_bits: int = FINAL_KEY_BITS) -> Tuple[str, List[str]]:
+    """
+    Encrypts one file for several recipients: one BB84 exchange per recipient, but a
+    single AES pass and signature, with the data key wrapped under each recipient's key.
+    Any of the returned Key B strings decrypts the package with decrypt_file_local.
+    """
+    if recipients < 1:
+        raise ValueError("At least one recipient is required.")
+    mode = plan_operation(len(data), ENCRYPT_EXPANSION, STREAM_ENCRYPT_EXPANSION)
+
+    metrics = BB84MetricsCollector()
+    metrics.start_timer()
+    metrics.add_timestamp()
+    metrics.add_file_size_metric("Original File Size (bytes)", data)
+
+    pipeline_stats: Dict = {}
+    with track_peak_memory() as memory:
+        exchanges = [generate_final_key(key_bits, authenticate=True)[:3] for _ in range(recipients)]
+        recipient_keys = [key_a for key_a, _, _ in exchanges]
+
+        if mode == MODE_INLINE:
+            package_bytes = save_encrypted_file_for_recipients(data, recipient_keys, original_filename=filename)
+            package_size = len(package_bytes)
+            package_sha256 = hashlib.sha256(package_bytes).hexdigest()
+            encrypted_b64 = base64.b64encode(package_bytes).decode("ascii")
+            del package_bytes
+        else:
+            encrypted_b64, package_size, package_sha256 = _encrypt_via_disk(
+                data,
+                lambda src, dst: save_encrypted_stream_for_recipients(src, dst, recipient_keys, original_filename=filename,
+                                                                      stats=pipeline_stats)
+            )
+
+    metrics.stop_timer("Encryption Time (s)")
+    metrics.metrics.update({
+        "Recipients": recipients,
+        "Encrypted File Size (bytes)": package_size,
+        "SHA-256 Hash of Encrypted File": package_sha256,
+    })
+    metrics.add_quantum_signature_status(True)
+    metrics.add_memory_metrics(memory["peak_bytes"], mode)
+    metrics.add_pipeline_metrics(pipeline_stats)
+    metrics.export_to_json()
+
+    # Returns: Encrypted Package (B64) and one Key B string per recipient
+    return encrypted_b64, ["".join(map(str, key_b)) for _, key_b, _ in exchanges]
+
+@profile_run("encrypt_archive")
+def encrypt_archive_local(
+    paths: List[str],
+    output_path: str,
+    key_bits: int = FINAL_KEY_BITS,
+    key_store: Optional[KeyStore] = None
+) -> Tuple[str, int]:
+    """
+    Streams files and directory trees into one archive package at output_path:
+    a single BB84 exchange, key derivation and signature for all entries.
+    Returns Bob's key and the number of entries.
+    """
+    metrics = BB84MetricsCollector()
+    metrics.start_timer()
+    metrics.add_timestamp()
+
+    key_a_bits, key_b_bits, _, key_report = generate_final_key(key_bits, authenticate=True)
+    if key_store is not None:
+        key_store.put(key_b_bits, label=os.path.basename(output_path))
+    entries = []
+
+    def tracked():
+        for name, path in iter_archive_entries(paths):
+            entries.append(name)
+            yield name, path
+
+    pipeline_stats: Dict = {}
+    with track_peak_memory() as memory:
+        with open(output_path, "wb") as dst:
+            package_size = save_encrypted_archive(tracked(), dst, key_a_bits, key_b_bits, stats=pipeline_stats)
+
+    metrics.stop_timer("Encryption Time (s)")
+    metrics.add_key_metrics(key_a_bits, key_b_bits)
+    metrics.add_randomness_metrics(key_b_bits)
+    metrics.add_key_rate_metrics(key_report)
+    metrics.metrics.update({
+        "Archive Entries": len(entries),
+        "Encrypted File Size (bytes)": package_size,
+    })
+    metrics.add_quantum_signature_status(True)
+    metrics.add_memory_metrics(memory["peak_bytes"], "stream")
+    metrics.add_pipeline_metrics(pipeline_stats)
+    metrics.export_to_json()
+
+    return "".join(map(str, key_b_bits)), len(entries)
+
+@profile_run("decrypt")
 def decrypt_file_local(data_base64: str, key_b_bits: List[int]) -> Tuple[Optional[bytes], Optional[dict]]:
     try:
+        data_base64 = data_base64.strip()
+        # Only stream containers can be decrypted from disk; JSON packages must fit in memory
+        stream_expansion = STREAM_DECRYPT_EXPANSION if _is_stream_package_b64(data_base64) else None
+        mode = plan_operation(len(data_base64), DECRYPT_EXPANSION, stream_expansion)
+
         metrics = BB84MetricsCollector()
         metrics.start_timer()
         metrics.add_timestamp()
 
-        encrypted_bytes = base64.b64decode(data_base64)
-        data, metadata, integrity_ok = load_and_decrypt_bytes(encrypted_bytes, key_b_bits)
+        with track_peak_memory() as memory:
+            if mode == MODE_INLINE:
+                with span("controller.decode_b64"):
+                    encrypted_bytes = base64.b64decode(data_base64)
+                data, metadata, integrity_ok = load_and_decrypt_bytes(encrypted_bytes, key_b_bits)
+                package_sha256 = hashlib.sha256(encrypted_bytes).hexdigest()
+                del encrypted_bytes
+            else:
+                data, metadata, integrity_ok, package_sha256 = _decrypt_via_disk(data_base64, key_b_bits)
 
         metrics.stop_timer("Decryption Time (s)")
         metrics.add_hmac_verification(integrity_ok)
-        metrics.add_sha256_hash("SHA-256 Hash of Encrypted File", encrypted_bytes)
+        metrics.metrics["SHA-256 Hash of Encrypted File"] = package_sha256
+        metrics.add_memory_metrics(memory["peak_bytes"], mode)
 
         if data:
             metrics.add_file_size_metric("Decrypted File Size (bytes)", data)
@@ -145,4 +455,103 @@ def decrypt_file_local(data_base64: str, key_b_bits: List[int]) -> Tuple[Optiona
 
         return data, metadata
     except Exception as e:
-        return None, {"error": str(e)}
\ No newline at end of file
+        return None, {"error": str(e)}
+
+def _open_package_file(path: str) -> Tuple[Dict, Optional[BinaryIO], Optional[bytes]]:
+    """
+    Returns (header, stream source, None) for stream containers (raw or base64 text)
+    and (package, None, package bytes) for JSON packages.
+    """
+    with open(path, "rb") as f:
+        head = f.read(len(STREAM_MAGIC))
+    if head == STREAM_MAGIC:
+        src = open(path, "rb")
+        header, _, _, _ = read_stream_layout(src)
+        return header, src, None
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:1] != b"{":
+        raw = base64.b64decode(raw)
+    if raw[:len(STREAM_MAGIC)] == STREAM_MAGIC:
+        src = io.BytesIO(raw)
+        header, _, _, _ = read_stream_layout(src)
+        return header, src, None
+    return json.loads(raw), None, raw
+
+def read_package_header(path: str) -> Dict:
+    """
+    Header of a package file (stream header, or the JSON package itself), e.g. for
+    KeyStore.resolve. Nothing is decrypted.
+    """
+    header, src, _ = _open_package_file(path)
+    if src is not None:
+        src.close()
+    return header
+
+def _safe_output_path(out_dir: str, name: str) -> str:
+    # Entry names come from the package; never let them escape out_dir
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    path = os.path.join(out_dir, *parts) if parts else os.path.join(out_dir, "decrypted_file")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def decrypt_many(paths: List[str], out_dir: str, key_store: KeyStore) -> List[Dict]:
+    """
+    Decrypts every package under paths into out_dir, resolving each Key B from the
+    key store by key id or session id (one index lookup per package, no key files).
+    Archives are expanded entry by entry. Returns one report per package.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    reports = []
+    for path in iter_package_paths(paths):
+        report = {"path": path, "ok": False, "outputs": [], "error": None}
+        reports.append(report)
+        src = None
+        try:
+            header, src, raw = _open_package_file(path)
+            key_b_bits = key_store.resolve(header)
+            if key_b_bits is None:
+                report["error"] = "no matching key in the key store"
+                continue
+
+            with span("controller.decrypt_many", path=path):
+                if header.get("type") == ARCHIVE_TYPE:
+                    reader = ArchiveReader(src, key_b_bits)
+                    for name in reader.names():
+                        out_path = _safe_output_path(out_dir, name)
+                        with open(out_path, "wb") as f:
+                            reader.extract(name, f)
+                        report["outputs"].append(out_path)
+                    report["ok"] = True
+                elif src is not None:
+                    tmp = tempfile.NamedTemporaryFile(dir=out_dir, delete=False)
+                    placed = False
+                    try:
+                        with tmp:
+                            metadata, ok = load_and_decrypt_stream(src, tmp, key_b_bits)
+                        if ok:
+                            out_path = _safe_output_path(out_dir, metadata["original_filename"])
+                            os.replace(tmp.name, out_path)
+                            placed = True
+                            report["outputs"].append(out_path)
+                    finally:
+                        # Truncated or corrupt packages raise mid-stream; never leave the partial file
+                        if not placed:
+                            os.remove(tmp.name)
+                    report["ok"] = ok
+                else:
+                    data, metadata, ok = load_and_decrypt_bytes(raw, key_b_bits)
+                    if ok:
+                        out_path = _safe_output_path(out_dir, metadata["original_filename"])
+                        with open(out_path, "wb") as f:
+                            f.write(data)
+                        report["outputs"].append(out_path)
+                    report["ok"] = ok
+            if not report["ok"]:
+                report["error"] = "Key B mismatch. Integrity verification failed."
+        except Exception as e:
+            report["error"] = str(e) or type(e).__name__
+        finally:
+            if src is not None:
+                src.close()
+    return reports
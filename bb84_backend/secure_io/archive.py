@@ -0,0 +1,200 @@
+import base64
+import hashlib
+import json
+import os
+import struct
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bb84_backend.core.aes_engine import cbc_block_decryptor
+from bb84_backend.core.compression import choose_codec, StreamCompressor, StreamDecompressor
+from bb84_backend.core.key_utils import (
+    derive_aes_key_from_bits,
+    verify_key_integrity,
+    bits_to_bytes,
+    bytes_to_bits,
+    key_id,
+    DEFAULT_KDF,
+    KDF_PBKDF2,
+)
+from bb84_backend.common.tracing import span
+from bb84_backend.secure_io.secure_packager import (
+    STREAM_CHUNK_SIZE,
+    read_stream_layout,
+    verify_stream_signature,
+    _iter_range,
+    _open_key,
+    _write_stream,
+    _U32,
+)
+
+__all__ = ["ARCHIVE_TYPE", "iter_archive_entries", "save_encrypted_archive", "ArchiveReader"]
+
+# Archive packages are stream containers whose header carries "type": "archive".
+# Plaintext: u32 inner header | entry data (each compressed on its own) | index JSON | footer
+ARCHIVE_TYPE = "archive"
+_FOOTER = struct.Struct(">QI")  # index offset (from payload start), index length
+_BLOCK = 16
+
+
+def iter_archive_entries(paths: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Expands files and directories into (entry name, file path) pairs.
+    Names are relative to the given directory, with forward slashes.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            base = os.path.dirname(os.path.abspath(path))
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    yield os.path.relpath(os.path.abspath(full), base).replace(os.sep, "/"), full
+        else:
+            yield os.path.basename(path), path
+
+
+def save_encrypted_archive(
+    entries: Iterable[Tuple[str, str]],
+    dst: BinaryIO,
+    key_a_bits: List[int],
+    key_b_bits: List[int],
+    compression: str = "auto",
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    kdf: str = DEFAULT_KDF,
+    session: Optional[Dict] = None,
+    stats: Optional[Dict] = None
+) -> int:
+    """
+    Streams many files into one signed package: one key derivation, one signature
+    and one public key for the whole archive. Each entry is compressed separately
+    and its offset recorded in an encrypted index, so entries can be read back
+    without decrypting the rest. Returns the package size.
+    """
+    key_with_salt = derive_aes_key_from_bits(key_a_bits, kdf=kdf)
+    # Key id lets a key store find Key B from the header alone
+    key_fields = {"salt": base64.b64encode(key_with_salt[32:]).decode("ascii"), "kid": key_id(key_a_bits)}
+    inner_fields = {"key_a_encoded": base64.b64encode(bits_to_bytes(key_a_bits)).decode("ascii")}
+
+    def payload() -> Iterator[bytes]:
+        index = []
+        offset = 0
+        for name, path in entries:
+            with open(path, "rb") as f:
+                chunk = f.read(chunk_size)
+                codec = choose_codec(chunk, compression)
+                compressor = StreamCompressor(codec)
+                digest = hashlib.sha256()
+                size = stored = 0
+                while chunk:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out = compressor.compress(chunk)
+                    stored += len(out)
+                    yield out
+                    chunk = f.read(chunk_size)
+                out = compressor.flush()
+                stored += len(out)
+                yield out
+            index.append({"name": name, "offset": offset, "stored": stored, "size": size,
+                          "codec": codec, "sha256": digest.hexdigest()})
+            offset += stored
+        index_bytes = json.dumps(index, separators=(',', ':')).encode("utf-8")
+        yield index_bytes + _FOOTER.pack(offset, len(index_bytes))
+
+    with span("archive.write"):
+        # Entries carry their own codec; the container itself is stored raw
+        return _write_stream(dst, key_with_salt, key_fields, inner_fields, "archive",
+                             "none", payload(), kdf, session, {"type": ARCHIVE_TYPE}, stats=stats)
+
+
+class ArchiveReader:
+    """
+    Random-access reader for archive packages. CBC block k decrypts with block k - 1
+    as its IV, so an entry is read from its own offset without touching the others.
+    With verify=True the signature is checked once, in a digest pass, on open.
+    """
+
+    def __init__(self, src: BinaryIO, key_b_bits: List[int], verify: bool = True,
+                 chunk_size: int = STREAM_CHUNK_SIZE):
+        self.src = src
+        self.chunk_size = chunk_size
+        if verify:
+            with span("archive.verify"):
+                if not verify_stream_signature(src, chunk_size):
+                    raise ValueError("Archive signature verification failed.")
+        self.header, self._ct_start, ct_end, _ = read_stream_layout(src)
+        if self.header.get("type") != ARCHIVE_TYPE:
+            raise ValueError("Not an archive package.")
+        self._key = _open_key(self.header, key_b_bits)
+        if self._key is None:
+            raise ValueError("Key B mismatch. Integrity verification failed.")
+        padded_len = ct_end - self._ct_start - _BLOCK
+        if padded_len < 2 * _BLOCK or padded_len % _BLOCK:
+            raise ValueError("Truncated archive package.")
+
+        # Inner header: same key check as single-file packages
+        # A wrong key decrypts to garbage here, so bound the length before reading
+        (inner_len,) = _U32.unpack(self._read(0, _U32.size))
+        try:
+            if _U32.size + inner_len > padded_len:
+                raise ValueError
+            inner = json.loads(self._read(_U32.size, _U32.size + inner_len))
+        except ValueError:
+            raise ValueError("Key B mismatch. Integrity verification failed.") from None
+        if "recipients" not in self.header:
+            stored_key_a_bits = bytes_to_bits(base64.b64decode(inner["key_a_encoded"]))
+            if not verify_key_integrity(self._key, stored_key_a_bits, kdf=self.header.get("kdf", KDF_PBKDF2)):
+                raise ValueError("Key B mismatch. Integrity verification failed.")
+        self._payload_start = _U32.size + inner_len
+
+        # Footer sits right before the PKCS7 padding of the last block
+        tail = self._read(padded_len - 2 * _BLOCK, padded_len)
+        pad = tail[-1]
+        if not 1 <= pad <= _BLOCK or tail[-pad:] != bytes([pad]) * pad:
+            raise ValueError("Invalid archive padding.")
+        index_offset, index_len = _FOOTER.unpack(tail[:-pad][-_FOOTER.size:])
+        start = self._payload_start + index_offset
+        self.entries: List[Dict] = json.loads(self._read(start, start + index_len))
+        self._by_name = {entry["name"]: entry for entry in self.entries}
+
+    def _iter_plain(self, start: int, end: int) -> Iterator[bytes]:
+        first_block = start // _BLOCK
+        self.src.seek(self._ct_start + first_block * _BLOCK)
+        decryptor = cbc_block_decryptor(self._key, self.src.read(_BLOCK))
+
+        base = first_block * _BLOCK
+        ct_from = self._ct_start + _BLOCK + base
+        ct_to = self._ct_start + _BLOCK + -(-end // _BLOCK) * _BLOCK
+        pos = base
+        for chunk in _iter_range(self.src, ct_from, ct_to, self.chunk_size):
+            out = decryptor.update(chunk)
+            lo, hi = max(start - pos, 0), min(end - pos, len(out))
+            if hi > lo:
+                yield out[lo:hi]
+            pos += len(out)
+
+    def _read(self, start: int, end: int) -> bytes:
+        return b"".join(self._iter_plain(start, end))
+
+    def names(self) -> List[str]:
+        return [entry["name"] for entry in self.entries]
+
+    def extract(self, name: str, dst: BinaryIO) -> Dict:
+        """
+        Decrypts one entry into dst and checks its SHA-256 from the index.
+        Raises KeyError for unknown names and ValueError on a hash mismatch.
+        """
+        entry = self._by_name[name]
+        start = self._payload_start + entry["offset"]
+        decompressor = StreamDecompressor(entry["codec"])
+        digest = hashlib.sha256()
+        with span("archive.extract", stored=entry["stored"]):
+            for chunk in self._iter_plain(start, start + entry["stored"]):
+                data = decompressor.decompress(chunk)
+                digest.update(data)
+                dst.write(data)
+            data = decompressor.flush()
+            digest.update(data)
+            dst.write(data)
+        if digest.hexdigest() != entry["sha256"]:
+            raise ValueError(f"Entry {name} failed its integrity check.")
+        return entry
@@ -0,0 +1,123 @@
+"""
+Local key store: BB84 keys indexed by key id and session id in SQLite.
+
+Keys are stored packed (common.commmon.encode_key, ~8x smaller than "0101..."
+text). Lookups go through the primary key / a unique index, so resolving the key
+of a package costs one index probe however many keys are stored.
+
+    QOFL_KEY_STORE=path/to/keys.db   default store location (default: qofl_keys.db)
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bb84_backend.common.commmon import encode_key, decode_key
+from bb84_backend.core.key_utils import key_id
+
+__all__ = ["KeyStore", "default_store_path"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (
+    kid TEXT PRIMARY KEY,
+    session_id TEXT,
+    key_packed TEXT NOT NULL,
+    bits INTEGER NOT NULL,
+    label TEXT,
+    created TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS keys_session ON keys(session_id) WHERE session_id IS NOT NULL;
+"""
+
+# (key bits, label, session id)
+KeyRecord = Tuple[List[int], str, Optional[str]]
+
+
+def default_store_path() -> str:
+    return os.environ.get("QOFL_KEY_STORE", "qofl_keys.db")
+
+
+class KeyStore:
+    """
+    SQLite-backed map of key id -> packed Key B, with session ids for session keys.
+    One connection shared under a lock, so threads of one process can use it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_store_path()
+        self._lock = threading.Lock()
+        # The store holds Key B for every package, so it is owner-only. SQLite gives
+        # the WAL/SHM sidecars the database's mode; older ones are tightened below.
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(self.path, 0o600)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.chmod(self.path + suffix, 0o600)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def put(self, key_bits: List[int], label: str = "", session_id: Optional[str] = None) -> str:
+        return self.put_many([(key_bits, label, session_id)])[0]
+
+    def put_many(self, records: Iterable[KeyRecord]) -> List[str]:
+        """
+        Inserts keys in one transaction (executemany); existing ids are replaced.
+        Returns the key ids in input order.
+        """
+        created = datetime.utcnow().isoformat()
+        rows = [
+            (key_id(bits), session_id, encode_key(bits), len(bits), label, created)
+            for bits, label, session_id in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return [row[0] for row in rows]
+
+    def get(self, kid: str) -> Optional[List[int]]:
+        with self._lock:
+            row = self._conn.execute("SELECT key_packed FROM keys WHERE kid = ?", (kid,)).fetchone()
+        return decode_key(row[0]) if row else None
+
+    def get_session(self, session_id: str) -> Optional[List[int]]:
+        with self._lock:
+            row = self._conn.execute("SELECT key_packed FROM keys WHERE session_id = ?", (session_id,)).fetchone()
+        return decode_key(row[0]) if row else None
+
+    def delete_session(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM keys WHERE session_id = ?", (session_id,))
+
+    def resolve(self, header: Dict) -> Optional[List[int]]:
+        """
+        Key B for a package header: the session key for session packages, the key of
+        any stored recipient for multi-recipient packages, else the header's key id.
+        """
+        if "session_id" in header:
+            return self.get_session(header["session_id"])
+        if "recipients" in header:
+            for slot in header["recipients"]:
+                bits = self.get(slot.get("kid", ""))
+                if bits is not None:
+                    return bits
+            return None
+        if "kid" in header:
+            return self.get(header["kid"])
+        return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
@@ -0,0 +1,246 @@
+"""
+One-time-pad mode for short messages.
+
+The payload is XORed with fresh BB84 key bytes from a KeyPool and authenticated
+with Poly1305 under a one-time key taken from the same pool (Wegman-Carter: a
+universal hash plus a one-time pad). Both parts are information-theoretically
+secure as long as no pool byte is used twice, which the pool's cursor enforces.
+Per message this costs 32 + len(payload) pool bytes and no KDF, padding,
+signature or JSON work.
+
+Messages may arrive out of order: the receiver records which ranges ahead of its
+cursor were opened and refuses only those (replays). Reordering is tolerated
+within OTP_REORDER_WINDOW pool bytes; once a message lands further ahead, older
+unopened pad bytes are wiped and their messages can no longer be opened.
+
+Message layout (41 bytes of overhead):
+
+    "QOTP" | u8 version | 8-byte pool id | u64 pool offset | u32 length | ciphertext | 16-byte tag
+"""
+import base64
+import bisect
+import json
+import os
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.poly1305 import Poly1305
+
+from bb84_backend.core.key_rate import generate_final_key
+from bb84_backend.core.key_utils import KEY_CHECK_ALPHA, bits_to_bytes
+from bb84_backend.core.randomness import RandomnessProvider, resolve_provider
+from bb84_backend.core.randomness_tests import run_battery
+
+__all__ = ["KeyPool", "generate_pool_pair", "refill_pair", "otp_encrypt", "otp_decrypt",
+           "OTP_MAGIC", "OTP_MAX_MESSAGE", "OTP_REORDER_WINDOW"]
+
+OTP_MAGIC = b"QOTP"
+OTP_VERSION = 1
+_HEADER = struct.Struct(">4sB8sQI")
+MAC_KEY_SIZE = 32
+TAG_SIZE = 16
+# OTP is meant for short messages: every payload byte costs a byte of BB84 key
+OTP_MAX_MESSAGE = 64 * 1024
+DEFAULT_REFILL_BITS = 1 << 17
+# How far (in pool bytes) a received message may run ahead of the oldest unopened one
+OTP_REORDER_WINDOW = 1024 * 1024
+_COMPACT_BYTES = 64 * 1024
+
+
+class KeyPool:
+    """
+    One party's copy of shared pad material. The cursor is an absolute offset into
+    everything ever added to the pool. It only moves forward and used bytes are
+    wiped, so a pad byte can never be handed out twice. Alice and Bob hold pools
+    with the same id and material and advance them in step.
+
+    On the receiving side, ranges opened ahead of the cursor are kept as sorted
+    (start, end) intervals until the gap before them is filled or falls out of
+    the reorder window.
+    """
+
+    def __init__(self, pool_id: str, material: bytes = b"", offset: int = 0,
+                 used: Optional[List[Tuple[int, int]]] = None, window: int = OTP_REORDER_WINDOW):
+        if len(bytes.fromhex(pool_id)) != 8:
+            raise ValueError("pool_id must be 8 bytes of hex.")
+        self.pool_id = pool_id
+        self._material = bytearray(material)
+        self._pos = 0  # first unused byte in _material
+        self._start = offset  # absolute offset of _material[_pos]
+        self._used: List[Tuple[int, int]] = sorted(tuple(r) for r in used or [])
+        self.window = window
+        self._lock = threading.Lock()
+
+    @property
+    def offset(self) -> int:
+        return self._start
+
+    def available(self) -> int:
+        return len(self._material) - self._pos
+
+    def refill(self, material: bytes, check: bool = True) -> None:
+        """
+        Appends amplified key bytes. With check=True the material must pass the
+        SP 800-22 subset at KEY_CHECK_ALPHA first (checked once here, never per message).
+        """
+        if check and len(material) * 8 >= 100:
+            if not run_battery(material, alpha=KEY_CHECK_ALPHA)["passed"]:
+                raise ValueError("Key material failed the randomness battery.")
+        with self._lock:
+            self._material.extend(material)
+
+    def _consume(self, n: int) -> bytes:
+        pos = self._pos
+        pad = bytes(self._material[pos:pos + n])
+        # Wipe in place so consumed pad bytes do not linger in the buffer
+        self._material[pos:pos + n] = bytes(n)
+        self._pos += n
+        self._start += n
+        # Drop the wiped prefix once it dominates, not on every message
+        if self._pos >= _COMPACT_BYTES and self._pos * 2 >= len(self._material):
+            del self._material[:self._pos]
+            self._pos = 0
+        return pad
+
+    def take(self, n: int) -> Tuple[int, bytes]:
+        """
+        Sender side: the next n unused bytes and their offset.
+        """
+        with self._lock:
+            if n > self.available():
+                raise ValueError(f"Key pool exhausted: {n} bytes needed, {self.available()} left.")
+            offset = self._start
+            return offset, self._consume(n)
+
+    def _check_unused(self, offset: int, n: int) -> int:
+        # Intervals are disjoint and sorted: only the neighbours of offset can overlap
+        i = bisect.bisect_right(self._used, (offset, float("inf")))
+        overlaps = (i > 0 and self._used[i - 1][1] > offset) or (i < len(self._used) and self._used[i][0] < offset + n)
+        if offset < self._start or overlaps:
+            raise ValueError("Key bytes at this offset were already used.")
+        lo = self._pos + offset - self._start
+        if lo + n > len(self._material):
+            raise ValueError("Key pool does not cover this message yet.")
+        return lo
+
+    def peek(self, offset: int, n: int) -> bytes:
+        """
+        Receiver side: n bytes at an absolute offset without consuming them.
+        Offsets behind the cursor or inside an opened range are refused.
+        """
+        with self._lock:
+            lo = self._check_unused(offset, n)
+            return bytes(self._material[lo:lo + n])
+
+    def _merge(self) -> None:
+        merged: List[Tuple[int, int]] = []
+        for s, e in self._used:
+            if merged and merged[-1][1] == s:
+                merged[-1] = (merged[-1][0], e)
+            else:
+                merged.append((s, e))
+        self._used = merged
+
+    def consume_range(self, offset: int, n: int) -> None:
+        """
+        Receiver side: marks n bytes at offset as used and wipes them. Checked again
+        under the lock, so two threads opening the same message cannot both succeed.
+        The cursor advances over every opened range that starts at it; a range more
+        than `window` bytes ahead drags the cursor along, discarding older bytes.
+        """
+        with self._lock:
+            lo = self._check_unused(offset, n)
+            self._material[lo:lo + n] = bytes(n)
+            end = offset + n
+            bisect.insort(self._used, (offset, end))
+            self._merge()
+            if end - self._start > self.window:
+                self._consume(end - self.window - self._start)
+                self._used = [(max(s, self._start), e) for s, e in self._used if e > self._start]
+            while self._used and self._used[0][0] == self._start:
+                s, e = self._used.pop(0)
+                self._consume(e - s)
+
+    def save(self, path: str) -> None:
+        # Only unused material is written; write-then-rename keeps the file whole
+        with self._lock:
+            state = {"pool_id": self.pool_id, "offset": self._start, "used": self._used,
+                     "material": base64.b64encode(bytes(self._material[self._pos:])).decode("ascii")}
+        tmp = path + ".tmp"
+        # Pad material is key material: owner-only from the moment the file exists
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)  # a stale tmp file keeps its old mode otherwise
+        with open(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "KeyPool":
+        with open(path, "r") as f:
+            state = json.load(f)
+        return cls(state["pool_id"], base64.b64decode(state["material"]), state["offset"], state.get("used"))
+
+
+def refill_pair(alice: KeyPool, bob: KeyPool, bits: int = DEFAULT_REFILL_BITS,
+                rng: Optional[RandomnessProvider] = None, authenticate: bool = False) -> None:
+    """
+    Runs the key-rate engine for `bits` final key bits and appends them to both pools.
+    """
+    if alice.pool_id != bob.pool_id:
+        raise ValueError("Pools belong to different pairs.")
+    key_a, key_b, _, _ = generate_final_key(bits, authenticate=authenticate, rng=rng)
+    alice.refill(bits_to_bytes(key_a))
+    bob.refill(bits_to_bytes(key_b), check=False)  # same bits, already checked on Alice's side
+
+
+def generate_pool_pair(bits: int = DEFAULT_REFILL_BITS, rng: Optional[RandomnessProvider] = None,
+                       authenticate: bool = False) -> Tuple[KeyPool, KeyPool]:
+    """
+    Alice's and Bob's pools, filled with `bits` fresh amplified key bits.
+    """
+    pool_id = resolve_provider(rng).random_bytes(8).hex() if rng is not None else os.urandom(8).hex()
+    alice, bob = KeyPool(pool_id), KeyPool(pool_id)
+    refill_pair(alice, bob, bits, rng, authenticate)
+    return alice, bob
+
+
+def _xor(data: bytes, pad: bytes) -> bytes:
+    # Big-int XOR runs in C and beats a NumPy round trip at these sizes
+    n = len(data)
+    return (int.from_bytes(data, "little") ^ int.from_bytes(pad, "little")).to_bytes(n, "little")
+
+
+def otp_encrypt(plaintext: bytes, pool: KeyPool) -> bytes:
+    if len(plaintext) > OTP_MAX_MESSAGE:
+        raise ValueError(f"OTP mode is limited to {OTP_MAX_MESSAGE} bytes per message.")
+    offset, pad = pool.take(MAC_KEY_SIZE + len(plaintext))
+    header = _HEADER.pack(OTP_MAGIC, OTP_VERSION, bytes.fromhex(pool.pool_id), offset, len(plaintext))
+    body = header + _xor(plaintext, pad[MAC_KEY_SIZE:])
+    return body + Poly1305.generate_tag(pad[:MAC_KEY_SIZE], body)
+
+
+def otp_decrypt(message: bytes, pool: KeyPool) -> bytes:
+    """
+    Verifies the tag before anything is consumed, so forged messages cannot burn
+    or skip pool bytes. Raises ValueError on any format, reuse or tag failure.
+    """
+    if len(message) < _HEADER.size + TAG_SIZE:
+        raise ValueError("Truncated OTP message.")
+    magic, version, pool_id, offset, length = _HEADER.unpack_from(message)
+    if magic != OTP_MAGIC or version != OTP_VERSION:
+        raise ValueError("Not an OTP message.")
+    if pool_id.hex() != pool.pool_id:
+        raise ValueError("OTP message was sealed with another key pool.")
+    if len(message) != _HEADER.size + length + TAG_SIZE:
+        raise ValueError("OTP message length mismatch.")
+
+    pad = pool.peek(offset, MAC_KEY_SIZE + length)
+    body, tag = message[:-TAG_SIZE], message[-TAG_SIZE:]
+    try:
+        Poly1305.verify_tag(pad[:MAC_KEY_SIZE], body, tag)
+    except InvalidSignature:
+        raise ValueError("OTP message authentication failed.") from None
+    pool.consume_range(offset, MAC_KEY_SIZE + length)
+    return _xor(body[_HEADER.size:], pad[MAC_KEY_SIZE:])
@@ -0,0 +1,208 @@
+"""
+Pipelined stage executor for the streaming packager.
+
+Each stage runs on its own thread, connected by bounded queues of `buffers`
+chunks:
+
+    read -> [compress] -> encrypt -> hash -> write
+
+Compression, AES, SHA3 and file I/O all release the GIL on large buffers, so the
+stages overlap. Throughput is then bound by the slowest stage instead of the sum
+of all of them. Memory stays at (stages x buffers) chunks.
+
+Stats per stage: items, busy time, time starved (waiting for input) and time
+blocked (waiting for room downstream), plus the mean and peak occupancy of its
+input queue. Full queues upstream and empty ones downstream point at the
+bottleneck.
+
+    QOFL_PIPELINE_BUFFERS=4      chunks queued per stage on streaming paths (0 = sequential)
+"""
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from bb84_backend.common.tracing import span
+
+__all__ = ["Stage", "run_pipeline", "get_pipeline_buffers", "DEFAULT_BUFFERS"]
+
+DEFAULT_BUFFERS = 4
+_POLL = 0.1
+_END = object()
+
+
+def get_pipeline_buffers() -> int:
+    value = os.environ.get("QOFL_PIPELINE_BUFFERS", "").strip()
+    if not value:
+        return DEFAULT_BUFFERS
+    try:
+        return max(0, int(value))
+    except ValueError:
+        raise ValueError(f"QOFL_PIPELINE_BUFFERS must be an integer, got {value!r}.") from None
+
+
+class _Aborted(Exception):
+    """Another stage failed; this one stops without reporting."""
+
+
+class Stage:
+    """
+    One sequential step. process() maps a chunk to output bytes (possibly empty);
+    finish() flushes state after the last chunk (e.g. compressor or cipher tail).
+    """
+
+    def __init__(self, name: str, process: Callable[[bytes], bytes], finish: Optional[Callable[[], bytes]] = None):
+        self.name = name
+        self.process = process
+        self.finish = finish
+
+
+class _StageStats:
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self._occupancy_sum = 0
+        self._occupancy_max = 0
+        self._samples = 0
+
+    def sample(self, q: "queue.Queue") -> None:
+        size = q.qsize()
+        self._occupancy_sum += size
+        self._occupancy_max = max(self._occupancy_max, size)
+        self._samples += 1
+
+    def as_dict(self) -> Dict:
+        stats = {
+            "items": self.items,
+            "busy_s": round(self.busy, 4),
+            "starved_s": round(self.starved, 4),
+            "blocked_s": round(self.blocked, 4),
+        }
+        if self._samples:
+            stats.update(queue_capacity=self.capacity,
+                         queue_mean=round(self._occupancy_sum / self._samples, 2),
+                         queue_max=self._occupancy_max)
+        return stats
+
+
+def run_pipeline(
+    source: Iterable[bytes],
+    stages: List[Stage],
+    sink: Callable[[bytes], None],
+    buffers: int = DEFAULT_BUFFERS
+) -> Dict:
+    """
+    Runs source -> stages -> sink with one thread per step and a queue of at most
+    `buffers` chunks in front of every stage and the sink. The first exception
+    in any step stops the pipeline and is re-raised here. Returns per-step stats.
+    """
+    buffers = max(1, buffers)
+    abort = threading.Event()
+    failures: List[BaseException] = []
+    queues = [queue.Queue(maxsize=buffers) for _ in range(len(stages) + 1)]
+    stats = [_StageStats("read", 0)] + [_StageStats(s.name, buffers) for s in stages] + [_StageStats("write", buffers)]
+
+    def put(q: "queue.Queue", item, st: _StageStats) -> None:
+        started = time.perf_counter()
+        while True:
+            try:
+                q.put(item, timeout=_POLL)
+                break
+            except queue.Full:
+                if abort.is_set():
+                    raise _Aborted
+        st.blocked += time.perf_counter() - started
+
+    def get(q: "queue.Queue", st: _StageStats):
+        st.sample(q)
+        started = time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=_POLL)
+                break
+            except queue.Empty:
+                if abort.is_set():
+                    raise _Aborted
+        st.starved += time.perf_counter() - started
+        return item
+
+    def guarded(body: Callable[[], None]) -> Callable[[], None]:
+        def run() -> None:
+            try:
+                body()
+            except _Aborted:
+                pass
+            except BaseException as e:
+                failures.append(e)
+                abort.set()
+        return run
+
+    def read() -> None:
+        st = stats[0]
+        iterator = iter(source)
+        while True:
+            started = time.perf_counter()
+            chunk = next(iterator, _END)
+            st.busy += time.perf_counter() - started
+            if chunk is _END:
+                break
+            st.items += 1
+            put(queues[0], chunk, st)
+        put(queues[0], _END, st)
+
+    def stage_loop(index: int) -> Callable[[], None]:
+        stage, st = stages[index], stats[index + 1]
+        inbox, outbox = queues[index], queues[index + 1]
+
+        def body() -> None:
+            while True:
+                item = get(inbox, st)
+                started = time.perf_counter()
+                if item is _END:
+                    out = stage.finish() if stage.finish else b""
+                else:
+                    out = stage.process(item)
+                    st.items += 1
+                st.busy += time.perf_counter() - started
+                if out:
+                    put(outbox, out, st)
+                if item is _END:
+                    put(outbox, _END, st)
+                    return
+        return body
+
+    threads = [threading.Thread(target=guarded(read), name="pipeline-read", daemon=True)]
+    threads += [threading.Thread(target=guarded(stage_loop(i)), name=f"pipeline-{s.name}", daemon=True)
+                for i, s in enumerate(stages)]
+
+    def write() -> None:
+        st = stats[-1]
+        while True:
+            item = get(queues[-1], st)
+            if item is _END:
+                return
+            started = time.perf_counter()
+            sink(item)
+            st.busy += time.perf_counter() - started
+            st.items += 1
+
+    started = time.perf_counter()
+    with span("pipeline.run", stages=len(stages), buffers=buffers):
+        for t in threads:
+            t.start()
+        # The sink runs on the calling thread
+        guarded(write)()
+        for t in threads:
+            t.join()
+    if failures:
+        raise failures[0]
+    return {
+        "elapsed_s": round(time.perf_counter() - started, 4),
+        "buffers": buffers,
+        "stages": {st.name: st.as_dict() for st in stats},
+    }
@@ -1,15 +1,41 @@
 import json
 import base64
+import hashlib
+import io
+import itertools
 import os
-from typing import List, Tuple, Dict
+import struct
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Dict
 
 # Core AES encryption and key utilities
-from bb84_backend.core.aes_engine import aes_encrypt, aes_decrypt
+from bb84_backend.core.aes_engine import (
+    aes_encrypt_into,
+    aes_decrypt_into,
+    encrypted_size,
+    CBCStreamEncryptor,
+    CBCStreamDecryptor,
+)
+from bb84_backend.core.compression import (
+    choose_codec,
+    compress,
+    decompress,
+    StreamCompressor,
+    StreamDecompressor,
+)
+from bb84_backend.common.tracing import span
+from bb84_backend.secure_io.pipeline import Stage, run_pipeline, get_pipeline_buffers
 from bb84_backend.core.key_utils import (
     derive_aes_key_from_bits,
     verify_key_integrity,
-    bits_to_bytes
+    bits_to_bytes,
+    bytes_to_bits,
+    derive_session_subkey,
+    key_id,
+    DEFAULT_KDF,
+    KDF_PBKDF2
 )
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap, InvalidUnwrap
 
 # Post-quantum logic remains as provided
 try:
@@ -21,111 +47,618 @@ except Exception as e:
     PQCRYPTO_AVAILABLE = False
     dilithium_obj = None
 
+# Package format 2 signs a fixed-size digest instead of the serialised JSON
+PACKAGE_VERSION = 2
+DIGEST_ALG = "sha3-256"
+_DIGEST_DOMAIN = b"QOFL-PACKAGE-DIGEST-v2"
+_UNSIGNED_FIELDS = ("ciphertext", "pq_signature", "pq_public_key")
+
+# Streaming container: MAGIC | u32 header len | header | ciphertext | trailer | u32 trailer len
+STREAM_MAGIC = b"QOFL\x00\x02"
+STREAM_CHUNK_SIZE = 1024 * 1024
+_U32 = struct.Struct(">I")
+
 def _dilithium_keypair_pk_sk(dil) -> Tuple[bytes, bytes]:
     # Streamlined keypair generation
     seed = os.urandom(64)
     pk, sk = dil.keygen(seed)
     return bytes(pk), bytes(sk)
 
+def _canonical_header(header: Dict) -> bytes:
+    return json.dumps(header, sort_keys=True, separators=(',', ':')).encode("utf-8")
+
+def _new_digest(header: Dict):
+    """
+    Starts the package digest: domain tag + length-prefixed canonical header.
+    The ciphertext is then fed incrementally with update().
+    """
+    header_bytes = _canonical_header(header)
+    digest = hashlib.sha3_256(_DIGEST_DOMAIN)
+    digest.update(_U32.pack(len(header_bytes)))
+    digest.update(header_bytes)
+    return digest
+
+def _signed_header(package: Dict) -> Dict:
+    return {k: v for k, v in package.items() if k not in _UNSIGNED_FIELDS}
+
+def _sign_digest(digest: bytes) -> Tuple[bytes, bytes]:
+    if not PQCRYPTO_AVAILABLE:
+        raise RuntimeError("Dilithium module not available — cannot sign the package.")
+    pk_bytes, sk_bytes = _dilithium_keypair_pk_sk(dilithium_obj)
+    return dilithium_obj.sign_with_input(sk_bytes, digest), pk_bytes
+
+def _verify_legacy_signature(package: Dict) -> bool:
+    # Version 1 packages signed the JSON of every field except the signature
+    pq_sig = base64.b64decode(package["pq_signature"])
+    pq_pk = base64.b64decode(package["pq_public_key"])
+    unsigned_package = package.copy()
+    unsigned_package.pop("pq_signature", None)
+    unsigned_package.pop("pq_public_key", None)
+    unsigned_bytes = json.dumps(unsigned_package, separators=(',', ':')).encode("utf-8")
+    return dilithium_obj.verify(pq_pk, unsigned_bytes, pq_sig)
+
+def _session_key_bits(header: Dict, key_b_bits: List[int]) -> List[int]:
+    # Session packages are opened with the session key; derive this file's subkey
+    if "session_id" not in header:
+        return key_b_bits
+    return derive_session_subkey(
+        key_b_bits, header["session_id"], int(header["subkey_index"]), header.get("subkey_label", "file")
+    )
+
 def save_encrypted_file(
     plaintext: bytes,
     key_a_bits: List[int],
     key_b_bits: List[int],
-    original_filename: str = "file"
+    original_filename: str = "file",
+    compression: str = "auto",
+    kdf: str = DEFAULT_KDF,
+    session: Optional[Dict] = None
 ) -> bytes:
     # 1) Derive AES key
-    key_with_salt = derive_aes_key_from_bits(key_a_bits)
+    key_with_salt = derive_aes_key_from_bits(key_a_bits, kdf=kdf)
+    # Key id lets a key store find Key B from the header alone
+    key_fields = {"salt": base64.b64encode(key_with_salt[32:]).decode("ascii"), "kid": key_id(key_a_bits)}
+    inner_fields = {"key_a_encoded": base64.b64encode(bits_to_bytes(key_a_bits)).decode("ascii")}
+    return _build_package(plaintext, key_with_salt, key_fields, inner_fields,
+                          original_filename, compression, kdf, session)
+
+def save_encrypted_file_for_recipients(
+    plaintext: bytes,
+    recipient_keys: List[List[int]],
+    original_filename: str = "file",
+    compression: str = "auto",
+    kdf: str = DEFAULT_KDF
+) -> bytes:
+    """
+    Multi-recipient package: one AES pass under a random data key, which is
+    wrapped once per recipient key. Each recipient opens it with their own Key B.
+    """
+    data_key, slots = _wrap_data_key(recipient_keys, kdf)
+    return _build_package(plaintext, data_key, {"recipients": slots}, {},
+                          original_filename, compression, kdf, None)
+
+def _wrap_data_key(recipient_keys: List[List[int]], kdf: str) -> Tuple[bytes, List[Dict]]:
+    """
+    Random data key plus one {kid, salt, wrapped_key} slot per recipient.
+    The wrapping key is derived from the recipient's BB84 key like a single-recipient
+    AES key; RFC 3394 key wrap authenticates the slot on unwrap.
+    """
+    if not recipient_keys:
+        raise ValueError("At least one recipient key is required.")
+    data_key = os.urandom(32)
+    slots = []
+    with span("package.wrap_keys", recipients=len(recipient_keys)):
+        for bits in recipient_keys:
+            kek_with_salt = derive_aes_key_from_bits(bits, kdf=kdf)
+            slots.append({
+                "kid": key_id(bits),
+                "salt": base64.b64encode(kek_with_salt[32:]).decode("ascii"),
+                "wrapped_key": base64.b64encode(aes_key_wrap(kek_with_salt[:32], data_key)).decode("ascii"),
+            })
+    return data_key, slots
+
+def _open_key(header: Dict, key_b_bits: List[int]) -> Optional[bytes]:
+    """
+    Candidate AES key for Key B: derived directly for single-recipient packages,
+    unwrapped from the slot with the matching key id for multi-recipient ones.
+    """
+    # Packages without a kdf field predate the KDF choice (PBKDF2)
+    kdf = header.get("kdf", KDF_PBKDF2)
+    try:
+        if "recipients" not in header:
+            return derive_aes_key_from_bits(
+                _session_key_bits(header, key_b_bits), base64.b64decode(header["salt"]), kdf=kdf
+            )
+        kid = key_id(key_b_bits)
+        for slot in header["recipients"]:
+            if slot.get("kid") != kid:
+                continue
+            kek_with_salt = derive_aes_key_from_bits(key_b_bits, base64.b64decode(slot["salt"]), kdf=kdf)
+            try:
+                return aes_key_unwrap(kek_with_salt[:32], base64.b64decode(slot["wrapped_key"]))
+            except InvalidUnwrap:
+                continue
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def _build_package(
+    plaintext: bytes,
+    key: bytes,
+    key_fields: Dict,
+    inner_fields: Dict,
+    original_filename: str,
+    compression: str,
+    kdf: str,
+    session: Optional[Dict]
+) -> bytes:
+    # Compress before encrypting: ciphertext is incompressible afterwards.
+    # 'auto' samples the input and skips already-compressed media.
+    with span("package.compress", size=len(plaintext)) as stage:
+        codec = choose_codec(plaintext, compression)
+        plaintext = compress(plaintext, codec)
+        stage.set(codec=codec, compressed=len(plaintext))
 
     # 2) Build INTERNAL payload
-    # Efficiently encode bits to bytes once
-    key_a_bytes = bits_to_bytes(key_a_bits)
-    
-    internal_payload = {
-        "file_bytes_b64": base64.b64encode(plaintext).decode("ascii"),
-        "key_a_encoded": base64.b64encode(key_a_bytes).decode("ascii"),
-        "original_filename": original_filename,
-    }
-    
-    # 3) Encrypt INTERNAL payload
-    internal_bytes = json.dumps(internal_payload, separators=(',', ':')).encode("utf-8")
-    encrypted = aes_encrypt(internal_bytes, key_with_salt)
-
-    # 4) Build OUTER package (Prepare for signing)
-    package = {
-        "ciphertext": base64.b64encode(encrypted).decode("ascii"),
-        "salt": base64.b64encode(key_with_salt[32:]).decode("ascii"),
-    }
+    with span("package.encode_internal"):
+        internal_payload = {"file_bytes_b64": base64.b64encode(plaintext).decode("ascii")}
+        internal_payload.update(inner_fields)
+        internal_payload["original_filename"] = original_filename
+        internal_bytes = json.dumps(internal_payload, separators=(',', ':')).encode("utf-8")
 
-    if not PQCRYPTO_AVAILABLE:
-        raise RuntimeError("Dilithium module not available — cannot sign the package.")
+    # 3) Encrypt INTERNAL payload straight into its final buffer
+    encrypted = bytearray(encrypted_size(len(internal_bytes)))
+    aes_encrypt_into(internal_bytes, key, encrypted)
+    del internal_bytes
 
-    # 5) Post-quantum signing
-    pk_bytes, sk_bytes = _dilithium_keypair_pk_sk(dilithium_obj)
-    
-    # Serialize exactly once for the signature
-    unsigned_bytes = json.dumps(package, separators=(',', ':')).encode("utf-8")
-    signature = dilithium_obj.sign_with_input(sk_bytes, unsigned_bytes)
+    # 4) Build OUTER header (everything that is signed besides the ciphertext)
+    package = {"version": PACKAGE_VERSION, "digest_alg": DIGEST_ALG}
+    package.update(key_fields)
+    package["codec"] = codec
+    package["kdf"] = kdf
+    # Session subkeys: record session id and subkey index (see core.session)
+    if session:
+        package.update(session)
 
-    # 6) Final Assembly
-    package["pq_signature"] = base64.b64encode(signature).decode("ascii")
-    package["pq_public_key"] = base64.b64encode(pk_bytes).decode("ascii")
+    # 5) Post-quantum signing over a fixed-size digest of header + raw ciphertext
+    with span("package.sign"):
+        digest = _new_digest(package)
+        digest.update(encrypted)
+        signature, pk_bytes = _sign_digest(digest.digest())
 
-    return json.dumps(package, separators=(',', ':')).encode("utf-8")
+    # 6) Final Assembly (serialised exactly once)
+    with span("package.serialize"):
+        package["ciphertext"] = base64.b64encode(encrypted).decode("ascii")
+        package["pq_signature"] = base64.b64encode(signature).decode("ascii")
+        package["pq_public_key"] = base64.b64encode(pk_bytes).decode("ascii")
+        return json.dumps(package, separators=(',', ':')).encode("utf-8")
 
 def load_and_decrypt_bytes(
     package_bytes: bytes,
     key_b_bits: List[int]
 ) -> Tuple[bytes, Dict[str, str], bool]:
+    # Streaming containers share the same keys and signature scheme
+    if package_bytes[:len(STREAM_MAGIC)] == STREAM_MAGIC:
+        out = io.BytesIO()
+        metadata, ok = load_and_decrypt_stream(io.BytesIO(package_bytes), out, key_b_bits)
+        return (out.getvalue(), metadata, True) if ok else (b"", {}, False)
+
     # Parse OUTER package
     try:
-        package = json.loads(package_bytes)
+        with span("package.parse", size=len(package_bytes)):
+            package = json.loads(package_bytes)
     except (json.JSONDecodeError, UnicodeDecodeError):
         return b"", {}, False
 
     # 1) Verify post-quantum signature
     if PQCRYPTO_AVAILABLE and "pq_signature" in package:
-        pq_sig = base64.b64decode(package["pq_signature"])
-        pq_pk = base64.b64decode(package["pq_public_key"])
-
-        # Reconstruct exactly as signed (removing signature keys)
-        unsigned_package = package.copy()
-        unsigned_package.pop("pq_signature", None)
-        unsigned_package.pop("pq_public_key", None)
-        unsigned_bytes = json.dumps(unsigned_package, separators=(',', ':')).encode("utf-8")
-
-        if not dilithium_obj.verify(pq_pk, unsigned_bytes, pq_sig):
-            return b"", {}, False
+        if package.get("version", 1) >= 2:
+            ciphertext = base64.b64decode(package["ciphertext"])
+            with span("package.verify"):
+                digest = _new_digest(_signed_header(package))
+                digest.update(ciphertext)
+                pq_sig = base64.b64decode(package["pq_signature"])
+                pq_pk = base64.b64decode(package["pq_public_key"])
+                if not dilithium_obj.verify(pq_pk, digest.digest(), pq_sig):
+                    return b"", {}, False
+        else:
+            with span("package.verify", legacy=True):
+                if not _verify_legacy_signature(package):
+                    return b"", {}, False
+            ciphertext = base64.b64decode(package["ciphertext"])
     else:
         return b"", {}, False
 
     # 2) Decrypt internal payload
-    salt = base64.b64decode(package["salt"])
-    candidate_key = derive_aes_key_from_bits(key_b_bits, salt)
-    
+    kdf = package.get("kdf", KDF_PBKDF2)
+    candidate_key = _open_key(package, key_b_bits)
+    if candidate_key is None:
+        return b"", {}, False
+
     try:
-        internal_bytes = aes_decrypt(base64.b64decode(package["ciphertext"]), candidate_key)
-        internal = json.loads(internal_bytes)
-        
-        plaintext = base64.b64decode(internal["file_bytes_b64"])
-        encoded_key_a = base64.b64decode(internal["key_a_encoded"])
+        internal_bytes = bytearray(len(ciphertext) - 16)
+        del internal_bytes[aes_decrypt_into(ciphertext, candidate_key, internal_bytes):]
+        with span("package.decode_internal"):
+            internal = json.loads(internal_bytes)
+            file_bytes = base64.b64decode(internal["file_bytes_b64"])
+
+        # Packages without a codec field predate compression (stored raw)
+        with span("package.decompress", codec=package.get("codec")):
+            plaintext = decompress(file_bytes, package.get("codec"))
+        # Multi-recipient packages are authenticated by the key wrap instead
+        encoded_key_a = None if "recipients" in package else base64.b64decode(internal["key_a_encoded"])
     except Exception:
         return b"", {}, False
 
-    # 3) Optimized bit reconstruction (Bit-shifting instead of f-string)
-    # This is O(N) where N is bits; significantly faster for key verification.
-    stored_key_a_bits = []
-    for byte in encoded_key_a:
-        for i in range(7, -1, -1):
-            stored_key_a_bits.append((byte >> i) & 1)
+    if encoded_key_a is not None:
+        # 3) Optimized bit reconstruction (Bit-shifting instead of f-string)
+        # This is O(N) where N is bits; significantly faster for key verification.
+        stored_key_a_bits = []
+        for byte in encoded_key_a:
+            for i in range(7, -1, -1):
+                stored_key_a_bits.append((byte >> i) & 1)
 
-    # 4) Final checks
-    integrity_ok = verify_key_integrity(candidate_key, stored_key_a_bits)
-    if not integrity_ok:
-        return b"", {}, False
+        # 4) Final checks
+        integrity_ok = verify_key_integrity(candidate_key, stored_key_a_bits, kdf=kdf)
+        if not integrity_ok:
+            return b"", {}, False
 
     metadata = {
         "original_filename": internal.get("original_filename", "decrypted_file"),
         "extension": internal.get("extension", "bin"),
     }
 
-    return plaintext, metadata, True
\ No newline at end of file
+    return plaintext, metadata, True
+
+def save_encrypted_stream(
+    src: BinaryIO,
+    dst: BinaryIO,
+    key_a_bits: List[int],
+    key_b_bits: List[int],
+    original_filename: str = "file",
+    compression: str = "auto",
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    kdf: str = DEFAULT_KDF,
+    session: Optional[Dict] = None,
+    buffers: Optional[int] = None,
+    stats: Optional[Dict] = None
+) -> int:
+    """
+    Streaming variant of save_encrypted_file for large inputs.
+    Reads src chunk by chunk, writes a signed container to dst and returns its size.
+    The package digest is computed while the ciphertext is written.
+    buffers > 0 runs read/compress/encrypt/hash/write as a pipeline with that many
+    chunks queued per stage (default: QOFL_PIPELINE_BUFFERS); its per-stage stats
+    are stored into `stats` if given.
+    """
+    key_with_salt = derive_aes_key_from_bits(key_a_bits, kdf=kdf)
+    # Key id lets a key store find Key B from the header alone
+    key_fields = {"salt": base64.b64encode(key_with_salt[32:]).decode("ascii"), "kid": key_id(key_a_bits)}
+    inner_fields = {"key_a_encoded": base64.b64encode(bits_to_bytes(key_a_bits)).decode("ascii")}
+    codec, chunks = _read_chunks(src, compression, chunk_size)
+    return _write_stream(dst, key_with_salt, key_fields, inner_fields, original_filename,
+                         codec, chunks, kdf, session, buffers=buffers, stats=stats)
+
+def save_encrypted_stream_for_recipients(
+    src: BinaryIO,
+    dst: BinaryIO,
+    recipient_keys: List[List[int]],
+    original_filename: str = "file",
+    compression: str = "auto",
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    kdf: str = DEFAULT_KDF,
+    buffers: Optional[int] = None,
+    stats: Optional[Dict] = None
+) -> int:
+    """
+    Streaming variant of save_encrypted_file_for_recipients: the input is read,
+    encrypted and signed once whatever the number of recipients.
+    """
+    data_key, slots = _wrap_data_key(recipient_keys, kdf)
+    codec, chunks = _read_chunks(src, compression, chunk_size)
+    return _write_stream(dst, data_key, {"recipients": slots}, {}, original_filename,
+                         codec, chunks, kdf, None, buffers=buffers, stats=stats)
+
+def _read_chunks(src: BinaryIO, compression: str, chunk_size: int) -> Tuple[str, Iterator[bytes]]:
+    # 'auto' decides on the first chunk so the input is read only once
+    first = src.read(chunk_size)
+    codec = choose_codec(first, compression)
+    return codec, itertools.chain([first], iter(lambda: src.read(chunk_size), b""))
+
+def _write_stream(
+    dst: BinaryIO,
+    key: bytes,
+    key_fields: Dict,
+    inner_fields: Dict,
+    original_filename: str,
+    codec: str,
+    chunks: Iterable[bytes],
+    kdf: str,
+    session: Optional[Dict],
+    header_fields: Optional[Dict] = None,
+    buffers: Optional[int] = None,
+    stats: Optional[Dict] = None
+) -> int:
+    """
+    Writes the signed stream container around the plaintext chunks.
+    header_fields adds signed header entries (e.g. the archive package type).
+    With buffers > 0 the stages run concurrently (see pipeline.run_pipeline);
+    None takes the QOFL_PIPELINE_BUFFERS setting.
+    """
+    if buffers is None:
+        buffers = get_pipeline_buffers()
+    header = {"version": PACKAGE_VERSION, "digest_alg": DIGEST_ALG}
+    header.update(key_fields)
+    header["codec"] = codec
+    header["kdf"] = kdf
+    if session:
+        header.update(session)
+    if header_fields:
+        header.update(header_fields)
+    header_bytes = _canonical_header(header)
+    dst.write(STREAM_MAGIC + _U32.pack(len(header_bytes)) + header_bytes)
+    written = len(STREAM_MAGIC) + _U32.size + len(header_bytes)
+
+    digest = _new_digest(header)
+    encryptor = CBCStreamEncryptor(key)
+    compressor = StreamCompressor(codec)
+
+    def emit(block: bytes) -> None:
+        nonlocal written
+        if block:
+            digest.update(block)
+            dst.write(block)
+            written += len(block)
+
+    # Inner header mirrors the internal payload of the in-memory format
+    inner_header = dict(inner_fields)
+    inner_header["original_filename"] = original_filename
+    inner = json.dumps(inner_header, separators=(',', ':')).encode("utf-8")
+    emit(encryptor.update(_U32.pack(len(inner)) + inner))
+
+    if buffers > 0:
+        def hash_block(block: bytes) -> bytes:
+            digest.update(block)
+            return block
+
+        def write_block(block: bytes) -> None:
+            nonlocal written
+            dst.write(block)
+            written += len(block)
+
+        stages = [Stage("compress", compressor.compress, compressor.flush)] if codec != "none" else []
+        stages += [Stage("encrypt", encryptor.update, encryptor.finalize), Stage("hash", hash_block)]
+        with span("stream.encrypt", codec=codec, buffers=buffers):
+            pipeline_stats = run_pipeline((c for c in chunks if c), stages, write_block, buffers)
+        if stats is not None:
+            stats.update(pipeline_stats)
+    else:
+        with span("stream.encrypt", codec=codec):
+            for chunk in chunks:
+                if chunk:
+                    emit(encryptor.update(compressor.compress(chunk)))
+            emit(encryptor.update(compressor.flush()))
+            emit(encryptor.finalize())
+
+    with span("stream.sign"):
+        signature, pk_bytes = _sign_digest(digest.digest())
+    trailer = json.dumps({
+        "pq_signature": base64.b64encode(signature).decode("ascii"),
+        "pq_public_key": base64.b64encode(pk_bytes).decode("ascii"),
+    }, separators=(',', ':')).encode("utf-8")
+    dst.write(trailer + _U32.pack(len(trailer)))
+    return written + len(trailer) + _U32.size
+
+def read_stream_layout(src: BinaryIO) -> Tuple[Dict, int, int, Dict]:
+    """
+    Parses a streaming container without touching the ciphertext.
+    Returns (header, ciphertext_start, ciphertext_end, trailer); src must be seekable.
+    """
+    src.seek(0)
+    if src.read(len(STREAM_MAGIC)) != STREAM_MAGIC:
+        raise ValueError("Not a Qofl-e-Noori stream package.")
+    (header_len,) = _U32.unpack(src.read(_U32.size))
+    header = json.loads(src.read(header_len))
+    ct_start = src.tell()
+
+    end = src.seek(0, io.SEEK_END)
+    src.seek(end - _U32.size)
+    (trailer_len,) = _U32.unpack(src.read(_U32.size))
+    ct_end = end - _U32.size - trailer_len
+    if ct_end < ct_start:
+        raise ValueError("Truncated stream package.")
+    src.seek(ct_end)
+    trailer = json.loads(src.read(trailer_len))
+    if not isinstance(header, dict) or not isinstance(trailer, dict):
+        raise ValueError("Malformed stream package.")
+    return header, ct_start, ct_end, trailer
+
+def _iter_range(src: BinaryIO, start: int, end: int, chunk_size: int):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(chunk_size, remaining))
+        if not chunk:
+            raise ValueError("Unexpected end of stream package.")
+        remaining -= len(chunk)
+        yield chunk
+
+def verify_stream_signature(src: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE) -> bool:
+    """
+    Checks the PQ signature of a streaming container in one digest pass.
+    """
+    if not PQCRYPTO_AVAILABLE:
+        return False
+    try:
+        header, ct_start, ct_end, trailer = read_stream_layout(src)
+        digest = _new_digest(header)
+        for chunk in _iter_range(src, ct_start, ct_end, chunk_size):
+            digest.update(chunk)
+        pq_sig = base64.b64decode(trailer["pq_signature"])
+        pq_pk = base64.b64decode(trailer["pq_public_key"])
+    except (ValueError, KeyError, TypeError, struct.error):
+        return False
+    return bool(dilithium_obj.verify(pq_pk, digest.digest(), pq_sig))
+
+_B64_WHITESPACE = b" \t\r\n"
+
+def _b64_decode_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decodes base64 text arriving in pieces, carrying partial quanta between them.
+    Whitespace (line breaks of wrapped text) is skipped.
+    """
+    carry = b""
+    for chunk in chunks:
+        data = carry + chunk.translate(None, _B64_WHITESPACE)
+        cut = len(data) - len(data) % 4
+        carry = data[cut:]
+        if cut:
+            yield base64.b64decode(data[:cut])
+    if carry:
+        yield base64.b64decode(carry)
+
+def _text_chunks(text: str, chunk_size: int) -> Iterator[bytes]:
+    for i in range(0, len(text), chunk_size):
+        yield text[i:i + chunk_size].encode("ascii")
+
+def _report_stream(report: Dict, f: BinaryIO, chunk_size: int, fmt: str) -> Dict:
+    header, _, _, _ = read_stream_layout(f)
+    report.update(format=fmt, version=header.get("version"), codec=header.get("codec"),
+                  kdf=header.get("kdf", KDF_PBKDF2))
+    report["ok"] = verify_stream_signature(f, chunk_size)
+    if not report["ok"]:
+        report["error"] = "signature mismatch"
+    return report
+
+def verify_package(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Dict:
+    """
+    Key-less integrity/authenticity check of a package file.
+    Parses only the header and checks the PQ signature; nothing is decrypted.
+    Accepts stream containers, raw JSON packages and the base64 text written by the CLI.
+    Malformed files of any kind produce a failed report, never an exception.
+    """
+    report = {"path": path, "ok": False, "format": None, "version": None, "codec": None, "kdf": None, "bytes": None, "error": None}
+    try:
+        report["bytes"] = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(len(STREAM_MAGIC))
+            if head == STREAM_MAGIC:
+                return _report_stream(report, f, chunk_size, "stream")
+
+            f.seek(0)
+            if head[:1] == b"{":
+                report["format"] = "json"
+                raw = f.read()
+            else:
+                # CLI base64 text: decoded chunk by chunk into a spooled file, so a
+                # wrapped stream container is verified without holding it in memory
+                with tempfile.SpooledTemporaryFile(max_size=chunk_size) as decoded:
+                    for piece in _b64_decode_chunks(iter(lambda: f.read(chunk_size), b"")):
+                        decoded.write(piece)
+                    decoded.seek(0)
+                    if decoded.read(len(STREAM_MAGIC)) == STREAM_MAGIC:
+                        return _report_stream(report, decoded, chunk_size, "stream-b64")
+                    report["format"] = "json-b64"
+                    decoded.seek(0)
+                    raw = decoded.read()
+        package = json.loads(raw)
+        if not isinstance(package, dict):
+            raise ValueError("package is not a JSON object")
+        version = package.get("version", 1)
+        if not isinstance(version, int) or isinstance(version, bool):
+            raise ValueError("package version is not an integer")
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, struct.error) as e:
+        report["error"] = str(e) or type(e).__name__
+        return report
+
+    report.update(version=version, codec=package.get("codec"),
+                  kdf=package.get("kdf", KDF_PBKDF2))
+    if not PQCRYPTO_AVAILABLE:
+        report["error"] = "Dilithium module not available"
+        return report
+    if "pq_signature" not in package:
+        report["error"] = "unsigned package"
+        return report
+
+    try:
+        if report["version"] >= 2:
+            digest = _new_digest(_signed_header(package))
+            for piece in _b64_decode_chunks(_text_chunks(package["ciphertext"], chunk_size)):
+                digest.update(piece)
+            pq_sig = base64.b64decode(package["pq_signature"])
+            pq_pk = base64.b64decode(package["pq_public_key"])
+            report["ok"] = bool(dilithium_obj.verify(pq_pk, digest.digest(), pq_sig))
+        else:
+            report["ok"] = bool(_verify_legacy_signature(package))
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        report["error"] = str(e) or type(e).__name__
+        return report
+
+    if not report["ok"]:
+        report["error"] = "signature mismatch"
+    return report
+
+def load_and_decrypt_stream(
+    src: BinaryIO,
+    dst: BinaryIO,
+    key_b_bits: List[int],
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Tuple[Dict[str, str], bool]:
+    """
+    Streaming variant of load_and_decrypt_bytes.
+    The signature is checked in a digest pass before any plaintext reaches dst.
+    """
+    with span("stream.verify"):
+        if not verify_stream_signature(src, chunk_size):
+            return {}, False
+
+    header, ct_start, ct_end, _ = read_stream_layout(src)
+    if header.get("type") == "archive":
+        raise ValueError("Archive packages are opened entry by entry (see secure_io.archive).")
+    kdf = header.get("kdf", KDF_PBKDF2)
+    candidate_key = _open_key(header, key_b_bits)
+    if candidate_key is None:
+        return {}, False
+    decryptor = CBCStreamDecryptor(candidate_key)
+    decompressor = StreamDecompressor(header.get("codec"))
+
+    pending = b""
+    internal = None
+
+    def feed(data: bytes) -> bool:
+        nonlocal pending, internal
+        if internal is None:
+            # Buffer until the length-prefixed inner header is complete
+            pending += data
+            if len(pending) < _U32.size:
+                return True
+            (inner_len,) = _U32.unpack(pending[:_U32.size])
+            if len(pending) < _U32.size + inner_len:
+                return True
+            internal = json.loads(pending[_U32.size:_U32.size + inner_len])
+            # Multi-recipient packages are authenticated by the key wrap instead
+            if "recipients" not in header:
+                stored_key_a_bits = bytes_to_bits(base64.b64decode(internal["key_a_encoded"]))
+                if not verify_key_integrity(candidate_key, stored_key_a_bits, kdf=kdf):
+                    return False
+            data = pending[_U32.size + inner_len:]
+            pending = b""
+        dst.write(decompressor.decompress(data))
+        return True
+
+    try:
+        with span("stream.decrypt", codec=header.get("codec")):
+            for chunk in _iter_range(src, ct_start, ct_end, chunk_size):
+                if not feed(decryptor.update(chunk)):
+                    return {}, False
+            if not feed(decryptor.finalize()) or internal is None:
+                return {}, False
+            dst.write(decompressor.flush())
+    except Exception:
+        return {}, False
+
+    metadata = {
+        "original_filename": internal.get("original_filename", "decrypted_file"),
+        "extension": internal.get("extension", "bin"),
+    }
+    return metadata, True
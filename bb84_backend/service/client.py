@@ -0,0 +1,165 @@
+"""
+Thin client for the Qofl-e-Noori daemon (see daemon.py).
+
+    python -m bb84_backend.service.client encrypt FILE [--out FILE.qofl] [--key-out KEY.txt]
+    python -m bb84_backend.service.client decrypt FILE.qofl --key KEY.txt [--out FILE]
+    python -m bb84_backend.service.client verify FILE.qofl
+    python -m bb84_backend.service.client keygen [--bits N]
+
+The daemon token is read from --token-file, $QOFL_DAEMON_TOKEN or ~/.qofl/daemon.token.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from bb84_backend.service.daemon import DEFAULT_HOST, DEFAULT_PORT, KEY_HEADER, COPY_CHUNK, read_token
+
+
+class QoflClient:
+    """
+    Submits jobs to a running daemon. Files are streamed in and out in chunks.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = 600.0,
+                 token: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.token = token or read_token()
+
+    def _request(self, path: str, body=None, headers: Optional[Dict[str, str]] = None, method: str = "POST"):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = dict(headers or {})
+        headers["Authorization"] = f"Bearer {self.token}"
+        if body is not None:
+            # Explicit length lets http.client stream the file instead of chunk-encoding it
+            headers["Content-Length"] = str(os.fstat(body.fileno()).st_size)
+        conn.request(method, path, body=body, headers=headers)
+        return conn, conn.getresponse()
+
+    @staticmethod
+    def _raise_for_status(response) -> None:
+        if response.status != 200:
+            try:
+                error = json.loads(response.read()).get("error")
+            except ValueError:
+                error = response.reason
+            raise RuntimeError(f"Daemon returned {response.status}: {error}")
+
+    def encrypt_file(self, path: str, out_path: str) -> str:
+        """Encrypts path into out_path and returns Key B."""
+        with open(path, "rb") as src:
+            conn, response = self._request(f"/encrypt?filename={quote(os.path.basename(path))}", src)
+        try:
+            self._raise_for_status(response)
+            key_b = response.getheader(KEY_HEADER)
+            with open(out_path, "wb") as dst:
+                shutil.copyfileobj(response, dst, COPY_CHUNK)
+            return key_b
+        finally:
+            conn.close()
+
+    def decrypt_file(self, path: str, key_b: str, out_dir: str = ".", out_path: Optional[str] = None) -> str:
+        """Decrypts path and returns the written file name."""
+        with open(path, "rb") as src:
+            conn, response = self._request("/decrypt", src, {KEY_HEADER: key_b})
+        try:
+            self._raise_for_status(response)
+            out_path = out_path or os.path.join(out_dir, os.path.basename(response.getheader("X-Qofl-Filename", "decrypted_file")))
+            with open(out_path, "wb") as dst:
+                shutil.copyfileobj(response, dst, COPY_CHUNK)
+            return out_path
+        finally:
+            conn.close()
+
+    def verify_file(self, path: str) -> Dict:
+        with open(path, "rb") as src:
+            conn, response = self._request(f"/verify?name={quote(path)}", src)
+        try:
+            return json.loads(response.read())
+        finally:
+            conn.close()
+
+    def keygen(self, bits: int = 256) -> Dict:
+        conn, response = self._request(f"/keygen?bits={bits}", headers={"Content-Length": "0"})
+        try:
+            self._raise_for_status(response)
+            return json.loads(response.read())
+        finally:
+            conn.close()
+
+    def health(self) -> Dict:
+        conn, response = self._request("/health", method="GET")
+        try:
+            return json.loads(response.read())
+        finally:
+            conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Qofl-e-Noori daemon client")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token-file", default=None)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enc = sub.add_parser("encrypt")
+    enc.add_argument("file")
+    enc.add_argument("--out")
+    enc.add_argument("--key-out")
+
+    dec = sub.add_parser("decrypt")
+    dec.add_argument("file")
+    dec.add_argument("--key", required=True, help="Key file, or the key bit string itself")
+    dec.add_argument("--out")
+
+    ver = sub.add_parser("verify")
+    ver.add_argument("file")
+
+    gen = sub.add_parser("keygen")
+    gen.add_argument("--bits", type=int, default=256, help="Final key bits")
+
+    sub.add_parser("health")
+
+    args = parser.parse_args(argv)
+    try:
+        client = QoflClient(args.host, args.port, token=read_token(args.token_file))
+        return _run_command(client, args)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+
+def _run_command(client: QoflClient, args) -> int:
+    if args.command == "encrypt":
+        out = args.out or os.path.basename(args.file) + ".qofl"
+        key_b = client.encrypt_file(args.file, out)
+        key_out = args.key_out or os.path.basename(args.file) + "_key.txt"
+        with open(key_out, "w") as f:
+            f.write(key_b)
+        print(f"Output Saved Encrypted File: {out}")
+        print(f"Output Saved Secret Key:     {key_out}")
+    elif args.command == "decrypt":
+        key_b = args.key
+        if os.path.exists(key_b):
+            with open(key_b, "r") as f:
+                key_b = f.read().strip()
+        print(f"Output Saved as: {client.decrypt_file(args.file, key_b, out_path=args.out)}")
+    elif args.command == "verify":
+        report = client.verify_file(args.file)
+        print(json.dumps(report))
+        return 0 if report.get("ok") else 1
+    elif args.command == "keygen":
+        print(json.dumps(client.keygen(args.bits)))
+    else:
+        print(json.dumps(client.health()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Long-running local Qofl-e-Noori daemon.
+
+Keeps qiskit/Aer, the Dilithium signer and a worker pool warm across requests
+and exposes them over localhost HTTP:
+
+    POST /encrypt?filename=NAME   body: plaintext   -> stream package, key in X-Qofl-Key-B
+    POST /decrypt                 body: package     -> plaintext (X-Qofl-Key-B request header)
+    POST /verify                  body: package     -> JSON report
+    POST /keygen?bits=N                             -> JSON {"key_b": ..., "bits": ..., "raw_qubits": ...}
+    GET  /health                                    -> JSON status
+
+Every request must carry "Authorization: Bearer <token>". The token is read from
+a file only its owner can read (created with mode 0600 on first start), so other
+local users cannot drive the daemon or read the keys it returns.
+
+    QOFL_DAEMON_TOKEN=path       token file (default: ~/.qofl/daemon.token)
+
+Run with: python -m bb84_backend.service.daemon [--port 8765] [--workers N]
+"""
+import argparse
+import base64
+import hmac
+import json
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from bb84_backend.core.bb84_quantum import bb84_protocol, get_simulator
+from bb84_backend.core.key_rate import generate_final_key, FINAL_KEY_BITS
+from bb84_backend.secure_io.secure_packager import (
+    load_and_decrypt_bytes,
+    load_and_decrypt_stream,
+    save_encrypted_stream,
+    verify_package,
+    PQCRYPTO_AVAILABLE,
+    STREAM_MAGIC,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+KEY_HEADER = "X-Qofl-Key-B"
+COPY_CHUNK = 1024 * 1024
+# Request bodies up to this size stay in memory, larger ones spill to disk
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+# /keygen key lengths are clamped to this range so one request cannot pin a worker
+MIN_KEYGEN_BITS = 8
+MAX_KEYGEN_BITS = 8192
+
+
+def default_token_path() -> str:
+    return os.environ.get("QOFL_DAEMON_TOKEN") or os.path.join(os.path.expanduser("~"), ".qofl", "daemon.token")
+
+
+def read_token(path: Optional[str] = None) -> str:
+    """
+    Reads the shared token, refusing files that group or others can access.
+    """
+    path = path or default_token_path()
+    if os.stat(path).st_mode & 0o077:
+        raise ValueError(f"Token file {path} must not be accessible by group or others (chmod 600).")
+    with open(path, "r") as f:
+        token = f.read().strip()
+    if not token:
+        raise ValueError(f"Token file {path} is empty.")
+    return token
+
+
+def ensure_token(path: Optional[str] = None) -> str:
+    """
+    Returns the token from path, creating a random one with mode 0600 if missing.
+    """
+    path = path or default_token_path()
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with open(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    return read_token(path)
+
+
+class QoflService:
+    """
+    Warm backend state shared by all request threads.
+    Jobs run on a bounded worker pool so concurrency reflects real work only.
+    """
+
+    def __init__(self, workers: Optional[int] = None, key_bits: int = FINAL_KEY_BITS):
+        self.key_bits = key_bits
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1, thread_name_prefix="qofl-job")
+        self.started = time.time()
+        self.completed: Dict[str, int] = {"encrypt": 0, "decrypt": 0, "verify": 0, "keygen": 0}
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        # Import-time and first-call costs are paid here, not by the first client
+        get_simulator()
+        bb84_protocol(length=8)
+
+    def submit(self, name: str, fn, *args):
+        result = self.pool.submit(fn, *args).result()
+        with self._lock:
+            self.completed[name] += 1
+        return result
+
+    # Jobs (executed on the worker pool)
+    def encrypt(self, src, dst, filename: str) -> str:
+        # Same planned, privacy-amplified key as controller.encrypt_file_local
+        key_a_bits, key_b_bits, _, _ = generate_final_key(self.key_bits, authenticate=True)
+        save_encrypted_stream(src, dst, key_a_bits, key_b_bits, original_filename=filename)
+        return "".join(map(str, key_b_bits))
+
+    def decrypt(self, src, dst, key_b_bits) -> Dict:
+        """
+        Stream containers are decrypted from the spooled body; JSON packages (raw or
+        the CLI's base64 text) are in-memory formats and go through load_and_decrypt_bytes.
+        """
+        if src.read(len(STREAM_MAGIC)) == STREAM_MAGIC:
+            src.seek(0)
+            metadata, ok = load_and_decrypt_stream(src, dst, key_b_bits)
+            return metadata if ok else {}
+        src.seek(0)
+        raw = src.read()
+        if raw[:1] != b"{":
+            raw = base64.b64decode(raw)
+        data, metadata, ok = load_and_decrypt_bytes(raw, key_b_bits)
+        if not ok:
+            return {}
+        dst.write(data)
+        return metadata
+
+    def keygen(self, bits: int) -> Dict:
+        _, key_b_bits, _, report = generate_final_key(bits, authenticate=True)
+        return {"key_b": "".join(map(str, key_b_bits)), "bits": len(key_b_bits), "raw_qubits": report["raw_qubits"]}
+
+    def health(self) -> Dict:
+        with self._lock:
+            completed = dict(self.completed)
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 2),
+            "workers": self.pool._max_workers,
+            "pq_signature": PQCRYPTO_AVAILABLE,
+            "completed": completed,
+        }
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+class QoflRequestHandler(BaseHTTPRequestHandler):
+    server_version = "QoflDaemon/1.0"
+    service: QoflService = None
+    token: str = None
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write("[qofl-daemon] " + (fmt % args) + "\n")
+
+    def _spool_body(self):
+        """Streams the request body into a spooled temp file in fixed-size chunks."""
+        length = int(self.headers.get("Content-Length") or 0)
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(COPY_CHUNK, remaining))
+            if not chunk:
+                break
+            spool.write(chunk)
+            remaining -= len(chunk)
+        spool.seek(0)
+        return spool
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, spool, headers: Dict[str, str]) -> None:
+        size = spool.seek(0, os.SEEK_END)
+        spool.seek(0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        shutil.copyfileobj(spool, self.wfile, COPY_CHUNK)
+
+    def _authorized(self) -> bool:
+        supplied = self.headers.get("Authorization", "")
+        expected = f"Bearer {self.token}"
+        if self.token and hmac.compare_digest(supplied.encode("utf-8"), expected.encode("utf-8")):
+            return True
+        self._send_json(401, {"error": "Missing or invalid daemon token."})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if urlparse(self.path).path == "/health":
+            self._send_json(200, self.service.health())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            if url.path == "/encrypt":
+                filename = os.path.basename(query.get("filename", ["file"])[0])
+                with self._spool_body() as src, tempfile.TemporaryFile() as dst:
+                    key_b = self.service.submit("encrypt", self.service.encrypt, src, dst, filename)
+                    self._send_file(dst, {KEY_HEADER: key_b})
+            elif url.path == "/decrypt":
+                key_b_str = self.headers.get(KEY_HEADER, "").strip()
+                if not key_b_str or set(key_b_str) - {"0", "1"}:
+                    self._send_json(400, {"error": "Invalid Key Format. Must be binary (0s and 1s)."})
+                    return
+                key_bits = [int(k) for k in key_b_str]
+                with self._spool_body() as src, tempfile.TemporaryFile() as dst:
+                    metadata = self.service.submit("decrypt", self.service.decrypt, src, dst, key_bits)
+                    if not metadata:
+                        self._send_json(403, {"error": "Key B mismatch. Integrity verification failed."})
+                        return
+                    self._send_file(dst, {"X-Qofl-Filename": metadata["original_filename"]})
+            elif url.path == "/verify":
+                # verify_package works on paths, so the body lands in a named temp file
+                with tempfile.NamedTemporaryFile(suffix=".qofl", delete=False) as tmp:
+                    with self._spool_body() as src:
+                        shutil.copyfileobj(src, tmp, COPY_CHUNK)
+                try:
+                    report = self.service.submit("verify", verify_package, tmp.name)
+                finally:
+                    os.unlink(tmp.name)
+                report["path"] = query.get("name", [None])[0]
+                self._send_json(200 if report["ok"] else 422, report)
+            elif url.path == "/keygen":
+                try:
+                    bits = int(query.get("bits", [self.service.key_bits])[0])
+                except ValueError:
+                    self._send_json(400, {"error": "bits must be an integer."})
+                    return
+                bits = min(max(bits, MIN_KEYGEN_BITS), MAX_KEYGEN_BITS)
+                self._send_json(200, self.service.submit("keygen", self.service.keygen, bits))
+            else:
+                self._send_json(404, {"error": "not found"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: Optional[int] = None,
+          key_bits: int = FINAL_KEY_BITS, token_path: Optional[str] = None) -> None:
+    token = ensure_token(token_path)
+    service = QoflService(workers=workers, key_bits=key_bits)
+    service.warm_up()
+    handler = type("BoundQoflRequestHandler", (QoflRequestHandler,), {"service": service, "token": token})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    print(f"Qofl-e-Noori daemon listening on http://{host}:{port} ({service.pool._max_workers} workers)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Qofl-e-Noori local daemon")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--key-bits", type=int, default=FINAL_KEY_BITS, help="Final key bits per encryption")
+    parser.add_argument("--token-file", default=None, help="Shared token file (default: $QOFL_DAEMON_TOKEN or ~/.qofl/daemon.token)")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.key_bits, args.token_file)
+
+
+if __name__ == "__main__":
+    main()
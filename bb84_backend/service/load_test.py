@@ -0,0 +1,364 @@
+"""
+Load generator for concurrent encrypt/decrypt traffic.
+
+Closed-loop workers drive either the controller in-process or a running daemon.
+Each worker sends its next request as soon as the previous one returns.
+Payload sizes come from a distribution and decrypts replay recently encrypted
+packages. The report covers throughput, latency percentiles per operation, the
+error rate by type, and a timeline of RSS and completed requests.
+
+    python -m bb84_backend.service.load_test --target controller --concurrency 4 --duration 30 \\
+        --sizes lognormal:64KB:1.0 --decrypt-ratio 0.5 --json load.json
+    python -m bb84_backend.service.load_test --target daemon --port 8765 --requests 200
+
+Payload distributions: fixed:SIZE, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA,
+choice:SIZE,SIZE,...  (sizes accept KB/MB/GB suffixes).
+
+The controller writes bb84_metrics.json to the working directory on every call,
+so controller runs happen in a scratch directory (--workdir). The file is
+checked for torn writes at the end.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from bb84_backend.common.memory import parse_size
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+__all__ = ["parse_distribution", "ControllerTarget", "DaemonTarget", "run_load", "main"]
+
+# Encrypted packages kept for decrypt requests (oldest dropped first)
+REPLAY_POOL = 32
+DEFAULT_SAMPLE_INTERVAL = 0.5
+PERCENTILES = (50, 95, 99)
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], int]:
+    """
+    Payload-size sampler from a spec string (see module docstring).
+    """
+    kind, _, args = spec.partition(":")
+    if kind == "fixed":
+        size = parse_size(args)
+        return lambda r: size
+    if kind == "uniform":
+        low, high = (parse_size(v) for v in args.split(":"))
+        return lambda r: r.randint(low, high)
+    if kind == "lognormal":
+        median, sigma = args.split(":")
+        mu, sigma = np.log(parse_size(median)), float(sigma)
+        return lambda r: max(1, int(r.lognormvariate(mu, sigma)))
+    if kind == "choice":
+        sizes = [parse_size(v) for v in args.split(",")]
+        return lambda r: r.choice(sizes)
+    raise ValueError(f"Unknown payload distribution: {spec}")
+
+
+def current_rss(pid: Optional[int] = None) -> Optional[int]:
+    """
+    Resident set size of a process (default: this one), or None if unavailable.
+    """
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ControllerTarget:
+    """
+    Calls controller.encrypt_file_local / decrypt_file_local in this process.
+    """
+    name = "controller"
+    pid = None
+
+    def __init__(self):
+        from bb84_backend.logic.controller import encrypt_file_local, decrypt_file_local
+        self._encrypt = encrypt_file_local
+        self._decrypt = decrypt_file_local
+
+    def encrypt(self, data: bytes, filename: str) -> object:
+        encrypted_b64, key_b, _ = self._encrypt(data, filename)
+        return encrypted_b64, [int(c) for c in key_b]
+
+    def decrypt(self, handle: object) -> bytes:
+        encrypted_b64, key_b_bits = handle
+        data, metadata = self._decrypt(encrypted_b64, key_b_bits)
+        if data is None:
+            raise RuntimeError((metadata or {}).get("error", "decryption failed"))
+        return data
+
+    def close(self) -> None:
+        pass
+
+
+class DaemonTarget:
+    """
+    Sends requests to a running daemon through QoflClient. Packages are kept as
+    files in a scratch directory, as a real client would. RSS is sampled from the
+    daemon process (pid from /health), which must run on this machine.
+    """
+    name = "daemon"
+
+    def __init__(self, host: str, port: int, scratch: str):
+        from bb84_backend.service.client import QoflClient
+        self.client = QoflClient(host, port)
+        self.pid = self.client.health().get("pid")
+        self.scratch = scratch
+        self._counter = iter(range(1 << 62))
+        self._lock = threading.Lock()
+
+    def _path(self, suffix: str) -> str:
+        with self._lock:
+            n = next(self._counter)
+        return os.path.join(self.scratch, f"req{n}{suffix}")
+
+    def encrypt(self, data: bytes, filename: str) -> object:
+        src, out = self._path(".bin"), self._path(".qofl")
+        with open(src, "wb") as f:
+            f.write(data)
+        try:
+            key_b = self.client.encrypt_file(src, out)
+        finally:
+            os.remove(src)
+        return out, key_b
+
+    def decrypt(self, handle: object) -> bytes:
+        package, key_b = handle
+        out = self._path(".out")
+        self.client.decrypt_file(package, key_b, out_path=out)
+        try:
+            with open(out, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(out)
+
+    def close(self) -> None:
+        pass
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    values = np.percentile(samples, PERCENTILES)
+    summary = {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, values)}
+    summary.update(count=len(samples), mean=round(float(np.mean(samples)), 4), max=round(max(samples), 4))
+    return summary
+
+
+def run_load(
+    target,
+    concurrency: int = 4,
+    duration: Optional[float] = 30.0,
+    requests: Optional[int] = None,
+    sizes: str = "fixed:64KB",
+    decrypt_ratio: float = 0.5,
+    seed: Optional[int] = None,
+    sample_interval: float = DEFAULT_SAMPLE_INTERVAL
+) -> Dict:
+    """
+    Runs `concurrency` closed-loop workers until `duration` seconds have passed or
+    `requests` requests were issued, whichever comes first. Decrypts are only
+    issued once an encrypted package exists, and each one is checked against the
+    plaintext hash, so a wrong result counts as an error.
+    """
+    if duration is None and requests is None:
+        raise ValueError("Set a duration, a request count, or both.")
+    sample_size = parse_distribution(sizes)
+    master = random.Random(seed)
+    pool: deque = deque(maxlen=REPLAY_POOL)
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = {"encrypt": [], "decrypt": []}
+    errors: Counter = Counter()
+    totals = {"issued": 0, "completed": 0, "failed": 0, "bytes": 0}
+    stop = threading.Event()
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else None
+
+    def next_request() -> bool:
+        with lock:
+            if stop.is_set() or (requests is not None and totals["issued"] >= requests):
+                return False
+            totals["issued"] += 1
+            return True
+
+    def worker(index: int) -> None:
+        r = random.Random(master.random() + index)
+        while next_request():
+            if deadline is not None and time.perf_counter() >= deadline:
+                stop.set()
+                break
+            with lock:
+                package = r.choice(pool) if pool and r.random() < decrypt_ratio else None
+            op = "decrypt" if package else "encrypt"
+            t0 = time.perf_counter()
+            try:
+                if package:
+                    handle, digest = package
+                    data = target.decrypt(handle)
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        raise ValueError("decrypted data does not match the plaintext")
+                    size = len(data)
+                else:
+                    size = sample_size(r)
+                    data = r.randbytes(size)
+                    handle = target.encrypt(data, f"load_{index}.bin")
+                    with lock:
+                        pool.append((handle, hashlib.sha256(data).hexdigest()))
+                ok = True
+            except Exception as e:  # every failure is a data point, never fatal
+                ok = False
+                error = f"{op}: {type(e).__name__}: {e}"[:200]
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    latencies[op].append(elapsed)
+                    totals["completed"] += 1
+                    totals["bytes"] += size
+                else:
+                    errors[error] += 1
+                    totals["failed"] += 1
+
+    timeline = []
+
+    def sampler() -> None:
+        while True:
+            with lock:
+                point = {"t": round(time.perf_counter() - started, 3), "rss": current_rss(target.pid),
+                         "completed": totals["completed"], "failed": totals["failed"]}
+            timeline.append(point)
+            if stop.wait(sample_interval):
+                return
+
+    monitor = threading.Thread(target=sampler, name="load-monitor", daemon=True)
+    monitor.start()
+    threads = [threading.Thread(target=worker, args=(i,), name=f"load-{i}") for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    monitor.join()
+    elapsed = time.perf_counter() - started
+    timeline.append({"t": round(elapsed, 3), "rss": current_rss(target.pid),
+                     "completed": totals["completed"], "failed": totals["failed"]})
+
+    done = totals["completed"] + totals["failed"]
+    rss = [p["rss"] for p in timeline if p["rss"] is not None]
+    return {
+        "target": target.name,
+        "concurrency": concurrency,
+        "sizes": sizes,
+        "decrypt_ratio": decrypt_ratio,
+        "elapsed": round(elapsed, 3),
+        "requests": done,
+        "throughput_rps": round(totals["completed"] / elapsed, 3) if elapsed else 0.0,
+        "throughput_mb_s": round(totals["bytes"] / elapsed / 1e6, 3) if elapsed else 0.0,
+        "error_rate": round(totals["failed"] / done, 4) if done else 0.0,
+        "errors": dict(errors.most_common()),
+        "latency": {op: _percentiles(samples) for op, samples in latencies.items()},
+        "rss_start": rss[0] if rss else None,
+        "rss_peak": max(rss) if rss else None,
+        "rss_end": rss[-1] if rss else None,
+        "timeline": timeline,
+    }
+
+
+def _check_metrics_file(path: str) -> str:
+    # Concurrent BB84MetricsCollector.export_to_json calls can interleave their writes
+    if not os.path.exists(path):
+        return "missing"
+    try:
+        with open(path) as f:
+            json.load(f)
+        return "ok"
+    except ValueError:
+        return "corrupt"
+
+
+def _print_report(report: Dict) -> None:
+    print(f"\n[LOAD] target={report['target']} concurrency={report['concurrency']} "
+          f"sizes={report['sizes']} decrypt_ratio={report['decrypt_ratio']}")
+    print(f"    - Requests:    {report['requests']} in {report['elapsed']} s")
+    print(f"    - Throughput:  {report['throughput_rps']} req/s, {report['throughput_mb_s']} MB/s")
+    print(f"    - Error rate:  {report['error_rate'] * 100:.2f}%")
+    for op, summary in report["latency"].items():
+        if summary["count"]:
+            print(f"    - {op:<8} n={summary['count']} p50={summary['p50']}s p95={summary['p95']}s "
+                  f"p99={summary['p99']}s max={summary['max']}s")
+    if report["rss_peak"] is not None:
+        mb = 1024 * 1024
+        print(f"    - RSS:         start {report['rss_start'] / mb:.1f} MB, peak {report['rss_peak'] / mb:.1f} MB, "
+              f"end {report['rss_end'] / mb:.1f} MB")
+    if "metrics_file" in report:
+        print(f"    - bb84_metrics.json: {report['metrics_file']}")
+    for error, count in report["errors"].items():
+        print(f"    ! {count} x {error}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent encrypt/decrypt load generator")
+    parser.add_argument("--target", choices=["controller", "daemon"], default="controller")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (0 = until --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--sizes", default="fixed:64KB", help="Payload size distribution")
+    parser.add_argument("--decrypt-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--interval", type=float, default=DEFAULT_SAMPLE_INTERVAL, help="RSS sampling interval")
+    parser.add_argument("--workdir", default=None, help="Scratch directory (default: a temp dir)")
+    parser.add_argument("--json", default=None, help="Also write the full report here")
+    args = parser.parse_args(argv)
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    scratch = args.workdir or tempfile.mkdtemp(prefix="qofl-load-")
+    os.makedirs(scratch, exist_ok=True)
+    cwd = os.getcwd()
+    try:
+        if args.target == "controller":
+            os.chdir(scratch)
+            target = ControllerTarget()
+        else:
+            from bb84_backend.service.daemon import DEFAULT_HOST, DEFAULT_PORT
+            target = DaemonTarget(args.host or DEFAULT_HOST, args.port or DEFAULT_PORT, scratch)
+        report = run_load(target, args.concurrency, args.duration or None, args.requests,
+                          args.sizes, args.decrypt_ratio, args.seed, args.interval)
+        if args.target == "controller":
+            report["metrics_file"] = _check_metrics_file(os.path.join(scratch, "bb84_metrics.json"))
+        target.close()
+    finally:
+        os.chdir(cwd)
+        if args.workdir is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    _print_report(report)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["error_rate"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
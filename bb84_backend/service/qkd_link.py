@@ -0,0 +1,490 @@
+"""
+Two-party BB84: Alice and Bob as separate endpoints that only share a quantum
+channel and an authenticated classical socket.
+
+Classical frames (big endian):
+
+    u8 type | u32 batch | u32 sequence | u32 payload length | payload | 16-byte tag
+
+The tag is a truncated HMAC-SHA256 under the pre-shared authentication key over
+the sender's role byte, the header and the payload. Sequence numbers count frames
+per direction, so replayed, reordered or reflected frames fail verification.
+
+Per batch: Bob sends his bases (BASES). Alice answers with the sift mask, a random
+sample of sifted positions and her bits there (SIFT). Bob answers with the errors
+he found in the sample (QBER). Bob keeps up to `window` batches in flight, and
+measures batch k + 1 on a thread while batch k is being sifted. Frames queued
+together go out in one write. After Bob's END, Alice sends FINISH with the
+privacy-amplification seed, the final length and a verification hash.
+
+The quantum channel here is an in-process loopback. Benchmark with:
+
+    python -m bb84_backend.service.qkd_link --qubits 1048576 --windows 1 4
+"""
+import argparse
+import hashlib
+import hmac
+import os
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bb84_backend.common.tracing import span
+from bb84_backend.core.bb84_quantum import measure_states
+from bb84_backend.core.key_rate import secure_key_length, _privacy_amplification
+from bb84_backend.core.randomness import RandomnessProvider, resolve_provider
+
+__all__ = ["FrameSocket", "LoopbackQuantumChannel", "AliceEndpoint", "BobEndpoint",
+           "run_loopback", "benchmark_link"]
+
+_HEADER = struct.Struct(">BIII")
+_U32 = struct.Struct(">I")
+_QBER = struct.Struct(">II")
+TAG_SIZE = 16
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+FRAME_BASES = 1
+FRAME_SIFT = 2
+FRAME_QBER = 3
+FRAME_END = 4
+FRAME_FINISH = 5
+FRAME_ACK = 6
+
+DEFAULT_BATCH_QUBITS = 1 << 16
+DEFAULT_WINDOW = 4
+DEFAULT_SAMPLE_FRACTION = 0.1
+ROLE_ALICE = b"A"
+ROLE_BOB = b"B"
+
+
+def _pack_bits(bits: np.ndarray) -> bytes:
+    return np.packbits(bits.astype(np.uint8, copy=False)).tobytes()
+
+
+def _unpack_bits(payload: bytes, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    size = (count + 7) // 8
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset), count=count)
+    return bits, offset + size
+
+
+def _bernoulli_mask(n: int, p: float, rng: RandomnessProvider) -> np.ndarray:
+    # 16-bit uniforms from the key-grade provider; the sample must be unpredictable
+    draws = np.frombuffer(rng.random_bytes(2 * n), dtype=np.uint16)
+    return draws < int(p * 65536)
+
+
+class FrameSocket:
+    """
+    Authenticated frame transport over a connected socket. Sends are queued to a
+    writer thread that coalesces everything pending into one sendall, so a reader
+    is never blocked behind its own writes. Counters feed the benchmark.
+    """
+
+    def __init__(self, sock: socket.socket, auth_key: bytes, role: bytes):
+        self.sock = sock
+        self.auth_key = auth_key
+        self.role = role
+        self.peer = ROLE_BOB if role == ROLE_ALICE else ROLE_ALICE
+        self._send_seq = 0
+        self._recv_seq = 0
+        self._outbox: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self.stats = {"frames_sent": 0, "frames_received": 0, "bytes_sent": 0, "bytes_received": 0,
+                      "writes": 0, "stalls": 0, "stall_time": 0.0}
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._writer = threading.Thread(target=self._write_loop, name=f"qkd-writer-{role.decode()}", daemon=True)
+        self._writer.start()
+
+    def _tag(self, role: bytes, header: bytes, payload: bytes) -> bytes:
+        return hmac.new(self.auth_key, role + header + payload, hashlib.sha256).digest()[:TAG_SIZE]
+
+    def send(self, frame_type: int, batch: int, payload: bytes = b"") -> None:
+        if self._error is not None:
+            raise ConnectionError("Frame writer failed.") from self._error
+        header = _HEADER.pack(frame_type, batch, self._send_seq, len(payload))
+        self._send_seq += 1
+        self._outbox.put(header + payload + self._tag(self.role, header, payload))
+
+    def _write_loop(self) -> None:
+        try:
+            while True:
+                frame = self._outbox.get()
+                if frame is None:
+                    return
+                frames = [frame]
+                # Coalesce whatever else is queued into the same write
+                while True:
+                    try:
+                        frame = self._outbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    if frame is None:
+                        self._flush(frames)
+                        return
+                    frames.append(frame)
+                self._flush(frames)
+        except OSError as e:
+            self._error = e
+
+    def _flush(self, frames: List[bytes]) -> None:
+        data = b"".join(frames)
+        self.sock.sendall(data)
+        self.stats["frames_sent"] += len(frames)
+        self.stats["bytes_sent"] += len(data)
+        self.stats["writes"] += 1
+
+    def readable(self) -> bool:
+        return bool(select.select([self.sock], [], [], 0)[0])
+
+    def _recv_exact(self, n: int) -> bytes:
+        buffer = bytearray(n)
+        view = memoryview(buffer)
+        got = 0
+        while got < n:
+            read = self.sock.recv_into(view[got:])
+            if not read:
+                raise ConnectionError("Peer closed the classical channel.")
+            got += read
+        return bytes(buffer)
+
+    def recv(self) -> Tuple[int, int, bytes]:
+        """
+        Next frame as (type, batch, payload). A wait on an empty socket counts as a
+        stall: the endpoint had nothing to do but wait for the other side.
+        """
+        if not self.readable():
+            started = time.perf_counter()
+            select.select([self.sock], [], [])
+            self.stats["stalls"] += 1
+            self.stats["stall_time"] += time.perf_counter() - started
+        header = self._recv_exact(_HEADER.size)
+        frame_type, batch, seq, length = _HEADER.unpack(header)
+        if length > MAX_PAYLOAD:
+            raise ValueError("Classical frame too large.")
+        body = self._recv_exact(length + TAG_SIZE)
+        payload, tag = body[:length], body[length:]
+        if not hmac.compare_digest(tag, self._tag(self.peer, header, payload)):
+            raise ValueError("Classical frame authentication failed.")
+        if seq != self._recv_seq:
+            raise ValueError("Classical frame out of sequence.")
+        self._recv_seq += 1
+        self.stats["frames_received"] += 1
+        self.stats["bytes_received"] += len(header) + len(body)
+        return frame_type, batch, payload
+
+    def close(self) -> None:
+        self._outbox.put(None)
+        self._writer.join()
+        if self._error is not None:
+            raise ConnectionError("Frame writer failed.") from self._error
+
+
+class LoopbackQuantumChannel:
+    """
+    In-process stand-in for the quantum channel: Alice's prepared states for one
+    batch at a time, bounded so she cannot run arbitrarily far ahead of Bob.
+    """
+
+    def __init__(self, depth: int = 2):
+        self._queue: "queue.Queue[Optional[Tuple[int, np.ndarray, np.ndarray]]]" = queue.Queue(maxsize=depth)
+
+    def send(self, batch: int, bits: np.ndarray, bases: np.ndarray) -> None:
+        self._queue.put((batch, bits, bases))
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def receive(self) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        return self._queue.get()
+
+
+def _verification_hash(key: np.ndarray) -> bytes:
+    return hashlib.sha3_256(b"qofl-e-noori/verify" + _pack_bits(key)).digest()
+
+
+class AliceEndpoint:
+    """
+    Prepares and sends states, answers Bob's bases with sift and sample data, and
+    finishes with privacy amplification once Bob reports the end of the run.
+    """
+
+    def __init__(self, link: FrameSocket, channel: LoopbackQuantumChannel,
+                 rng: Optional[RandomnessProvider] = None,
+                 sample_fraction: float = DEFAULT_SAMPLE_FRACTION):
+        self.link = link
+        self.channel = channel
+        self.rng = resolve_provider(rng)
+        self.sample_fraction = sample_fraction
+
+    def run(self, qubits: int, batch_qubits: int = DEFAULT_BATCH_QUBITS) -> Tuple[np.ndarray, Dict]:
+        prepared: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+        def prepare() -> None:
+            for batch, start in enumerate(range(0, qubits, batch_qubits)):
+                count = min(batch_qubits, qubits - start)
+                bits, bases = self.rng.bits(count), self.rng.bases(count)
+                prepared[batch] = (bits, bases)
+                self.channel.send(batch, bits, bases)
+            self.channel.close()
+
+        source = threading.Thread(target=prepare, name="qkd-alice-source", daemon=True)
+        source.start()
+
+        parts: Dict[int, np.ndarray] = {}
+        awaiting = set()
+        sampled = errors = 0
+        ended = False
+        with span("qkd.alice", qubits=qubits):
+            while not ended or awaiting:
+                frame_type, batch, payload = self.link.recv()
+                if frame_type == FRAME_BASES:
+                    (count,) = _U32.unpack_from(payload)
+                    bob_bases, _ = _unpack_bits(payload, _U32.size, count)
+                    bits, bases = prepared.pop(batch)
+                    match = bases == bob_bases
+                    sifted = bits[match]
+                    sample = _bernoulli_mask(len(sifted), self.sample_fraction, self.rng)
+                    self.link.send(FRAME_SIFT, batch, b"".join((
+                        _U32.pack(count), _pack_bits(match),
+                        _U32.pack(len(sifted)), _pack_bits(sample), _pack_bits(sifted[sample]),
+                    )))
+                    parts[batch] = sifted[~sample]
+                    awaiting.add(batch)
+                elif frame_type == FRAME_QBER:
+                    k, batch_errors = _QBER.unpack(payload)
+                    sampled += k
+                    errors += batch_errors
+                    awaiting.discard(batch)
+                elif frame_type == FRAME_END:
+                    ended = True
+                else:
+                    raise ValueError(f"Unexpected frame type {frame_type} at Alice.")
+        source.join()
+
+        key = np.concatenate([parts[b] for b in sorted(parts)]) if parts else np.zeros(0, dtype=np.uint8)
+        qber = errors / sampled if sampled else 0.5
+        bound = secure_key_length(len(key), sampled, qber)
+        seed = self.rng.random_bytes(32)
+        final = _privacy_amplification(key, seed, bound["secure_bits"])
+        self.link.send(FRAME_FINISH, 0, _U32.pack(len(final)) + seed + _verification_hash(final))
+        frame_type, _, payload = self.link.recv()
+        if frame_type != FRAME_ACK:
+            raise ValueError(f"Unexpected frame type {frame_type} at Alice.")
+        return final, {
+            "sifted": len(key) + sampled,
+            "sample_bits": sampled,
+            "errors": errors,
+            "qber": round(qber, 6),
+            "final_bits": len(final),
+            "verified": payload == b"\x01",
+            **bound,
+        }
+
+
+class BobEndpoint:
+    """
+    Measures incoming states on a thread and drives the classical exchange, with
+    up to `window` batches awaiting Alice's sift reply at any time.
+    """
+
+    def __init__(self, link: FrameSocket, channel: LoopbackQuantumChannel,
+                 rng: Optional[RandomnessProvider] = None, window: int = DEFAULT_WINDOW):
+        self.link = link
+        self.channel = channel
+        self.rng = resolve_provider(rng)
+        self.window = max(1, window)
+
+    def run(self) -> Tuple[np.ndarray, Dict]:
+        measured: "queue.Queue" = queue.Queue(maxsize=2)
+
+        def measure() -> None:
+            try:
+                while True:
+                    item = self.channel.receive()
+                    if item is None:
+                        break
+                    batch, bits, bases = item
+                    bob_bases = self.rng.bases(len(bits))
+                    measured.put((batch, bob_bases, measure_states(bits, bases, bob_bases, self.rng)))
+            finally:
+                measured.put(None)
+
+        detector = threading.Thread(target=measure, name="qkd-bob-detector", daemon=True)
+        detector.start()
+
+        held: Dict[int, np.ndarray] = {}
+        inflight: deque = deque()
+        parts: List[np.ndarray] = []
+        batches = 0
+
+        def handle_sift() -> None:
+            frame_type, batch, payload = self.link.recv()
+            if frame_type != FRAME_SIFT or batch != inflight[0]:
+                raise ValueError(f"Unexpected frame type {frame_type} at Bob.")
+            inflight.popleft()
+            (count,) = _U32.unpack_from(payload)
+            match, offset = _unpack_bits(payload, _U32.size, count)
+            (n,) = _U32.unpack_from(payload, offset)
+            sample, offset = _unpack_bits(payload, offset + _U32.size, n)
+            alice_sample, _ = _unpack_bits(payload, offset, int(np.count_nonzero(sample)))
+            sifted = held.pop(batch)[match.astype(bool)]
+            sample = sample.astype(bool)
+            batch_errors = int(np.count_nonzero(sifted[sample] != alice_sample))
+            parts.append(sifted[~sample])
+            self.link.send(FRAME_QBER, batch, _QBER.pack(len(alice_sample), batch_errors))
+
+        with span("qkd.bob"):
+            while True:
+                item = measured.get()
+                if item is None:
+                    break
+                batch, bob_bases, results = item
+                self.link.send(FRAME_BASES, batch, _U32.pack(len(bob_bases)) + _pack_bits(bob_bases))
+                held[batch] = results
+                inflight.append(batch)
+                batches += 1
+                # Wait only when the window is full; otherwise take replies already here
+                while inflight and (len(inflight) >= self.window or self.link.readable()):
+                    handle_sift()
+            detector.join()
+            self.link.send(FRAME_END, batches)
+            while inflight:
+                handle_sift()
+
+        frame_type, _, payload = self.link.recv()
+        if frame_type != FRAME_FINISH:
+            raise ValueError(f"Unexpected frame type {frame_type} at Bob.")
+        (length,) = _U32.unpack_from(payload)
+        seed, digest = payload[_U32.size:_U32.size + 32], payload[_U32.size + 32:]
+        key = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint8)
+        final = _privacy_amplification(key, seed, length)
+        verified = hmac.compare_digest(digest, _verification_hash(final))
+        self.link.send(FRAME_ACK, 0, b"\x01" if verified else b"\x00")
+        return final, {"batches": batches, "final_bits": length, "verified": verified}
+
+
+def _connected_pair(transport: str) -> Tuple[socket.socket, socket.socket]:
+    if transport == "socketpair":
+        return socket.socketpair()
+    if transport != "tcp":
+        raise ValueError(f"Unknown transport: {transport}")
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        alice = socket.create_connection(server.getsockname())
+        bob, _ = server.accept()
+    return alice, bob
+
+
+def run_loopback(
+    qubits: int,
+    batch_qubits: int = DEFAULT_BATCH_QUBITS,
+    window: int = DEFAULT_WINDOW,
+    transport: str = "socketpair",
+    auth_key: Optional[bytes] = None,
+    sample_fraction: float = DEFAULT_SAMPLE_FRACTION,
+    rng_alice: Optional[RandomnessProvider] = None,
+    rng_bob: Optional[RandomnessProvider] = None
+) -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Runs both endpoints in this process over a real socket and the loopback
+    quantum channel. Returns (Alice's final key, Bob's final key, report).
+    """
+    auth_key = auth_key or os.urandom(32)
+    alice_sock, bob_sock = _connected_pair(transport)
+    channel = LoopbackQuantumChannel()
+    alice_link = FrameSocket(alice_sock, auth_key, ROLE_ALICE)
+    bob_link = FrameSocket(bob_sock, auth_key, ROLE_BOB)
+    bob_result: Dict = {}
+
+    def bob_side() -> None:
+        try:
+            bob_result["key"], bob_result["report"] = BobEndpoint(bob_link, channel, rng_bob, window).run()
+        except BaseException as e:  # re-raised in the caller's thread
+            bob_result["error"] = e
+            bob_sock.close()
+
+    started = time.perf_counter()
+    bob = threading.Thread(target=bob_side, name="qkd-bob", daemon=True)
+    bob.start()
+    try:
+        key_alice, report = AliceEndpoint(alice_link, channel, rng_alice, sample_fraction).run(qubits, batch_qubits)
+    except (ConnectionError, OSError):
+        if "error" in bob_result:
+            raise bob_result["error"]
+        raise
+    finally:
+        bob.join()
+        for link, sock in ((alice_link, alice_sock), (bob_link, bob_sock)):
+            try:
+                link.close()
+            except ConnectionError:
+                pass
+            sock.close()
+    if "error" in bob_result:
+        raise bob_result["error"]
+    elapsed = time.perf_counter() - started
+
+    report.update({
+        "qubits": qubits,
+        "batches": bob_result["report"]["batches"],
+        "window": window,
+        "transport": transport,
+        "elapsed": round(elapsed, 4),
+        "qubits_per_s": round(qubits / elapsed, 1),
+        "final_bits_per_s": round(report["final_bits"] / elapsed, 1),
+        "alice_link": dict(alice_link.stats),
+        "bob_link": dict(bob_link.stats),
+    })
+    return key_alice, bob_result["key"], report
+
+
+def benchmark_link(qubits: int, batch_qubits: int, windows: List[int], transport: str = "socketpair") -> List[Dict]:
+    """
+    One loopback run per window size: throughput, frames, writes and stalls
+    (waits on the peer with nothing else to do, i.e. round trips paid in full).
+    """
+    rows = []
+    for window in windows:
+        key_a, key_b, report = run_loopback(qubits, batch_qubits, window, transport)
+        rows.append({
+            "window": window,
+            "batches": report["batches"],
+            "elapsed": report["elapsed"],
+            "qubits_per_s": report["qubits_per_s"],
+            "final_bits": report["final_bits"],
+            "keys_match": bool(np.array_equal(key_a, key_b)),
+            "frames": report["alice_link"]["frames_sent"] + report["bob_link"]["frames_sent"],
+            "writes": report["alice_link"]["writes"] + report["bob_link"]["writes"],
+            "bytes": report["alice_link"]["bytes_sent"] + report["bob_link"]["bytes_sent"],
+            "bob_stalls": report["bob_link"]["stalls"],
+            "bob_stall_time": round(report["bob_link"]["stall_time"], 4),
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the two-party BB84 link over a loopback channel")
+    parser.add_argument("--qubits", type=int, default=1 << 20)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_QUBITS, help="Qubits per batch")
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, DEFAULT_WINDOW],
+                        help="Batches in flight before Bob waits for Alice")
+    parser.add_argument("--transport", choices=["socketpair", "tcp"], default="socketpair")
+    args = parser.parse_args(argv)
+
+    rows = benchmark_link(args.qubits, args.batch, args.windows, args.transport)
+    columns = list(rows[0])
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row[c]) for c in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,6 +3,7 @@ import sys
 import time
 import re
 import json  # Added for reading metrics
+import argparse
 
 # ----------------------------------------------------------------------------
 # PATH CONFIGURATION
@@ -13,7 +14,8 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
 try:
-    from bb84_backend.logic.controller import encrypt_file_local, decrypt_file_local
+    from bb84_backend.logic.controller import encrypt_file_local, decrypt_file_local, encrypt_batch_local
+    from bb84_backend.secure_io.key_store import KeyStore
     BACKEND_AVAILABLE = True
 except ImportError as e:
     print(f"Critical Error: Backend modules not found. {e}")
@@ -66,17 +68,21 @@ def run_encryption():
     try:
         # Call backend
         # Note: controller.py returns (encrypted_b64, key_b_str, qubit_log)
-        result = encrypt_file_local(file_bytes, filename)
+        # Key B also goes to the local key store, so decryption can look it up
+        with KeyStore() as store:
+            result = encrypt_file_local(file_bytes, filename, key_store=store)
         
         # Handle unpacking based on your controller version
         if len(result) == 3:
-            enc_data, key_b, _ = result
+            enc_data, key_b, qubit_log = result
         else:
             enc_data, key_b = result
+            qubit_log = None
 
         # Stats
         print(f"\n[SUCCESS] Encryption Complete!")
-        print(f"    - Total Qubits Used: 256")
+        if qubit_log is not None:
+            print(f"    - Total Qubits Used: {len(qubit_log)}")
         print(f"    - Final Key Length:  {len(key_b)} bits")
         
         # Save Outputs
@@ -106,10 +112,16 @@ def run_decryption():
     print(f"\nInput How will you provide the key?")
     print("    1. Paste key string")
     print("    2. Load from file")
-    choice = input("    Selection [1/2]: ").strip()
+    print("    3. Look up in the local key store")
+    choice = input("    Selection [1/2/3]: ").strip()
 
     key_b_str = ""
-    if choice == "2":
+    if choice == "3":
+        key_b_str = lookup_key_in_store(enc_path)
+        if not key_b_str:
+            print("[ERROR] No key for this package in the key store.")
+            return
+    elif choice == "2":
         k_bytes, _ = get_file_content("Enter path to key file")
         if k_bytes:
             key_b_str = k_bytes.decode("utf-8").strip()
@@ -168,6 +180,266 @@ def run_decryption():
     except Exception as e:
         print(f"[ERROR] Critical failure: {e}")
 
+def lookup_key_in_store(package_path, store_path=None):
+    """Key B string for a package from the key store, or '' when not found."""
+    from bb84_backend.logic.controller import read_package_header
+
+    header = read_package_header(package_path)
+    with KeyStore(store_path) as store:
+        bits = store.resolve(header)
+    return "".join(map(str, bits)) if bits else ""
+
+def run_keys_import(args):
+    """Imports '0101...' key files into the key store (session ids from session_<id>_key.txt)."""
+    from bb84_backend.secure_io.key_store import KeyStore
+
+    records = []
+    for path in args.files:
+        with open(path, "r") as f:
+            key_b_str = f.read().strip()
+        if not re.fullmatch(r"[01]+", key_b_str):
+            print(f"[SKIPPED] {path}: not a binary key file")
+            continue
+        match = re.fullmatch(r"session_([0-9a-f]+)_key\.txt", os.path.basename(path))
+        records.append(([int(c) for c in key_b_str], os.path.basename(path), match.group(1) if match else None))
+
+    with KeyStore(args.store) as store:
+        kids = store.put_many(records)
+        total = len(store)
+    print(f"[SUCCESS] {len(kids)} keys imported ({total} in {store.path})")
+    return 0
+
+def run_decrypt_many(args):
+    """Decrypts many packages, resolving every Key B from the key store."""
+    from bb84_backend.logic.controller import decrypt_many
+    from bb84_backend.secure_io.key_store import KeyStore
+
+    with KeyStore(args.store) as store:
+        reports = decrypt_many(args.paths, args.out, store)
+    for report in reports:
+        if report["ok"]:
+            print(f"[OK]     {report['path']} -> {len(report['outputs'])} file(s)")
+        else:
+            print(f"[FAILED] {report['path']} ({report['error']})")
+    failed = sum(1 for r in reports if not r["ok"])
+    print(f"\n{len(reports) - failed} of {len(reports)} packages decrypted into {args.out}")
+    return 0 if failed == 0 else 1
+
+def run_verify(args):
+    """Key-less signature audit of packages or whole directory trees."""
+    from bb84_backend.logic.audit import verify_tree, summarize
+
+    start = time.perf_counter()
+    reports = []
+    for report in verify_tree(args.paths, workers=args.workers):
+        reports.append(report)
+        if args.json:
+            print(json.dumps(report))
+        elif report["ok"]:
+            print(f"[OK]     {report['path']}")
+        else:
+            print(f"[FAILED] {report['path']} ({report['error']})")
+
+    summary = summarize(reports, time.perf_counter() - start)
+    if args.json:
+        print(json.dumps({"summary": summary}))
+    else:
+        print("\n--- Verification Report ---")
+        for key, value in summary.items():
+            print(f"{key + ':':<22}{value}")
+    return 0 if summary["Failed"] == 0 else 1
+
+def run_encrypt_batch(args):
+    """Encrypts many files with one BB84 session and writes a single key file."""
+    store = KeyStore(args.store) if args.store else None
+    try:
+        packages, key_b, session_id = encrypt_batch_local(args.files, args.out, key_bits=args.key_bits, key_store=store)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    finally:
+        if store is not None:
+            store.close()
+
+    key_name = os.path.join(args.out, f"session_{session_id}_key.txt")
+    with open(key_name, "w") as f:
+        f.write(key_b)
+
+    print(f"[SUCCESS] {len(packages)} files encrypted in session {session_id}")
+    print(f"Output Saved Secret Key:     {key_name}")
+    return 0
+
+def run_backup(args):
+    """Re-encrypts only new and changed files; prunes packages of deleted ones."""
+    from bb84_backend.logic.backup import backup_directory
+    from bb84_backend.secure_io.key_store import KeyStore
+
+    try:
+        with KeyStore(args.store) as store:
+            summary = backup_directory(args.source, args.dest, store, workers=args.workers,
+                                       key_bits=args.key_bits, manifest_path=args.manifest)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print("\n--- Backup Report ---")
+        for key, value in summary.items():
+            print(f"{key + ':':<22}{value}")
+    return 0
+
+def run_restore(args):
+    """Decrypts one file of a backup with its session key from the key store."""
+    from bb84_backend.logic.backup import restore_file
+    from bb84_backend.secure_io.key_store import KeyStore
+
+    out_path = args.out or os.path.basename(args.path)
+    try:
+        with KeyStore(args.store) as store:
+            ok = restore_file(args.dest, args.path, out_path, store, manifest_path=args.manifest)
+    except KeyError as e:
+        print(f"[ERROR] {e.args[0]}")
+        return 1
+    if not ok:
+        print(f"[ERROR] Integrity verification failed for {args.path}")
+        return 1
+    print(f"[SUCCESS] Restored {args.path} -> {out_path}")
+    return 0
+
+def run_archive(args):
+    """Streams files into a single archive package and writes its key file."""
+    from bb84_backend.logic.controller import encrypt_archive_local
+
+    store = KeyStore(args.store) if args.store else None
+    try:
+        key_b, count = encrypt_archive_local(args.paths, args.output, key_bits=args.key_bits, key_store=store)
+    finally:
+        if store is not None:
+            store.close()
+    key_name = args.output + "_key.txt"
+    with open(key_name, "w") as f:
+        f.write(key_b)
+    print(f"[SUCCESS] {count} entries archived into {args.output}")
+    print(f"Output Saved Secret Key:     {key_name}")
+    return 0
+
+def _open_archive(args):
+    from bb84_backend.secure_io.archive import ArchiveReader
+
+    with open(args.key, "r") as f:
+        key_b_bits = [int(c) for c in f.read().strip()]
+    src = open(args.package, "rb")
+    try:
+        return ArchiveReader(src, key_b_bits)
+    except Exception:
+        src.close()
+        raise
+
+def run_archive_list(args):
+    """Prints entry names and sizes; nothing but the index is decrypted."""
+    try:
+        reader = _open_archive(args)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    with reader.src:
+        for entry in reader.entries:
+            print(f"{entry['size']:>12}  {entry['name']}")
+    return 0
+
+def run_archive_extract(args):
+    """Decrypts only the requested entries (random access into the package)."""
+    try:
+        reader = _open_archive(args)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    with reader.src:
+        os.makedirs(args.out, exist_ok=True)
+        for name in args.names:
+            out_path = os.path.join(args.out, os.path.basename(name))
+            try:
+                with open(out_path, "wb") as f:
+                    reader.extract(name, f)
+            except KeyError:
+                os.remove(out_path)
+                print(f"[ERROR] No entry named {name}")
+                return 1
+            print(f"[SUCCESS] {name} -> {out_path}")
+    return 0
+
+def run_cli(argv):
+    """Non-interactive subcommands; the menu is used when no arguments are given."""
+    parser = argparse.ArgumentParser(prog="terminal.py", description="Qofl-e-Noori command line")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    verify = sub.add_parser("verify", help="Check package signatures without keys")
+    verify.add_argument("paths", nargs="+", help="Package files or directories to scan for .qofl files")
+    verify.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    verify.add_argument("--json", action="store_true", help="Emit one JSON report per line")
+    verify.set_defaults(handler=run_verify)
+
+    batch = sub.add_parser("encrypt-batch", help="Encrypt many files with one BB84 session key")
+    batch.add_argument("files", nargs="+", help="Files to encrypt")
+    batch.add_argument("--out", default=".", help="Output directory for packages and the key file")
+    batch.add_argument("--key-bits", type=int, default=256, help="Session key bits (the planner sizes the exchange)")
+    batch.add_argument("--store", default=None, help="Also record the session key in this key store")
+    batch.set_defaults(handler=run_encrypt_batch)
+
+    backup = sub.add_parser("backup", help="Incremental encrypted backup of a directory")
+    backup.add_argument("source", help="Directory to back up")
+    backup.add_argument("dest", help="Backup directory for the packages")
+    backup.add_argument("--store", default=None,
+                        help="Key store for session keys, outside dest (default: $QOFL_KEY_STORE or qofl_keys.db)")
+    backup.add_argument("--manifest", default=None,
+                        help="Manifest path (default: dest/manifest.json, which lists plaintext paths and hashes)")
+    backup.add_argument("--workers", type=int, default=None, help="Hashing threads (default: CPU count)")
+    backup.add_argument("--key-bits", type=int, default=256, help="Session key bits (the planner sizes the exchange)")
+    backup.add_argument("--json", action="store_true", help="Emit the summary as JSON")
+    backup.set_defaults(handler=run_backup)
+
+    restore = sub.add_parser("restore", help="Restore one file from a backup directory")
+    restore.add_argument("dest", help="Backup directory")
+    restore.add_argument("path", help="Path of the file relative to the backed-up directory")
+    restore.add_argument("--out", default=None, help="Output file (default: the file name)")
+    restore.add_argument("--store", default=None, help="Key store holding the session keys")
+    restore.add_argument("--manifest", default=None, help="Manifest path used for the backup")
+    restore.set_defaults(handler=run_restore)
+
+    archive = sub.add_parser("archive", help="Pack many files into one encrypted archive package")
+    archive.add_argument("output", help="Archive package to write")
+    archive.add_argument("paths", nargs="+", help="Files or directories to add")
+    archive.add_argument("--key-bits", type=int, default=256, help="Final key bits (the planner sizes the exchange)")
+    archive.add_argument("--store", default=None, help="Also record the key in this key store")
+    archive.set_defaults(handler=run_archive)
+
+    listing = sub.add_parser("archive-list", help="List the entries of an archive package")
+    listing.add_argument("package", help="Archive package")
+    listing.add_argument("key", help="Key B file")
+    listing.set_defaults(handler=run_archive_list)
+
+    extract = sub.add_parser("archive-extract", help="Extract entries from an archive package")
+    extract.add_argument("package", help="Archive package")
+    extract.add_argument("key", help="Key B file")
+    extract.add_argument("names", nargs="+", help="Entry names (see archive-list)")
+    extract.add_argument("--out", default=".", help="Output directory")
+    extract.set_defaults(handler=run_archive_extract)
+
+    keys = sub.add_parser("keys-import", help="Import Key B files into the local key store")
+    keys.add_argument("files", nargs="+", help="Key files ('0101...' text)")
+    keys.add_argument("--store", default=None, help="Key store path (default: $QOFL_KEY_STORE or qofl_keys.db)")
+    keys.set_defaults(handler=run_keys_import)
+
+    many = sub.add_parser("decrypt-many", help="Decrypt packages with keys from the key store")
+    many.add_argument("paths", nargs="+", help="Package files or directories to scan for .qofl files")
+    many.add_argument("--out", default=".", help="Output directory")
+    many.add_argument("--store", default=None, help="Key store path (default: $QOFL_KEY_STORE or qofl_keys.db)")
+    many.set_defaults(handler=run_decrypt_many)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
 # ----------------------------------------------------------------------------
 # MAIN MENU
 # ----------------------------------------------------------------------------
@@ -197,6 +469,8 @@ def main():
             print(f"Invalid command.")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,22 @@
+import pytest
+
+from bb84_backend.core.key_rate import FINAL_KEY_BITS, generate_final_key
+from bb84_backend.core.randomness import SeededRandomness
+from bb84_backend.core.session import BB84Session
+
+
+@pytest.mark.parametrize("key_bits", [FINAL_KEY_BITS, 512])
+def test_session_key_is_planned_final_key(key_bits):
+    session = BB84Session(key_bits=key_bits, authenticate=False, rng=SeededRandomness(7))
+    key_a, key_b, _, report = generate_final_key(key_bits, rng=SeededRandomness(7))
+
+    assert len(session.key_a_bits) == len(session.key_b_bits) == key_bits
+    assert len(key_a) == len(key_b) == key_bits
+    assert session.key_a_bits == session.key_b_bits
+    assert session.key_report["secure_bits"] >= key_bits
+    assert report["raw_qubits"] > 0
+
+
+def test_session_rejects_short_keys():
+    with pytest.raises(ValueError):
+        BB84Session(key_bits=128, authenticate=False)